@@ -0,0 +1,81 @@
+""" 下载器性能测试。
+在本地开启一个 keep-alive 的 HTTP 服务器，分别用 requests_downloader 和 http_downloader
+连续下载同一个页面，比较每秒能完成的调用次数。
+
+    python example/benchmark/downloader_bench.py [次数]
+"""
+import subprocess
+import sys
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from requests_magic import Spider
+from requests_magic.request import Request
+from requests_magic.downloader import requests_downloader, http_downloader
+
+BODY = b'<html><body>' + b'requests-magic ' * 200 + b'</body></html>'
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # 响应头和响应体是分开写的，不关闭 Nagle 算法时 keep-alive 连接会被延迟确认拖慢
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(BODY)))
+        self.end_headers()
+        self.wfile.write(BODY)
+
+    def log_message(self, *args):
+        pass
+
+
+class BenchSpider(Spider):
+    def parse(self, response, request):
+        pass
+
+
+def bench(downloader, url: str, count: int) -> float:
+    """ 连续调用下载器 count 次
+
+    Returns:
+        每秒调用次数
+    """
+    spider = BenchSpider()
+    requests = [Request(url, spider.parse) for _ in range(count)]
+    downloader(requests[0])
+    start = time.perf_counter()
+    for request in requests:
+        response = downloader(request)
+        assert response.status_code == 200, response
+    return count / (time.perf_counter() - start)
+
+
+def import_time(module: str) -> float:
+    """ 在新的解释器中导入某个模块需要的时间（毫秒）
+    """
+    code = f'import time; t = time.perf_counter(); import {module}; ' \
+           f'print((time.perf_counter() - t) * 1000)'
+    output = subprocess.check_output([sys.executable, '-c', code])
+    return float(output)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_address[1]}/'
+
+    for name, downloader in (('requests_downloader', requests_downloader),
+                             ('http_downloader', http_downloader)):
+        print(f'{name:<20} {bench(downloader, url, count):>10.1f} calls/s')
+    print(f'{"import requests":<20} {import_time("requests"):>10.1f} ms')
+    print(f'{"import http.client":<20} {import_time("http.client"):>10.1f} ms')
+    server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,65 @@
+""" 请求队列策略测试。
+模拟爬取一个宽而深的网站（每个页面有 width 个子页面，最大深度 depth），
+不发送真实的请求，统计每种策略下请求队列的最大长度。
+
+    python example/benchmark/frontier_bench.py [width] [depth]
+"""
+import sys
+import time
+
+from requests_magic import Spider
+from requests_magic.request import Request
+from requests_magic.frontier import FIFOFrontier, LIFOFrontier, \
+    BestFirstFrontier, Frontier
+
+
+class BenchSpider(Spider):
+    def parse(self, response, request):
+        pass
+
+
+def crawl(frontier: Frontier, width: int, depth: int) -> int:
+    """ 从根页面开始模拟爬取，每取出一个请求就把它的子请求加入队列
+
+    Returns:
+        下载的页面数
+    """
+    spider = BenchSpider()
+    frontier.push(Request('https://example.com/', spider.parse, depth=0))
+    count = 0
+    while True:
+        request = frontier.pop()
+        if request is None:
+            return count
+        count += 1
+        if request.depth >= depth:
+            continue
+        frontier.extend([
+            Request(f'{request.url}{i}/', spider.parse,
+                    depth=request.depth + 1)
+            for i in range(width)
+        ])
+
+
+def main():
+    width = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+
+    strategies = (
+        ('bfs', FIFOFrontier()),
+        ('dfs', LIFOFrontier()),
+        # 优先下载 url 最后一段编号小的页面
+        ('best-first', BestFirstFrontier(
+            lambda r: -int(r.url.rstrip('/').rsplit('/', 1)[-1] or 0)
+            if r.depth else 0
+        )),
+    )
+    for name, frontier in strategies:
+        start = time.perf_counter()
+        count = crawl(frontier, width, depth)
+        print(f'{name:<12} {count:>8} pages  peak frontier {frontier.peak:>8}'
+              f'  {time.perf_counter() - start:>6.2f} s')
+
+
+if __name__ == '__main__':
+    main()
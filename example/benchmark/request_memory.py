@@ -0,0 +1,91 @@
+""" Request 内存占用测试。
+创建大量等待中的 Request，统计平均每个请求占用的字节数，
+并和改用 __slots__ 之前的 Request（DictRequest）比较。
+
+    python example/benchmark/request_memory.py [数量]
+"""
+import sys
+import tracemalloc
+from typing import Callable, List
+
+from requests_magic import Spider
+from requests_magic.request import Request
+
+
+class BenchSpider(Spider):
+    def __init__(self, scheduler=None, name: str = ''):
+        super().__init__(scheduler, name)
+        self.headers = {
+            'User-Agent': 'Mozilla/5.0 (X11; Linux x86_64) requests-magic',
+            'Accept': 'text/html,application/xhtml+xml',
+            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+        }
+        self.cookies = {'session': 'a' * 32}
+
+    def parse(self, response, request):
+        pass
+
+
+class DictRequest:
+    """ 改用 __slots__ 之前的 Request 在等待中时保存的字段：
+    属性保存在 __dict__ 中，每个请求复制一份爬虫的 headers、cookies，
+    创建空的 data、params、tags、kwargs，保存绑定方法和 show_url
+    """
+
+    def __init__(self, url: str, callback: Callable, method: str = 'GET',
+                 time_out: int = 10, time_out_wait: int = 15,
+                 time_out_retry: int = 3, wait: float = 0, name: str = '',
+                 **kwargs):
+        self.wait = wait
+        self.name = name
+        self.url = url
+        self.data = {}
+        self.params = {}
+        self.method = method
+        self.headers = callback.__self__.headers.copy()
+        self.cookies = callback.__self__.cookies.copy()
+        self.callback = callback
+        self.downloader = None
+        self.downloader_filter = None
+        self.tags = {}
+        self.scheduler = None
+        self.spider = callback.__self__
+        self.preparse = self.spider.preparse
+        self.start_time = -1
+        self.total_time = -1
+        self.time_out = time_out
+        self.time_out_wait = time_out_wait
+        self.time_out_retry = time_out_retry
+        self.kwargs = kwargs
+        self.response = None
+        self.show_url = \
+            (self.url if len(self.url) < 40 else '...') + self.url[-37:-1]
+        self._task = None
+
+
+def measure(cls, spider: BenchSpider, urls: List[str]) -> float:
+    """ 平均每个请求占用的字节数
+    """
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    requests = [cls(url, spider.parse) for url in urls]
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del requests
+    return (after - before) / len(urls)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    spider = BenchSpider()
+    urls = [f'https://example.com/list/{i}/item?page={i % 50}'
+            for i in range(count)]
+
+    print(f'{count} pending requests')
+    for name, cls in (('before (dict)', DictRequest),
+                      ('after (slots)', Request)):
+        print(f'{name:<14} {measure(cls, spider, urls):>8.1f} bytes per request')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,79 @@
+""" SimHash 签名计算速度测试。
+生成约 size KB 的随机 html 页面，比较逐位累加的 SimHash（原来的实现）和 simhash 的耗时，
+并检查两者的签名相同。
+
+    python example/benchmark/simhash_bench.py [size] [次数]
+"""
+import hashlib
+import random
+import sys
+import time
+from collections import Counter
+
+from requests_magic.simhash import get_features, simhash
+
+
+def simhash_per_bit(features, bits: int = 64) -> int:
+    """ 逐个特征、逐位累加权重的 SimHash，作为对照
+    """
+    vector = [0] * bits
+    for feature, weight in Counter(features).items():
+        h = int.from_bytes(
+            hashlib.md5(feature.encode('utf-8')).digest(), 'little'
+        )
+        for i in range(bits):
+            if h >> i & 1:
+                vector[i] += weight
+            else:
+                vector[i] -= weight
+    result = 0
+    for i in range(bits):
+        if vector[i] > 0:
+            result |= 1 << i
+    return result
+
+
+def create_page(size: int) -> str:
+    """ 生成大约 size KB 的 html 页面
+    """
+    random.seed(size)
+    words = [''.join(random.choices('abcdefghijklmnopqrstuvwxyz',
+                                    k=random.randint(2, 9)))
+             for _ in range(5000)]
+    paragraphs = []
+    length = 0
+    while length < size * 1024:
+        paragraph = '<p>' + ' '.join(random.choices(words, k=40)) + '</p>'
+        paragraphs.append(paragraph)
+        length += len(paragraph)
+    return '<html><body>' + '\n'.join(paragraphs) + '</body></html>'
+
+
+def measure(func, *args, times: int) -> float:
+    """ 平均每次调用的秒数
+    """
+    start = time.perf_counter()
+    for _ in range(times):
+        func(*args)
+    return (time.perf_counter() - start) / times
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 100
+    times = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    page = create_page(size)
+    features = get_features(page)
+    assert simhash(features) == simhash_per_bit(features)
+    print(f'page {len(page) / 1024:.1f} KB, {len(features)} features')
+    for name, func, args in (
+            ('get_features', get_features, (page,)),
+            ('per-bit', simhash_per_bit, (features,)),
+            ('simhash', simhash, (features,)),
+    ):
+        seconds = measure(func, *args, times=times)
+        print(f'{name:<14} {seconds * 1000:>8.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
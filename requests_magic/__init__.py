@@ -6,4 +6,6 @@ from .item import Item
 from .request import Request
 from .saver import Saver, SimpleFileSaver, SimpleConsoleSaver
 from .spider import Spider
+from .seed import SeedSource
+from .fingerprint import Fingerprinter
 from .mmlog import logger, console_handler
@@ -0,0 +1,179 @@
+"""响应存档，用于录制下载结果并在之后离线回放
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from dataclasses import asdict
+from typing import Dict, NoReturn, Optional
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request, Response
+
+
+class ResponseArchive:
+    """ 响应存档，把下载好的 Response 以 Request.md5 为键追加保存到一个文件中。
+
+    文件由一条条记录组成，每条记录是：
+    16 字节的 md5、1 字节标志位、4 字节元数据长度、4 字节 body 长度，
+    随后是 json 格式的元数据（url、状态码、响应头等）和 body（默认 zlib 压缩）。
+    同一个键写入多次时，以最后一次为准。
+    """
+
+    _head = struct.Struct('<16sBII')
+
+    # 标志位：body 经过 zlib 压缩
+    FLAG_COMPRESSED = 1
+
+    def __init__(self, path: str, compress: bool = True,
+                 compress_level: int = 1):
+        """ 响应存档，文件不存在时会自动创建
+
+        Args:
+            path: 存档文件路径
+            compress: 是否用 zlib 压缩 body，默认开启
+            compress_level: zlib 压缩等级，默认 1（最快）
+        """
+        self.path = path
+        self.compress = compress
+        self.compress_level = compress_level
+        self._lock = threading.Lock()
+        # md5 -> 记录在文件中的偏移
+        self._index: Dict[bytes, int] = {}
+        self._map: Optional[mmap.mmap] = None
+
+        folder = os.path.dirname(os.path.abspath(path))
+        if not os.path.exists(folder):
+            os.makedirs(folder)
+        self._file = open(path, 'a+b')
+        self._size = self._build_index()
+
+    def _build_index(self) -> int:
+        """ 扫描文件建立索引，丢弃末尾不完整的记录（例如崩溃时写了一半）
+
+        Returns:
+            有效数据的长度
+        """
+        self._file.seek(0, os.SEEK_END)
+        size = self._file.tell()
+        if size == 0:
+            return 0
+        head_size = self._head.size
+        with mmap.mmap(self._file.fileno(), 0,
+                       access=mmap.ACCESS_READ) as m:
+            offset = 0
+            while offset + head_size <= size:
+                key, _, meta_len, body_len = \
+                    self._head.unpack_from(m, offset)
+                end = offset + head_size + meta_len + body_len
+                if end > size:
+                    break
+                self._index[key] = offset
+                offset = end
+        if offset != size:
+            self._file.truncate(offset)
+        return offset
+
+    def _view(self, end: int) -> mmap.mmap:
+        """ 获取覆盖到 end 位置的只读映射，文件变长后会重新映射
+        """
+        if self._map is None or len(self._map) < end:
+            if self._map is not None:
+                self._map.close()
+            self._file.flush()
+            self._map = mmap.mmap(self._file.fileno(), 0,
+                                  access=mmap.ACCESS_READ)
+        return self._map
+
+    def __contains__(self, key: str) -> bool:
+        return bytes.fromhex(key) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def put(self, key: str, response: 'Response') -> NoReturn:
+        """ 保存一个响应
+
+        Args:
+            key: 键，一般是 Request.md5()
+            response: 响应
+        """
+        meta = json.dumps({
+            'url': response.url,
+            'status_code': response.status_code,
+            'reason': response.reason,
+            'headers': dict(response.headers),
+            'request_time': response.request_time,
+            'set_cookies': [asdict(c) for c in response.set_cookies],
+        }, ensure_ascii=False).encode('utf-8')
+        body = response.content
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        flags = 0
+        if self.compress:
+            body = zlib.compress(body, self.compress_level)
+            flags |= self.FLAG_COMPRESSED
+        head = self._head.pack(
+            bytes.fromhex(key), flags, len(meta), len(body)
+        )
+        with self._lock:
+            offset = self._size
+            self._file.write(head)
+            self._file.write(meta)
+            self._file.write(body)
+            self._size += len(head) + len(meta) + len(body)
+            self._index[bytes.fromhex(key)] = offset
+
+    def get(self, key: str, request: 'Request') -> Optional['Response']:
+        """ 读取一个响应
+
+        Args:
+            key: 键，一般是 Request.md5()
+            request: 读取出来的响应所属的请求
+
+        Returns:
+            Response，如果不存在则返回 None
+        """
+        from .request import Response, SetCookie
+        with self._lock:
+            offset = self._index.get(bytes.fromhex(key))
+            if offset is None:
+                return None
+            head_size = self._head.size
+            m = self._view(self._size)
+            _, flags, meta_len, body_len = \
+                self._head.unpack_from(m, offset)
+            start = offset + head_size
+            meta = m[start:start + meta_len]
+            body = m[start + meta_len:start + meta_len + body_len]
+        if flags & self.FLAG_COMPRESSED:
+            body = zlib.decompress(body)
+        meta = json.loads(meta)
+        return Response(
+            request=request,
+            url=meta['url'],
+            status_code=meta['status_code'],
+            reason=meta['reason'],
+            content=body,
+            headers=meta['headers'],
+            request_time=meta['request_time'],
+            set_cookies=[SetCookie(**c) for c in meta['set_cookies']]
+        )
+
+    def flush(self) -> NoReturn:
+        """ 把缓冲区写入磁盘
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self) -> NoReturn:
+        """ 关闭存档
+        """
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._map = None
+            self._file.close()
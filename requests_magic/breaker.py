@@ -0,0 +1,178 @@
+"""按主机的熔断器，主机连续失败时暂停向它发送请求
+"""
+import threading
+import time
+from dataclasses import dataclass, asdict
+from typing import Dict, List, Any, NoReturn
+from urllib.parse import urlsplit
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+def get_host(url: str) -> str:
+    """ 获取 url 的主机（包括端口），熔断器按这个值区分主机
+    """
+    return urlsplit(url).netloc.lower()
+
+
+@dataclass
+class HostCircuit:
+    """ 一个主机的熔断状态
+    """
+    state: str = CLOSED
+    # 连续失败次数
+    failures: int = 0
+    # 打开的次数，每次探测失败后等待时间翻倍
+    trips: int = 0
+    # 打开状态下，到这个时间（时间戳）之后可以开始探测
+    retry_at: float = 0
+    # 正在进行的探测请求数
+    probing: int = 0
+
+
+class CircuitBreaker:
+    """ 按主机的熔断器，交给调度器的 circuit_breaker 参数使用。
+        关闭（closed）：正常下载，连续失败（超时、重试、放弃）failure_threshold 次后打开
+        打开（open）：这个主机的请求不会被下载，而是被调度器暂存起来，reset_timeout 秒之后半打开
+        半打开（half_open）：只允许 half_open_probes 个请求作为探测，
+            探测成功则关闭并把暂存的请求放回请求队列，失败则重新打开，等待时间翻倍（最多 max_reset_timeout 秒）
+    """
+
+    def __init__(self, failure_threshold: int = 5,
+                 reset_timeout: float = 30,
+                 half_open_probes: int = 1,
+                 max_reset_timeout: float = 600):
+        """ 按主机的熔断器
+
+        Args:
+            failure_threshold: 连续失败多少次后打开，默认 5
+            reset_timeout: 打开多少秒后开始探测，默认 30 秒
+            half_open_probes: 半打开时同时进行的探测请求数，默认 1
+            max_reset_timeout: 探测连续失败时等待时间的上限，默认 600 秒
+        """
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.half_open_probes = half_open_probes
+        self.max_reset_timeout = max_reset_timeout
+        self._circuits: Dict[str, HostCircuit] = {}
+        self._lock = threading.Lock()
+
+    def allow(self, host: str, now: float = None) -> bool:
+        """ 是否可以向这个主机发送请求。
+        打开的主机到了探测时间时会变为半打开，并把这次请求当作探测
+
+        Args:
+            host: 主机
+            now: 当前时间戳，默认 time.time()
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None or circuit.state == CLOSED:
+                return True
+            if circuit.state == OPEN:
+                if (time.time() if now is None else now) < circuit.retry_at:
+                    return False
+                circuit.state = HALF_OPEN
+                circuit.probing = 0
+            if circuit.probing >= self.half_open_probes:
+                return False
+            circuit.probing += 1
+            return True
+
+    def is_open(self, host: str) -> bool:
+        """ 主机是否处于打开或半打开状态（请求需要暂存）
+        """
+        circuit = self._circuits.get(host)
+        return circuit is not None and circuit.state != CLOSED
+
+    def record_success(self, host: str) -> bool:
+        """ 记录一次成功的下载
+
+        Returns:
+            是否从半打开变为关闭，为 True 时应该放回暂存的请求
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is None:
+                return False
+            recovered = circuit.state != CLOSED
+            if recovered or circuit.failures:
+                self._circuits[host] = HostCircuit()
+            return recovered
+
+    def release_probe(self, host: str) -> NoReturn:
+        """ 归还一个没有得到结果的探测名额（例如不算作失败的重试、保存状态时被取消），
+        否则半打开的主机会一直等待这个探测的结果
+        """
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit is not None and circuit.state == HALF_OPEN:
+                circuit.probing = max(circuit.probing - 1, 0)
+
+    def record_failure(self, host: str, now: float = None) -> bool:
+        """ 记录一次失败的下载（超时、重试或放弃）
+
+        Returns:
+            这次失败是否让主机打开
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            circuit = self._circuits.setdefault(host, HostCircuit())
+            circuit.failures += 1
+            if circuit.state == HALF_OPEN:
+                circuit.probing = max(circuit.probing - 1, 0)
+            elif circuit.state == OPEN or \
+                    circuit.failures < self.failure_threshold:
+                return False
+            circuit.state = OPEN
+            circuit.trips += 1
+            circuit.retry_at = now + min(
+                self.reset_timeout * 2 ** (circuit.trips - 1),
+                self.max_reset_timeout
+            )
+            return True
+
+    def get_info(self, now: float = None) -> List[Dict[str, Any]]:
+        """ 获取有失败记录的主机的状态，打开的主机在前
+
+        Returns:
+            信息字典列表，retry_in 是距离可以探测的秒数
+        """
+        now = time.time() if now is None else now
+        with self._lock:
+            result = [{
+                'host': host,
+                'state': c.state,
+                'failures': c.failures,
+                'trips': c.trips,
+                'retry_in': max(c.retry_at - now, 0)
+                if c.state == OPEN else 0,
+            } for host, c in self._circuits.items()
+                if c.state != CLOSED or c.failures]
+        result.sort(key=lambda x: (x['state'] == CLOSED, -x['failures']))
+        return result
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        """ 转换为可以保存的 dict，只保存有失败记录的主机，
+        正在进行的探测不会保存，半打开的主机读取后会重新探测
+        """
+        with self._lock:
+            result = {}
+            for host, c in self._circuits.items():
+                if c.state == CLOSED and not c.failures:
+                    continue
+                value = asdict(c)
+                value['probing'] = 0
+                if c.state == HALF_OPEN:
+                    value['state'] = OPEN
+                result[host] = value
+            return result
+
+    def load_dict(self, data: Dict[str, Dict[str, Any]]) -> NoReturn:
+        """ 读取 to_dict 保存的状态
+        """
+        with self._lock:
+            for host, value in data.items():
+                self._circuits[host] = HostCircuit(**value)
@@ -0,0 +1,202 @@
+"""DNS 解析缓存和预解析
+"""
+import ipaddress
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Tuple, Optional, Iterable, NoReturn, Any, Set
+
+# 安装缓存之前的 socket.getaddrinfo
+_original_getaddrinfo = socket.getaddrinfo
+# 当前安装的缓存
+_installed: Optional['DNSCache'] = None
+
+
+def _is_ip(host) -> bool:
+    if isinstance(host, bytes):
+        host = host.decode('ascii', 'ignore')
+    try:
+        ipaddress.ip_address(host.split('%', 1)[0])
+        return True
+    except ValueError:
+        return False
+
+
+class DNSCache:
+    """ 进程内的 DNS 解析缓存。
+    install 之后会替换 socket.getaddrinfo，所以 requests、http.client、asyncio 的解析都会经过它。
+    同一个主机同时只会解析一次，其他线程等待这次解析的结果。
+    解析失败的结果也会缓存 negative_ttl 秒
+
+    Warnings:
+        socket.getaddrinfo 不会返回 DNS 记录的 TTL，所以缓存时间是固定的 ttl，
+        DNS 记录变化后最多 ttl 秒才会生效
+    """
+
+    def __init__(self, ttl: float = 300,
+                 negative_ttl: float = 30,
+                 max_size: int = 10000,
+                 prefetch_workers: int = 4):
+        """ DNS 解析缓存
+
+        Args:
+            ttl: 解析结果缓存的时间，默认 300 秒
+            negative_ttl: 解析失败的结果缓存的时间，默认 30 秒，0 表示不缓存
+            max_size: 最多缓存的解析结果数量，超出时移除最早的，默认 10000
+            prefetch_workers: 预解析使用的线程数，默认 4
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_size = max_size
+        self.prefetch_workers = prefetch_workers
+        # 参数 -> (过期时间, 结果列表或解析错误)
+        self._cache: Dict[tuple, Tuple[float, Any]] = {}
+        # 正在解析的参数 -> 解析完成的事件
+        self._pending: Dict[tuple, threading.Event] = {}
+        self._prefetching: Set[tuple] = set()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.prefetched = 0
+
+    def __len__(self) -> int:
+        return len(self._cache)
+
+    def _get(self, key: tuple, now: float) -> Optional[Tuple[float, Any]]:
+        entry = self._cache.get(key)
+        if entry is not None and entry[0] <= now:
+            del self._cache[key]
+            return None
+        return entry
+
+    def _put(self, key: tuple, value: Any, ttl: float) -> NoReturn:
+        if ttl <= 0:
+            return
+        self._cache.pop(key, None)
+        while len(self._cache) >= self.max_size:
+            del self._cache[next(iter(self._cache))]
+        self._cache[key] = (time.monotonic() + ttl, value)
+
+    def getaddrinfo(self, host, port, family=0, type=0, proto=0, flags=0):
+        """ 和 socket.getaddrinfo 相同，但是会使用缓存
+        """
+        if host is None or _is_ip(host):
+            return _original_getaddrinfo(host, port, family, type,
+                                         proto, flags)
+        if isinstance(host, bytes):
+            host = host.decode('idna')
+        key = (host.lower(), port, family, type, proto, flags)
+        while True:
+            with self._lock:
+                entry = self._get(key, time.monotonic())
+                if entry is not None:
+                    self.hits += 1
+                    if isinstance(entry[1], Exception):
+                        raise socket.gaierror(*entry[1].args)
+                    return list(entry[1])
+                event = self._pending.get(key)
+                if event is None:
+                    self._pending[key] = threading.Event()
+                    self.misses += 1
+                    break
+            # 等待其他线程的解析结果
+            event.wait()
+        try:
+            result = _original_getaddrinfo(host, port, family, type,
+                                           proto, flags)
+        except socket.gaierror as e:
+            with self._lock:
+                self._put(key, e, self.negative_ttl)
+            raise
+        else:
+            with self._lock:
+                self._put(key, tuple(result), self.ttl)
+            return result
+        finally:
+            with self._lock:
+                self._pending.pop(key).set()
+
+    def is_cached(self, host: str, port: int) -> bool:
+        """ 主机是否已经有缓存（使用 TCP 连接的参数）或正在解析
+        """
+        key = (host.lower(), port, 0, socket.SOCK_STREAM, 0, 0)
+        with self._lock:
+            return key in self._pending or key in self._prefetching or \
+                self._get(key, time.monotonic()) is not None
+
+    def prefetch(self, hosts: Iterable[Tuple[str, int]]) -> int:
+        """ 在后台线程中预先解析主机，使用和 http.client、requests、asyncio 建立 TCP 连接时相同的参数
+
+        Args:
+            hosts: (主机, 端口)
+
+        Returns:
+            新开始预解析的主机数量
+        """
+        count = 0
+        for host, port in hosts:
+            if not host or _is_ip(host) or self.is_cached(host, port):
+                continue
+            key = (host.lower(), port, 0, socket.SOCK_STREAM, 0, 0)
+            with self._lock:
+                if key in self._prefetching:
+                    continue
+                self._prefetching.add(key)
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.prefetch_workers,
+                        thread_name_prefix='mm-DNSPrefetch'
+                    )
+            self._executor.submit(self._prefetch_one, key)
+            count += 1
+        return count
+
+    def _prefetch_one(self, key: tuple) -> NoReturn:
+        try:
+            self.getaddrinfo(key[0], key[1], 0, socket.SOCK_STREAM)
+            with self._lock:
+                self.prefetched += 1
+        except (OSError, UnicodeError):
+            pass
+        finally:
+            with self._lock:
+                self._prefetching.discard(key)
+
+    def clear(self) -> NoReturn:
+        """ 清空缓存
+        """
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, int]:
+        """ 获取统计数据：缓存数量、命中次数、解析次数、预解析次数
+        """
+        return {
+            'dns_cached': len(self._cache),
+            'dns_hits': self.hits,
+            'dns_misses': self.misses,
+            'dns_prefetched': self.prefetched,
+        }
+
+    def install(self) -> NoReturn:
+        """ 用这个缓存替换 socket.getaddrinfo，对整个进程生效
+        """
+        global _installed
+        _installed = self
+        socket.getaddrinfo = self.getaddrinfo
+
+    def uninstall(self) -> NoReturn:
+        """ 恢复原来的 socket.getaddrinfo
+        """
+        global _installed
+        if _installed is self:
+            _installed = None
+            socket.getaddrinfo = _original_getaddrinfo
+
+
+def get_installed() -> Optional[DNSCache]:
+    """ 获取当前安装的 DNS 缓存，没有安装时返回 None
+    """
+    return _installed
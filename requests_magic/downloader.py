@@ -1,11 +1,17 @@
 """下载中间件们
 """
 
-from typing import Union
+import asyncio
+import http.client
+import socket
+import zlib
+from typing import Union, Callable, List, Optional, Tuple
 from requests_magic.requests_adapter import \
     create_requests_request_kwargs_from_magic_request, \
     create_response_from_requests
-import requests
+from requests_magic.http_adapter import asyncio_fetch, http_fetch, \
+    close_asyncio_pool, is_asyncio_pool_managed
+from requests_magic.proxy import ProxyPool
 
 __FUCK_CIRCULAR_IMPORT = False
 if __FUCK_CIRCULAR_IMPORT:
@@ -29,15 +35,18 @@ class Retry(DownloaderFailOperate):
     """ 无条件重试当前请求
     """
 
-    def __init__(self, wait: float = 0, jump_in_line: bool = False):
+    def __init__(self, wait: float = 0, jump_in_line: bool = False,
+                 failure: bool = True):
         """ 无条件重试当前请求
 
         Args:
             wait: 等待一段时候后再重试（重新添加到待请求队列）
             jump_in_line: 是否插队到队列最前端
+            failure: 是否算作主机的一次失败（熔断器会统计），默认 True
         """
         self.jump_in_line = jump_in_line
         self.wait = wait
+        self.failure = failure
 
 
 class Timeout(DownloaderFailOperate):
@@ -54,6 +63,62 @@ class Error(DownloaderFailOperate):
         self.message = message
 
 
+def batch_downloader(func: Callable = None, *, max_size: int = 0):
+    """批量下载器装饰器。
+    被装饰的下载器不再是 downloader(request) -> Response，而是
+    downloader(requests, complete)，调度器会把同一次循环中准备好的、使用同一个批量下载器的请求一起交给它。
+    每个请求下载完成后（顺序随意，可以在任意线程中），调用 complete(request, result) 交回结果，
+    result 和普通下载器的返回值一样，可以是 Response、DownloaderFailOperate 或异常。
+    批量下载器也可以是协程函数。
+
+    Args:
+        func: 被装饰的下载器
+        max_size: 一批最多包含的请求数，默认 0 表示不限制
+
+    Examples:
+        >>> @batch_downloader
+        >>> def my_downloader(requests, complete):
+        >>>     for request in requests:
+        >>>         complete(request, requests_downloader(request))
+    """
+
+    def decorator(f: Callable) -> Callable:
+        f.batch = True
+        f.batch_max_size = max_size
+        return f
+
+    if func is None:
+        return decorator
+    return decorator(func)
+
+
+def is_batch_downloader(downloader: Callable) -> bool:
+    """ 判断一个下载器是否是批量下载器
+    """
+    return getattr(downloader, 'batch', False)
+
+
+def acquire_proxy(request: 'Request') \
+        -> Tuple[Optional[ProxyPool], Optional[str]]:
+    """ 从调度器的代理池中为请求选择代理。
+    调度器没有代理池，或 Request 的 kwargs 中已经指定了 proxy、proxies 时不使用代理池
+
+    Returns:
+        (代理池, 代理)，不使用代理池时都是 None，代理池没有可用的代理时代理为 None
+    """
+    pool = getattr(request.scheduler, 'proxy_pool', None)
+    if pool is None or 'proxy' in request.kwargs or \
+            'proxies' in request.kwargs:
+        return None, None
+    return pool, pool.acquire(request)
+
+
+def no_proxy_retry(pool: ProxyPool) -> Retry:
+    """ 代理池没有可用的代理时，让请求等待一段时间后重试，不算作主机的失败
+    """
+    return Retry(wait=pool.retry_wait, failure=False)
+
+
 def requests_downloader(request: 'Request') \
         -> Union['Response', DownloaderFailOperate]:
     """这是默认的下载中间件，基于 requests。
@@ -66,18 +131,114 @@ def requests_downloader(request: 'Request') \
         返回 Response，或者下载失败时返回 DownloaderFailOperate 的子类们（Retry,Abandon,Timeout,Error等）
         如果返回的是个异常，也会和 Error 类一样放弃请求并显示错误信息
     """
-    kwargs = \
-        create_requests_request_kwargs_from_magic_request(request)
+    # 用到时才导入 requests，只使用标准库下载器时不需要付出导入 requests 的时间
+    import requests
+    pool, proxy = acquire_proxy(request)
+    if pool is not None and proxy is None:
+        return no_proxy_retry(pool)
+    result = None
     try:
-        return \
+        kwargs = \
+            create_requests_request_kwargs_from_magic_request(request)
+        if proxy is not None:
+            kwargs['proxies'] = {'http': proxy, 'https': proxy}
+        result = \
             create_response_from_requests(
                 requests.request(**kwargs), request
             )
-
     except requests.Timeout:
-        return Timeout()
+        result = Timeout()
     except requests.RequestException as e:
-        return Error(e)
+        result = Error(e)
+    finally:
+        # 其他异常时 result 为 None，只归还代理
+        if pool is not None:
+            pool.release(proxy, result)
+    return result
+
+
+def http_downloader(request: 'Request') \
+        -> Union['Response', DownloaderFailOperate]:
+    """基于标准库 http.client 的下载器，可以直接替换 requests_downloader。
+    同一个主机的请求会复用 keep-alive 连接，每次请求的额外开销比 requests 小很多，
+    适合大量简单 GET 请求的爬虫。
+
+    Args:
+        request: 请求
+    Returns:
+        和 requests_downloader 相同。
+        Request 的 kwargs 中只有 verify、allow_redirects 和 proxy（http 代理地址）会生效
+    """
+    pool, proxy = acquire_proxy(request)
+    if pool is not None and proxy is None:
+        return no_proxy_retry(pool)
+    result = None
+    try:
+        result = http_fetch(request, proxy)
+    except socket.timeout:
+        result = Timeout()
+    except (OSError, http.client.HTTPException, ValueError,
+            zlib.error) as e:
+        result = Error(e)
+    finally:
+        # 其他异常时 result 为 None，只归还代理
+        if pool is not None:
+            pool.release(proxy, result)
+    return result
+
+
+async def asyncio_downloader(request: 'Request') \
+        -> Union['Response', DownloaderFailOperate]:
+    """基于 asyncio 的下载器，只依赖标准库，是一个协程函数。
+    使用 asyncio 下载引擎时，默认的 requests_downloader 会自动换成它（kwargs 中只有下面支持的参数时），
+    所有请求都在同一个事件循环线程中进行。
+    在多线程下载引擎中也可以使用，这时每个请求会在自己的线程中运行一个事件循环。
+
+    Args:
+        request: 请求
+    Returns:
+        和 requests_downloader 相同。
+        Request 的 kwargs 中只有 verify、allow_redirects 和 proxy（http 代理地址）会生效
+    """
+    pool, proxy = acquire_proxy(request)
+    if pool is not None and proxy is None:
+        return no_proxy_retry(pool)
+    result = None
+    try:
+        result = await asyncio.wait_for(
+            asyncio_fetch(request, proxy), request.time_out
+        )
+    except asyncio.TimeoutError:
+        result = Timeout()
+    except (OSError, EOFError, ValueError, zlib.error) as e:
+        result = Error(e)
+    finally:
+        # 被取消（例如对冲的另一个下载先完成）时 result 为 None，只归还代理
+        if pool is not None:
+            pool.release(proxy, result)
+        # 临时的事件循环（例如自己调用 asyncio.run）结束后连接池不会再被使用
+        if not is_asyncio_pool_managed(asyncio.get_running_loop()):
+            close_asyncio_pool()
+    return result
+
+
+@batch_downloader
+async def asyncio_batch_downloader(
+        requests: List['Request'],
+        complete: Callable[['Request', Union['Response', DownloaderFailOperate]], None]):
+    """基于 asyncio 的批量下载器，同一批请求在一个事件循环中并发下载，
+    每个请求完成时立刻交回结果。
+    在多线程下载引擎中，一批请求只占用一个线程。
+
+    Args:
+        requests: 同一批请求
+        complete: 完成回调
+    """
+
+    async def download(request: 'Request'):
+        complete(request, await asyncio_downloader(request))
+
+    await asyncio.gather(*(download(r) for r in requests))
 
 
 def requests_downloader_filter(
@@ -94,3 +255,42 @@ def requests_downloader_filter(
         如果返回的是个异常，也会和 Error 类一样放弃请求并显示错误信息
         如果不返回则表示下载结果可接受
     """
+
+
+def recording_downloader(request: 'Request') \
+        -> Union['Response', DownloaderFailOperate]:
+    """录制下载器，使用 requests_downloader 下载，并把下载结果以 Request.md5 为键
+    保存到调度器的 response_archive 中，之后可以用 replay_downloader 回放。
+
+    Args:
+        request: 请求
+    Returns:
+        和 requests_downloader 相同
+    """
+    archive = request.scheduler.response_archive
+    if archive is None:
+        return Error('The scheduler has no response_archive to record to')
+    response = requests_downloader(request)
+    if isinstance(response, (DownloaderFailOperate, Exception)):
+        return response
+    archive.put(request.md5(), response)
+    return response
+
+
+def replay_downloader(request: 'Request') \
+        -> Union['Response', DownloaderFailOperate]:
+    """回放下载器，不访问网络，直接从调度器的 response_archive 中读取
+    recording_downloader 录制的响应，适合修改解析函数后重新解析。
+
+    Args:
+        request: 请求
+    Returns:
+        Response，如果存档中没有这个请求则返回 Error
+    """
+    archive = request.scheduler.response_archive
+    if archive is None:
+        return Error('The scheduler has no response_archive to replay from')
+    response = archive.get(request.md5(), request)
+    if response is None:
+        return Error(f'No archived response for {request.url}')
+    return response
@@ -0,0 +1,252 @@
+"""下载引擎，决定 Request 的下载器在哪里、以什么方式运行
+"""
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, Future
+from typing import Dict, NoReturn, Union, List, Callable
+from requests_magic.mmlog import logger
+import requests_magic.downloader as magic_d
+from requests_magic.http_adapter import run_asyncio, manage_asyncio_pool
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request
+
+
+class DownloadEngine:
+    """ 下载引擎基类。
+    调度器把准备好的请求交给引擎，引擎运行请求的下载器，
+    并把下载器的返回值交给 Request._download_done，
+    后续的下载过滤器、重试、放弃等操作和引擎无关
+    """
+
+    def start(self, request: 'Request', task: object) -> NoReturn:
+        """ 开始下载一个请求
+
+        Args:
+            request: 请求
+            task: 这次下载的标识，下载完成后需要原样交给 Request._download_done
+        """
+        raise NotImplementedError()
+
+    def start_batch(self, requests: List['Request'],
+                    tasks: List[object]) -> NoReturn:
+        """ 开始下载一批使用同一个批量下载器的请求
+
+        Args:
+            requests: 请求们
+            tasks: 和 requests 一一对应的下载标识
+        """
+        raise NotImplementedError()
+
+    def cancel(self, task: object) -> NoReturn:
+        """ 尽量取消一次下载，不能取消也没关系，Request 会忽略被停止的下载的结果
+        """
+        pass
+
+    def close(self) -> NoReturn:
+        """ 关闭引擎
+        """
+        pass
+
+
+def create_batch_complete(requests: List['Request'], tasks: List[object]) \
+        -> Callable[['Request', object], NoReturn]:
+    """ 创建交给批量下载器的完成回调，每个请求只有第一次调用有效
+
+    Returns:
+        complete(request, result)
+    """
+    pending = {id(r): t for r, t in zip(requests, tasks)}
+
+    def complete(request: 'Request', response) -> NoReturn:
+        task = pending.pop(id(request), None)
+        if task is not None:
+            request._download_done(task, response)
+
+    return complete
+
+
+class ThreadEngine(DownloadEngine):
+    """ 多线程下载引擎，每个请求一个线程，这是默认的引擎
+    """
+
+    def start(self, request: 'Request', task: object) -> NoReturn:
+        threading.Thread(
+            target=self._run, args=(request, task)
+        ).start()
+
+    @staticmethod
+    def _run(request: 'Request', task: object) -> NoReturn:
+        """ 下载线程执行的方法
+        """
+        downloader = request.downloader
+        try:
+            if asyncio.iscoroutinefunction(downloader):
+                response = run_asyncio(downloader(request))
+            else:
+                response = downloader(request)
+        except Exception as e:
+            response = e
+        request._download_done(task, response)
+
+    def start_batch(self, requests: List['Request'],
+                    tasks: List[object]) -> NoReturn:
+        threading.Thread(
+            target=self._run_batch, args=(requests, tasks)
+        ).start()
+
+    @staticmethod
+    def _run_batch(requests: List['Request'],
+                   tasks: List[object]) -> NoReturn:
+        """ 批量下载线程执行的方法，一批请求只占用一个线程
+        """
+        complete = create_batch_complete(requests, tasks)
+        downloader = requests[0].downloader
+        try:
+            if asyncio.iscoroutinefunction(downloader):
+                run_asyncio(downloader(requests, complete))
+            else:
+                downloader(requests, complete)
+        except Exception as e:
+            for request in requests:
+                complete(request, e)
+
+
+class AsyncioEngine(DownloadEngine):
+    """ asyncio 下载引擎，全部请求都在同一个事件循环线程中下载。
+    协程下载器直接在事件循环中运行，默认的 requests_downloader 会换成 asyncio_downloader
+    （kwargs 中有 asyncio_downloader 不支持的参数时除外），
+    其他的普通下载器会放到线程池中运行
+    """
+
+    # asyncio_downloader 支持的 Request.kwargs
+    asyncio_kwargs = {'verify', 'allow_redirects', 'proxy'}
+
+    def __init__(self, max_workers: int = None):
+        """ asyncio 下载引擎
+
+        Args:
+            max_workers: 运行普通（非协程）下载器的线程池大小，默认由 ThreadPoolExecutor 决定
+        """
+        self._loop = asyncio.new_event_loop()
+        manage_asyncio_pool(self._loop)
+        self._thread = threading.Thread(
+            target=self._loop.run_forever,
+            name='mm-AsyncioEngine', daemon=True
+        )
+        self._start_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers)
+        self._futures: Dict[object, Future] = {}
+        # 是否已经提示过有请求不能换成 asyncio_downloader
+        self._swap_warned = False
+
+    @property
+    def loop(self) -> asyncio.AbstractEventLoop:
+        """ 引擎的事件循环
+        """
+        return self._loop
+
+    def start(self, request: 'Request', task: object) -> NoReturn:
+        with self._start_lock:
+            if not self._thread.is_alive():
+                self._thread.start()
+        future = asyncio.run_coroutine_threadsafe(
+            self._download(request, task), self._loop
+        )
+        self._futures[task] = future
+        future.add_done_callback(lambda f: self._futures.pop(task, None))
+
+    async def _download(self, request: 'Request', task: object) -> NoReturn:
+        """ 在事件循环中执行的下载方法
+        """
+        downloader = request.downloader
+        if downloader is magic_d.requests_downloader:
+            downloader = self._swap_downloader(request)
+        try:
+            if asyncio.iscoroutinefunction(downloader):
+                response = await downloader(request)
+            else:
+                response = await self._loop.run_in_executor(
+                    self._executor, downloader, request
+                )
+        except asyncio.CancelledError:
+            return
+        except Exception as e:
+            response = e
+        # 下载已经结束，不再需要取消
+        self._futures.pop(task, None)
+        request._download_done(task, response)
+
+    def _swap_downloader(self, request: 'Request') -> Callable:
+        """ 请求只用到 asyncio_downloader 支持的 kwargs 时换成 asyncio_downloader，
+        否则（例如 proxies、auth、cert、stream）仍然在线程池中使用 requests_downloader
+        """
+        unsupported = set(request.kwargs) - self.asyncio_kwargs
+        if not unsupported:
+            return magic_d.asyncio_downloader
+        if not self._swap_warned:
+            self._swap_warned = True
+            logger.warning(
+                f"Request kwargs {sorted(unsupported)} are not supported by "
+                f"asyncio_downloader, these requests use requests_downloader "
+                f"in the thread pool"
+            )
+        return magic_d.requests_downloader
+
+    def start_batch(self, requests: List['Request'],
+                    tasks: List[object]) -> NoReturn:
+        with self._start_lock:
+            if not self._thread.is_alive():
+                self._thread.start()
+        asyncio.run_coroutine_threadsafe(
+            self._download_batch(requests, tasks), self._loop
+        )
+
+    async def _download_batch(self, requests: List['Request'],
+                              tasks: List[object]) -> NoReturn:
+        """ 在事件循环中执行的批量下载方法
+        """
+        complete = create_batch_complete(requests, tasks)
+        downloader = requests[0].downloader
+        try:
+            if asyncio.iscoroutinefunction(downloader):
+                await downloader(requests, complete)
+            else:
+                await self._loop.run_in_executor(
+                    self._executor, downloader, requests, complete
+                )
+        except Exception as e:
+            for request in requests:
+                complete(request, e)
+
+    def cancel(self, task: object) -> NoReturn:
+        future = self._futures.pop(task, None)
+        if future is not None:
+            future.cancel()
+
+    def close(self) -> NoReturn:
+        if self._thread.is_alive():
+            self._loop.call_soon_threadsafe(self._loop.stop)
+        self._executor.shutdown(wait=False)
+
+
+# 可以用名字选择的引擎
+engines = {
+    'thread': ThreadEngine,
+    'asyncio': AsyncioEngine,
+}
+
+
+def create_engine(engine: Union[str, DownloadEngine]) -> DownloadEngine:
+    """ 根据名字创建引擎，如果已经是引擎实例则直接返回
+
+    Args:
+        engine: 引擎名字（thread、asyncio）或 DownloadEngine 实例
+    """
+    if isinstance(engine, DownloadEngine):
+        return engine
+    if engine not in engines:
+        logger.error(f"Unknown download engine: {engine}")
+        raise ValueError(engine)
+    return engines[engine]()
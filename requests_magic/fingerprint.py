@@ -0,0 +1,193 @@
+"""请求指纹，用于请求去重
+"""
+import hashlib
+import json
+import re
+from typing import Dict, Any, Sequence, Iterable, Tuple, List, Type
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request
+
+# 默认去掉的跟踪参数
+tracking_params = (
+    'utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content',
+    'utm_id', 'gclid', 'dclid', 'fbclid', 'msclkid', 'yclid', 'mc_cid',
+    'mc_eid', '_ga', 'spm',
+)
+
+# 协议的默认端口
+default_ports = {'http': 80, 'https': 443}
+
+_percent_escape = re.compile(r'%[0-9a-fA-F]{2}')
+
+
+def _upper_escape(match) -> str:
+    return match.group(0).upper()
+
+
+def _expand_params(params: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+    """ 把 Request.params 展开成 (key, value) 对，列表值会展开成多个
+    """
+    for k, v in params.items():
+        if isinstance(v, (list, tuple)):
+            for i in v:
+                yield str(k), str(i)
+        elif v is not None:
+            yield str(k), str(v)
+
+
+def canonicalize_url(url: str, params: Dict[str, Any] = None,
+                     keep_fragment: bool = False,
+                     strip_params: Sequence[str] = tracking_params,
+                     sort_query: bool = True,
+                     strip_trailing_slash: bool = True) -> str:
+    """ 把 url 转换为规范形式，等价的 url 会得到相同的结果。
+    协议和主机名转为小写、去掉默认端口、空路径变为 /、百分号编码转为大写
+
+    Args:
+        url: url
+        params: 额外的查询参数（Request.params），会合并到查询字符串中
+        keep_fragment: 是否保留 # 后面的部分，默认不保留
+        strip_params: 需要去掉的查询参数，默认是常见的跟踪参数
+        sort_query: 是否对查询参数排序，默认排序
+        strip_trailing_slash: 是否去掉路径末尾的 /（根路径除外），默认去掉
+
+    Returns:
+        规范化后的 url
+    """
+    scheme, netloc, path, query, fragment = urlsplit(url.strip())
+    scheme = scheme.lower()
+
+    # netloc
+    userinfo, _, host = netloc.rpartition('@')
+    host = host.lower()
+    if host.endswith(f':{default_ports.get(scheme)}'):
+        host = host.rsplit(':', 1)[0]
+    netloc = f'{userinfo}@{host}' if userinfo else host
+
+    # path
+    if '%' in path:
+        path = _percent_escape.sub(_upper_escape, path)
+    if not path:
+        path = '/'
+    elif strip_trailing_slash and len(path) > 1 and path.endswith('/'):
+        path = path.rstrip('/') or '/'
+
+    # query
+    if query or params:
+        pairs: List[Tuple[str, str]] = parse_qsl(query, keep_blank_values=True)
+        if params:
+            pairs.extend(_expand_params(params))
+        if strip_params:
+            pairs = [p for p in pairs if p[0] not in strip_params]
+        if sort_query:
+            pairs.sort()
+        query = urlencode(pairs)
+
+    if not keep_fragment:
+        fragment = ''
+    return urlunsplit((scheme, netloc, path, query, fragment))
+
+
+# 类名 -> 指纹策略，用于从保存的状态中恢复
+fingerprinters: Dict[str, Type['Fingerprinter']] = {}
+
+
+class Fingerprinter:
+    """ 请求指纹策略，默认使用 请求方法、规范化的 url（包括 params）、data 和指定的请求头计算 md5。
+    可以给 Spider.fingerprinter 设置不同的实例，不同爬虫可以使用不同的策略。
+    继承时如果增加了参数，需要同时重写 to_dict，子类会自动注册，读取状态时可以恢复
+    """
+
+    def __init__(self, keep_fragment: bool = False,
+                 strip_params: Sequence[str] = tracking_params,
+                 sort_query: bool = True,
+                 strip_trailing_slash: bool = True,
+                 include_headers: Sequence[str] = (),
+                 include_data: bool = True):
+        """ 请求指纹策略
+
+        Args:
+            keep_fragment: 是否保留 url 中 # 后面的部分，默认不保留
+            strip_params: 需要去掉的查询参数，默认是常见的跟踪参数
+            sort_query: 是否对查询参数排序，默认排序
+            strip_trailing_slash: 是否去掉路径末尾的 /，默认去掉
+            include_headers: 需要计入指纹的请求头（不区分大小写），默认不计入请求头
+            include_data: 是否计入请求数据 data，默认计入
+        """
+        self.keep_fragment = keep_fragment
+        self.strip_params = frozenset(strip_params)
+        self.sort_query = sort_query
+        self.strip_trailing_slash = strip_trailing_slash
+        self.include_headers = tuple(sorted(h.lower() for h in include_headers))
+        self.include_data = include_data
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        fingerprinters[cls.__name__] = cls
+
+    def canonicalize(self, url: str, params: Dict[str, Any] = None) -> str:
+        """ 规范化 url
+        """
+        return canonicalize_url(
+            url, params,
+            keep_fragment=self.keep_fragment,
+            strip_params=self.strip_params,
+            sort_query=self.sort_query,
+            strip_trailing_slash=self.strip_trailing_slash
+        )
+
+    def fingerprint(self, request: 'Request') -> bytes:
+        """ 计算请求的指纹
+
+        Returns:
+            16 字节的 md5 摘要
+        """
+        parts = [
+            request.method.upper(),
+            self.canonicalize(request.url, request._params)
+        ]
+        if self.include_data and request._data:
+            data = request._data
+            if isinstance(data, dict):
+                data = json.dumps(data, sort_keys=True,
+                                  ensure_ascii=False, default=str)
+            parts.append(str(data))
+        if self.include_headers:
+            headers = {k.lower(): v for k, v in request._headers.items()}
+            for name in self.include_headers:
+                parts.append(f'{name}:{headers.get(name, "")}')
+        return hashlib.md5('\n'.join(parts).encode('utf-8')).digest()
+
+    def to_dict(self) -> Dict[str, Any]:
+        """ 转换为可以保存的字典
+        """
+        return {
+            'type': self.__class__.__name__,
+            'keep_fragment': self.keep_fragment,
+            'strip_params': sorted(self.strip_params),
+            'sort_query': self.sort_query,
+            'strip_trailing_slash': self.strip_trailing_slash,
+            'include_headers': list(self.include_headers),
+            'include_data': self.include_data,
+        }
+
+    @staticmethod
+    def from_dict(value: Dict[str, Any]) -> 'Fingerprinter':
+        """ 从 to_dict 的结果恢复
+        """
+        value = value.copy()
+        cls = fingerprinters[value.pop('type')]
+        return cls(**value)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Fingerprinter) and \
+               self.to_dict() == other.to_dict()
+
+
+fingerprinters['Fingerprinter'] = Fingerprinter
+
+# 没有指定策略时使用的指纹策略
+default_fingerprinter = Fingerprinter()
@@ -0,0 +1,470 @@
+"""请求队列（frontier），决定等待中的请求以什么顺序下载
+"""
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from typing import List, Optional, Callable, Iterator, NoReturn, Union, \
+    Tuple, Dict, Type, Set
+from requests_magic.mmlog import logger
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request
+    from .spider import Spider
+
+
+class Frontier:
+    """ 请求队列基类。
+    wait 大于 0 的请求先放在按到期时间排序的等待堆中，到期后才交给具体的策略排序，
+    所以取请求时不需要遍历全部请求。子类只需要实现 _push_ready、_pop_ready、_ready_items 等方法。
+    超过截止时间（Request.deadline）的请求在取出时和 sweep_expired 中被丢弃，并交给 on_expired。
+    全部方法都是线程安全的
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # (到期时间, 序号, 请求)
+        self._waiting: List[Tuple[float, int, 'Request']] = []
+        self._counter = itertools.count()
+        self._peak = 0
+        # 是否加入过有截止时间的请求，没有时 sweep_expired 不需要遍历
+        self._has_deadline = False
+        # 丢弃过期请求时调用
+        self.on_expired: Optional[Callable[['Request'], NoReturn]] = None
+
+    # 子类实现
+
+    def _push_ready(self, request: 'Request', front: bool) -> NoReturn:
+        raise NotImplementedError()
+
+    def _pop_ready(self) -> Optional['Request']:
+        raise NotImplementedError()
+
+    def _ready_items(self) -> List['Request']:
+        """ 按出队顺序排列的就绪请求
+        """
+        raise NotImplementedError()
+
+    def _peek_ready(self, n: int) -> List['Request']:
+        """ 接下来 n 个就绪请求，子类可以实现得更快
+        """
+        return self._ready_items()[:n]
+
+    def _ready_len(self) -> int:
+        raise NotImplementedError()
+
+    def _remove_ready(self, request: 'Request') -> bool:
+        raise NotImplementedError()
+
+    def _filter_ready(self, keep: Callable[['Request'], bool]) \
+            -> List['Request']:
+        """ 移除 keep 返回 False 的就绪请求
+
+        Returns:
+            被移除的请求
+        """
+        raise NotImplementedError()
+
+    # 公共方法
+
+    def push(self, request: 'Request', front: bool = False) -> NoReturn:
+        """ 加入一个请求
+
+        Args:
+            request: 请求，wait 大于 0 时会等待 wait 秒之后才能取出
+            front: 是否插队，插队的请求会最先取出（重试等情况使用）
+        """
+        with self._lock:
+            if request.deadline is not None:
+                self._has_deadline = True
+            if request.wait > 0:
+                heapq.heappush(self._waiting, (
+                    time.monotonic() + request.wait,
+                    next(self._counter), request
+                ))
+            else:
+                self._push_ready(request, front)
+            size = len(self)
+            if size > self._peak:
+                self._peak = size
+
+    def extend(self, requests: List['Request']) -> NoReturn:
+        """ 加入多个请求
+        """
+        with self._lock:
+            for request in requests:
+                self.push(request)
+
+    def _promote(self) -> NoReturn:
+        """ 把等待到期的请求交给策略
+        """
+        now = time.monotonic()
+        while self._waiting and self._waiting[0][0] <= now:
+            _, _, request = heapq.heappop(self._waiting)
+            request.wait = 0
+            self._push_ready(request, False)
+
+    def _expire(self, request: 'Request') -> NoReturn:
+        if self.on_expired is not None:
+            self.on_expired(request)
+
+    def pop(self) -> Optional['Request']:
+        """ 取出下一个可以下载的请求，过期的请求会被丢弃
+
+        Returns:
+            请求，没有可以下载的请求时返回 None
+        """
+        with self._lock:
+            self._promote()
+            while True:
+                request = self._pop_ready()
+                if request is None or request.deadline is None or \
+                        not request.is_expired():
+                    return request
+                self._expire(request)
+
+    def sweep_expired(self, now: float = None) -> int:
+        """ 丢弃全部过期的请求（包括等待中的）
+
+        Args:
+            now: 当前时间戳，默认 time.time()
+
+        Returns:
+            丢弃的数量
+        """
+        with self._lock:
+            if not self._has_deadline:
+                return 0
+            if now is None:
+                now = time.time()
+            expired = self._filter_ready(lambda r: not r.is_expired(now))
+            waiting = [i for i in self._waiting if not i[2].is_expired(now)]
+            if len(waiting) != len(self._waiting):
+                kept = {id(i[2]) for i in waiting}
+                expired.extend(i[2] for i in self._waiting
+                               if id(i[2]) not in kept)
+                heapq.heapify(waiting)
+                self._waiting = waiting
+            for request in expired:
+                self._expire(request)
+            return len(expired)
+
+    def peek(self, n: int) -> List['Request']:
+        """ 查看接下来（最多） n 个可以下载的请求，不会取出
+        """
+        with self._lock:
+            self._promote()
+            return self._peek_ready(n)
+
+    def remove(self, request: 'Request') -> bool:
+        """ 移除一个请求
+
+        Returns:
+            是否找到并移除了
+        """
+        with self._lock:
+            if self._remove_ready(request):
+                return True
+            for i, item in enumerate(self._waiting):
+                if item[2] is request:
+                    self._waiting.pop(i)
+                    heapq.heapify(self._waiting)
+                    return True
+            return False
+
+    def __len__(self) -> int:
+        return self._ready_len() + len(self._waiting)
+
+    def __bool__(self) -> bool:
+        return len(self) > 0
+
+    def __contains__(self, request: 'Request') -> bool:
+        with self._lock:
+            return any(r is request for r in self.to_list())
+
+    def __iter__(self) -> Iterator['Request']:
+        return iter(self.to_list())
+
+    def to_list(self) -> List['Request']:
+        """ 获取全部请求，就绪的请求在前，等待中的请求按到期时间排在后面。
+        等待中的请求的 wait 会更新为剩余的等待时间
+        """
+        with self._lock:
+            now = time.monotonic()
+            waiting = []
+            for ready_at, _, request in sorted(self._waiting):
+                request.wait = max(ready_at - now, 0)
+                waiting.append(request)
+            return self._ready_items() + waiting
+
+    @property
+    def peak(self) -> int:
+        """ 请求队列曾经达到的最大长度
+        """
+        return self._peak
+
+
+class FIFOFrontier(Frontier):
+    """ 先进先出，广度优先（BFS），这是默认的策略。
+    宽的网站上会先把每个列表页的全部子请求都放进队列，队列可能会很长
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._ready: deque = deque()
+
+    def _push_ready(self, request: 'Request', front: bool) -> NoReturn:
+        if front:
+            self._ready.appendleft(request)
+        else:
+            self._ready.append(request)
+
+    def _pop_ready(self) -> Optional['Request']:
+        return self._ready.popleft() if self._ready else None
+
+    def _ready_items(self) -> List['Request']:
+        return list(self._ready)
+
+    def _peek_ready(self, n: int) -> List['Request']:
+        return list(itertools.islice(self._ready, n))
+
+    def _ready_len(self) -> int:
+        return len(self._ready)
+
+    def _remove_ready(self, request: 'Request') -> bool:
+        for i, r in enumerate(self._ready):
+            if r is request:
+                del self._ready[i]
+                return True
+        return False
+
+    def _filter_ready(self, keep: Callable[['Request'], bool]) \
+            -> List['Request']:
+        removed = [r for r in self._ready if not keep(r)]
+        if removed:
+            self._ready = deque(r for r in self._ready if keep(r))
+        return removed
+
+
+class LIFOFrontier(FIFOFrontier):
+    """ 后进先出，深度优先（DFS）。
+    总是先下载最新产生的请求，配合逐步迭代的生成器，队列长度大致和深度成正比
+    """
+
+    def _push_ready(self, request: 'Request', front: bool) -> NoReturn:
+        # 右端是队首
+        self._ready.append(request)
+
+    def _pop_ready(self) -> Optional['Request']:
+        return self._ready.pop() if self._ready else None
+
+    def _ready_items(self) -> List['Request']:
+        return list(reversed(self._ready))
+
+    def _peek_ready(self, n: int) -> List['Request']:
+        return list(itertools.islice(reversed(self._ready), n))
+
+
+class BestFirstFrontier(Frontier):
+    """ 最佳优先，按评分函数的结果从高到低下载，评分相同时先进先出
+    """
+
+    def __init__(self, score: Callable[['Request'], float]):
+        """ 最佳优先
+
+        Args:
+            score: 评分函数 (Request) -> float，分数越高越先下载，加入队列时计算一次
+        """
+        super().__init__()
+        self.score = score
+        # (-分数, 序号, 请求)
+        self._heap: List[Tuple[float, int, 'Request']] = []
+
+    def _push_ready(self, request: 'Request', front: bool) -> NoReturn:
+        if front:
+            priority = float('-inf')
+        else:
+            try:
+                priority = -self.score(request)
+            except Exception as e:
+                logger.ERROR(f"{request} score error: {e}")
+                priority = 0
+        heapq.heappush(self._heap, (priority, next(self._counter), request))
+
+    def _pop_ready(self) -> Optional['Request']:
+        return heapq.heappop(self._heap)[2] if self._heap else None
+
+    def _ready_items(self) -> List['Request']:
+        return [i[2] for i in sorted(self._heap)]
+
+    def _peek_ready(self, n: int) -> List['Request']:
+        # 从堆顶开始按顺序访问，辅助堆保存已经访问的节点的子节点，
+        # 只访问 O(n) 个节点，不需要扫描整个堆
+        heap = self._heap
+        result = []
+        candidates = [(*heap[0][:2], 0)] if heap and n > 0 else []
+        while candidates and len(result) < n:
+            index = heapq.heappop(candidates)[2]
+            result.append(heap[index][2])
+            for child in (2 * index + 1, 2 * index + 2):
+                if child < len(heap):
+                    heapq.heappush(candidates, (*heap[child][:2], child))
+        return result
+
+    def _ready_len(self) -> int:
+        return len(self._heap)
+
+    def _remove_ready(self, request: 'Request') -> bool:
+        for i, item in enumerate(self._heap):
+            if item[2] is request:
+                self._heap.pop(i)
+                heapq.heapify(self._heap)
+                return True
+        return False
+
+    def _filter_ready(self, keep: Callable[['Request'], bool]) \
+            -> List['Request']:
+        removed = [i[2] for i in self._heap if not keep(i[2])]
+        if removed:
+            self._heap = [i for i in self._heap if keep(i[2])]
+            heapq.heapify(self._heap)
+        return removed
+
+
+# 可以用名字选择的策略
+frontiers: Dict[str, Type[Frontier]] = {
+    'bfs': FIFOFrontier,
+    'dfs': LIFOFrontier,
+}
+
+
+def create_frontier(frontier: Union[str, Frontier,
+                                    Callable[['Request'], float]]) \
+        -> Frontier:
+    """ 根据名字创建请求队列
+
+    Args:
+        frontier: 策略名字（bfs、dfs）、评分函数（使用最佳优先）或 Frontier 实例
+    """
+    if isinstance(frontier, Frontier):
+        return frontier
+    if callable(frontier):
+        return BestFirstFrontier(frontier)
+    if frontier not in frontiers:
+        logger.error(f"Unknown frontier: {frontier}")
+        raise ValueError(frontier)
+    return frontiers[frontier]()
+
+
+class FairFrontier(Frontier):
+    """ 多个爬虫之间的加权公平队列。
+    每个爬虫有自己的子队列（由 factory 创建，子队列内部仍然使用原来的策略），
+    取请求时按权重轮流从各个子队列中取（stride 调度）：
+    每从一个子队列取出一个请求，它的进度增加 1 / 权重，总是从进度最小的子队列中取。
+    空闲后重新有请求的子队列不会积累之前的份额。
+    爬虫的权重是 Spider.weight，默认 1，运行中修改会在下一次取请求时生效
+    """
+
+    def __init__(self, factory: Callable[[], Frontier]):
+        """ 加权公平队列
+
+        Args:
+            factory: 创建子队列的方法
+        """
+        super().__init__()
+        self.factory = factory
+        # 爬虫标识 -> 子队列
+        self._queues: Dict[str, Frontier] = {}
+        # 爬虫标识 -> 进度
+        self._passes: Dict[str, float] = {}
+        # 爬虫标识 -> 爬虫
+        self._spiders: Dict[str, 'Spider'] = {}
+        self._global_pass = 0.0
+
+    @staticmethod
+    def _identity(request: 'Request') -> str:
+        return request.spider.identity if request.spider is not None else ''
+
+    def _stride(self, identity: str) -> float:
+        weight = getattr(self._spiders[identity], 'weight', 1)
+        return 1 / weight if weight and weight > 0 else 1
+
+    def push(self, request: 'Request', front: bool = False) -> NoReturn:
+        with self._lock:
+            identity = self._identity(request)
+            queue = self._queues.get(identity)
+            if queue is None:
+                queue = self._queues[identity] = self.factory()
+                queue.on_expired = self._expire
+                self._spiders[identity] = request.spider
+                self._passes[identity] = self._global_pass
+            elif not queue:
+                # 空闲过的子队列从当前进度开始
+                self._passes[identity] = max(self._passes[identity],
+                                             self._global_pass)
+            queue.push(request, front)
+            size = len(self)
+            if size > self._peak:
+                self._peak = size
+
+    def pop(self, exclude: Set[str] = None) -> Optional['Request']:
+        """ 取出下一个可以下载的请求
+
+        Args:
+            exclude: 不从这些爬虫（标识）的子队列中取请求，例如已经达到自己的 max_link 的爬虫
+        """
+        with self._lock:
+            order = sorted(
+                (p, identity) for identity, p in self._passes.items()
+                if self._queues[identity] and
+                (not exclude or identity not in exclude)
+            )
+            for _, identity in order:
+                request = self._queues[identity].pop()
+                if request is None:
+                    continue
+                self._global_pass = self._passes[identity]
+                self._passes[identity] += self._stride(identity)
+                return request
+            return None
+
+    def peek(self, n: int) -> List['Request']:
+        with self._lock:
+            heads = {i: q.peek(n) for i, q in self._queues.items()}
+            passes = self._passes.copy()
+            result = []
+            while len(result) < n:
+                candidates = [i for i in heads if heads[i]]
+                if not candidates:
+                    break
+                identity = min(candidates, key=lambda i: passes[i])
+                result.append(heads[identity].pop(0))
+                passes[identity] += self._stride(identity)
+            return result
+
+    def remove(self, request: 'Request') -> bool:
+        with self._lock:
+            queue = self._queues.get(self._identity(request))
+            return queue is not None and queue.remove(request)
+
+    def sweep_expired(self, now: float = None) -> int:
+        with self._lock:
+            return sum(q.sweep_expired(now) for q in self._queues.values())
+
+    def __len__(self) -> int:
+        return sum(len(q) for q in list(self._queues.values()))
+
+    def to_list(self) -> List['Request']:
+        with self._lock:
+            result = []
+            for queue in self._queues.values():
+                result.extend(queue.to_list())
+            return result
+
+    def get_queue_sizes(self) -> Dict[str, int]:
+        """ 获取每个爬虫的子队列长度
+        """
+        with self._lock:
+            return {i: len(q) for i, q in self._queues.items()}
@@ -0,0 +1,80 @@
+"""对冲请求，下载太慢时再发送一次相同的下载，先完成的结果有效
+"""
+import threading
+from collections import deque
+from typing import Dict, Optional, NoReturn
+
+
+class HedgePolicy:
+    """ 对冲策略，交给调度器的 hedge 参数使用。
+    按主机记录最近成功下载的耗时，一个请求（Request.hedge 或 Spider.hedge 为 True）
+    下载时间超过它的主机的 percentile 分位耗时后，会用同一个请求再开始一次下载，
+    先完成的下载有效，另一个会被取消。
+    对冲的下载数量不会超过全部下载数量的 budget 比例
+    """
+
+    def __init__(self, budget: float = 0.05,
+                 percentile: float = 0.95,
+                 min_samples: int = 20,
+                 window: int = 200,
+                 min_delay: float = 0.1):
+        """ 对冲策略
+
+        Args:
+            budget: 对冲的下载最多占全部下载的比例，默认 0.05
+            percentile: 下载时间超过主机耗时的这个分位数后对冲，默认 0.95
+            min_samples: 主机至少有这么多次成功下载的耗时记录才会对冲，默认 20
+            window: 每个主机保留最近多少次耗时记录，默认 200
+            min_delay: 最短的对冲等待时间，默认 0.1 秒
+        """
+        self.budget = budget
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.window = window
+        self.min_delay = min_delay
+        # 主机 -> 最近的耗时
+        self._samples: Dict[str, deque] = {}
+        # 主机 -> 对冲等待时间
+        self._delays: Dict[str, float] = {}
+        # 全部下载数量和对冲的下载数量
+        self.requests = 0
+        self.hedged = 0
+        self._lock = threading.Lock()
+
+    def record(self, host: str, seconds: float) -> NoReturn:
+        """ 记录一次成功下载的耗时
+        """
+        with self._lock:
+            samples = self._samples.get(host)
+            if samples is None:
+                samples = self._samples[host] = deque(maxlen=self.window)
+            samples.append(seconds)
+            if len(samples) < self.min_samples:
+                return
+            ordered = sorted(samples)
+            index = min(int(len(ordered) * self.percentile),
+                        len(ordered) - 1)
+            self._delays[host] = max(ordered[index], self.min_delay)
+
+    def get_delay(self, host: str) -> Optional[float]:
+        """ 获取主机的对冲等待时间，耗时记录不足时返回 None
+        """
+        return self._delays.get(host)
+
+    def count_request(self) -> NoReturn:
+        """ 记录一次下载，用于计算对冲预算
+        """
+        with self._lock:
+            self.requests += 1
+
+    def acquire(self) -> bool:
+        """ 尝试使用一次对冲预算
+
+        Returns:
+            是否还有预算
+        """
+        with self._lock:
+            if self.hedged + 1 > self.requests * self.budget:
+                return False
+            self.hedged += 1
+            return True
@@ -0,0 +1,811 @@
+""" 基于标准库的 HTTP/1.1 适配，给不依赖 requests 的下载器使用
+"""
+import asyncio
+import functools
+import http.client
+import json
+import ssl
+import threading
+import time
+import weakref
+import zlib
+from http.cookies import SimpleCookie
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlencode, urljoin, urlsplit
+from requests_magic.proxy import parse_proxy
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request, Response, SetCookie
+
+# 标准库下载器默认附加的请求头，可以被 Request.headers 覆盖
+default_headers: Dict[str, str] = {
+    'User-Agent': 'requests-magic',
+    'Accept-Encoding': 'gzip, deflate',
+    'Accept': '*/*',
+    'Connection': 'keep-alive',
+}
+
+# 最多跟随的重定向次数，和 requests 保持一致
+max_redirects: int = 30
+
+_default_ports = {'http': 80, 'https': 443}
+
+_ssl_context: Optional[ssl.SSLContext] = None
+_ssl_context_no_verify: Optional[ssl.SSLContext] = None
+
+
+def get_ssl_context(verify: bool = True) -> ssl.SSLContext:
+    """ 获取共享的 SSLContext，创建 SSLContext 的开销很大，所以全局只创建一次
+
+    Args:
+        verify: 是否校验证书，默认校验
+    """
+    global _ssl_context, _ssl_context_no_verify
+    if verify:
+        if _ssl_context is None:
+            _ssl_context = ssl.create_default_context()
+        return _ssl_context
+    if _ssl_context_no_verify is None:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        _ssl_context_no_verify = context
+    return _ssl_context_no_verify
+
+
+def split_url(url: str) -> Tuple[str, str, int, str]:
+    """ 拆分 url
+
+    Returns:
+        (scheme, host, port, target)，target 是路径加查询字符串
+    """
+    parts = urlsplit(url)
+    scheme = parts.scheme.lower()
+    if scheme not in _default_ports:
+        raise ValueError(f'Unsupported url scheme: {url}')
+    port = parts.port or _default_ports[scheme]
+    target = parts.path or '/'
+    if parts.query:
+        target += '?' + parts.query
+    return scheme, parts.hostname, port, target
+
+
+def create_http_request_from_magic_request(request: 'Request') \
+        -> Tuple[str, str, Dict[str, str], Optional[bytes]]:
+    """ 根据 Request 生成 HTTP 请求的各个部分。
+    data 的处理方式和 requests 下载器相同：dict 作为 json 发送，其他作为原始数据发送
+
+    Returns:
+        (method, url, headers, body)
+    """
+    method = request.method.upper()
+    url = request.url
+    if request.params:
+        url += ('&' if urlsplit(url).query else '?') + \
+            urlencode(request.params, doseq=True)
+
+    headers = default_headers.copy()
+    body = None
+    if request.data:
+        if isinstance(request.data, dict):
+            body = json.dumps(request.data).encode('utf-8')
+            set_header(headers, 'Content-Type', 'application/json')
+        elif isinstance(request.data, str):
+            body = request.data.encode('utf-8')
+        else:
+            body = bytes(request.data)
+    if request.headers:
+        for k, v in request.headers.items():
+            set_header(headers, k, v)
+    if request.cookies:
+        set_header(headers, 'Cookie', '; '.join(
+            f'{k}={v}' for k, v in request.cookies.items()
+        ))
+    if body is not None or method in ('POST', 'PUT', 'PATCH'):
+        set_header(headers, 'Content-Length', str(len(body) if body else 0))
+    return method, url, headers, body
+
+
+def set_header(headers: Dict[str, str], name: str, value: str):
+    """ 设置请求头，会先移除不区分大小写同名的请求头
+    """
+    for k in [k for k in headers if k.lower() == name.lower()]:
+        del headers[k]
+    headers[name] = value
+
+
+def _is_same_origin(url: str, new_url: str) -> bool:
+    """ 重定向前后是否是同一个网站，和 requests 一样允许同一个主机从 http 升级到 https（默认端口）
+    """
+    old, new = urlsplit(url), urlsplit(new_url)
+    if old.hostname != new.hostname:
+        return False
+    old_port = old.port or _default_ports.get(old.scheme.lower())
+    new_port = new.port or _default_ports.get(new.scheme.lower())
+    if old.scheme.lower() == 'http' and new.scheme.lower() == 'https' and \
+            old_port == 80 and new_port == 443:
+        return True
+    return old.scheme.lower() == new.scheme.lower() and old_port == new_port
+
+
+def get_redirect_headers(headers: Dict[str, str], method: str,
+                         new_method: str, url: str, new_url: str) \
+        -> Dict[str, str]:
+    """ 生成重定向后的请求头。
+    method 改变时移除请求体相关的请求头，重定向到其他网站时移除 Authorization、Cookie 和 Host，
+    和 requests 的处理方式相同
+    """
+    removes = set()
+    if new_method != method:
+        removes.update(('content-length', 'content-type'))
+    if not _is_same_origin(url, new_url):
+        removes.update(('authorization', 'cookie', 'host'))
+    if not removes:
+        return headers
+    return {k: v for k, v in headers.items() if k.lower() not in removes}
+
+
+def get_redirect(method: str, url: str, status_code: int,
+                 headers: Dict[str, str]) -> Optional[Tuple[str, str]]:
+    """ 判断是否需要重定向
+
+    Args:
+        headers: 小写键的响应头
+
+    Returns:
+        (新的 method, 新的 url)，不需要重定向时返回 None
+    """
+    if status_code not in (301, 302, 303, 307, 308) or \
+            'location' not in headers:
+        return None
+    if status_code == 303 or \
+            (status_code in (301, 302) and method == 'POST'):
+        method = 'GET'
+    return method, urljoin(url, headers['location'])
+
+
+def decode_content(headers: Dict[str, str], body: bytes) -> bytes:
+    """ 根据 Content-Encoding 解压响应体
+
+    Args:
+        headers: 小写键的响应头
+        body: 原始响应体
+    """
+    encoding = headers.get('content-encoding', '').strip().lower()
+    if not body or encoding in ('', 'identity'):
+        return body
+    if encoding == 'gzip':
+        return zlib.decompress(body, 16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
+
+
+def create_response_from_http(request: 'Request', url: str,
+                              status_code: int, reason: str,
+                              header_list: List[Tuple[str, str]],
+                              body: bytes,
+                              request_time: float) -> 'Response':
+    """ 根据标准库得到的 HTTP 响应各部分创建 magic Response
+
+    Args:
+        request: magic Request 请求
+        url: 最终的 url（重定向之后）
+        header_list: 响应头的 (name, value) 列表，可能有重复
+        body: 已解压的响应体
+    """
+    from .request import Response
+    headers: Dict[str, str] = {}
+    set_cookie_values: List[str] = []
+    for name, value in header_list:
+        if name.lower() == 'set-cookie':
+            set_cookie_values.append(value)
+        if name in headers:
+            headers[name] += ', ' + value
+        else:
+            headers[name] = value
+    return Response(
+        request=request,
+        url=url,
+        status_code=status_code,
+        reason=reason,
+        content=body,
+        headers=headers,
+        request_time=request_time,
+        set_cookies=functools.partial(parse_set_cookies, set_cookie_values)
+    )
+
+
+def parse_set_cookies(values: List[str]) -> List['SetCookie']:
+    """ 解析 Set-Cookie 响应头，Response 第一次访问 set_cookies 时才会调用
+
+    Args:
+        values: 每个 Set-Cookie 响应头的值
+    """
+    from .request import SetCookie
+    set_cookies: List[SetCookie] = []
+    for value in values:
+        cookie = SimpleCookie()
+        try:
+            cookie.load(value)
+        except Exception:
+            continue
+        for morsel in cookie.values():
+            set_cookies.append(SetCookie(
+                version=0,
+                name=morsel.key,
+                value=morsel.value,
+                domain=morsel['domain'],
+                path=morsel['path'] or '/',
+                secure=bool(morsel['secure']),
+                comment=morsel['comment'] or None,
+            ))
+    return set_cookies
+
+
+def parse_status_line(line: bytes) -> Tuple[str, int, str]:
+    """ 解析状态行
+
+    Returns:
+        (version, status_code, reason)
+    """
+    parts = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+    if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+        raise ConnectionError(f'Bad status line: {line!r}')
+    reason = parts[2] if len(parts) > 2 else ''
+    return parts[0], int(parts[1]), reason
+
+
+def is_keep_alive(version: str, headers: Dict[str, str]) -> bool:
+    """ 响应结束后连接能否复用
+
+    Args:
+        headers: 小写键的响应头
+    """
+    connection = headers.get('connection', '').lower()
+    if version == 'HTTP/1.0':
+        return connection == 'keep-alive'
+    return connection != 'close'
+
+
+# http.client
+
+class HTTPConnectionPool:
+    """ http.client 的线程安全连接池，按 (scheme, host, port, verify, proxy) 保存空闲连接，
+    让同一个主机的请求复用 keep-alive 连接。
+    也可以用 warm 预先建立连接（预热），第一次请求时不需要再等待 TCP 和 TLS 握手
+    """
+
+    def __init__(self, max_idle_per_host: int = 16):
+        """ http.client 连接池
+
+        Args:
+            max_idle_per_host: 每个主机最多保留的空闲连接数，默认 16
+        """
+        self.max_idle_per_host = max_idle_per_host
+        self._idle: Dict[tuple, List[http.client.HTTPConnection]] = {}
+        # 预热后还没有被使用的连接 -> 建立的时间（time.monotonic()）
+        self._warm: Dict[http.client.HTTPConnection, float] = {}
+        # 使用了预热连接的次数
+        self.warm_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, scheme: str, host: str, port: int,
+            verify: bool = True, proxy: str = None) \
+            -> Tuple[http.client.HTTPConnection, bool]:
+        """ 获取一个连接，优先使用空闲连接
+
+        Args:
+            proxy: http 代理地址，https 网站会通过 CONNECT 隧道访问
+
+        Returns:
+            (连接, 是否是复用的连接)
+        """
+        key = (scheme, host, port, verify, proxy)
+        with self._lock:
+            connections = self._idle.get(key)
+            if connections:
+                connection = connections.pop()
+                if self._warm.pop(connection, None) is not None:
+                    self.warm_hits += 1
+                return connection, True
+        return self._create(scheme, host, port, verify, proxy), False
+
+    @staticmethod
+    def _create(scheme: str, host: str, port: int, verify: bool,
+                proxy: Optional[str]) -> http.client.HTTPConnection:
+        """ 创建一个还没有连接的新连接
+        """
+        if proxy is not None:
+            proxy_host, proxy_port, authorization = parse_proxy(proxy)
+            if scheme == 'https':
+                connection = http.client.HTTPSConnection(
+                    proxy_host, proxy_port, context=get_ssl_context(verify)
+                )
+                connection.set_tunnel(
+                    host, port,
+                    {'Proxy-Authorization': authorization}
+                    if authorization else None
+                )
+            else:
+                connection = http.client.HTTPConnection(
+                    proxy_host, proxy_port
+                )
+        elif scheme == 'https':
+            connection = http.client.HTTPSConnection(
+                host, port, context=get_ssl_context(verify)
+            )
+        else:
+            connection = http.client.HTTPConnection(host, port)
+        return connection
+
+    def put(self, scheme: str, host: str, port: int,
+            connection: http.client.HTTPConnection,
+            verify: bool = True, proxy: str = None):
+        """ 归还一个可以复用的连接
+        """
+        key = (scheme, host, port, verify, proxy)
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                return
+        connection.close()
+
+    def warm(self, scheme: str, host: str, port: int,
+             verify: bool = True, proxy: str = None,
+             timeout: float = 10) -> bool:
+        """ 预先建立一个连接（包括代理的 CONNECT 隧道和 TLS 握手）并放入空闲连接中。
+        会阻塞到连接建立完成，连接失败时抛出异常
+
+        Returns:
+            是否放入了空闲连接，这个主机的空闲连接已满时会关闭新连接并返回 False
+        """
+        connection = self._create(scheme, host, port, verify, proxy)
+        connection.timeout = timeout
+        try:
+            connection.connect()
+        except BaseException:
+            connection.close()
+            raise
+        key = (scheme, host, port, verify, proxy)
+        with self._lock:
+            connections = self._idle.setdefault(key, [])
+            if len(connections) < self.max_idle_per_host:
+                connections.append(connection)
+                self._warm[connection] = time.monotonic()
+                return True
+        connection.close()
+        return False
+
+    def count_idle(self, scheme: str, host: str, port: int,
+                   verify: bool = True, proxy: str = None) -> int:
+        """ 获取一个主机的空闲连接数
+        """
+        return len(self._idle.get((scheme, host, port, verify, proxy), ()))
+
+    def count_warm(self) -> int:
+        """ 获取预热后还没有被使用的连接数
+        """
+        return len(self._warm)
+
+    def expire_warm(self, max_idle_time: float) -> int:
+        """ 关闭预热后超过 max_idle_time 秒还没有被使用的连接
+
+        Returns:
+            关闭的连接数
+        """
+        deadline = time.monotonic() - max_idle_time
+        expired = []
+        with self._lock:
+            for connection, created in list(self._warm.items()):
+                if created > deadline:
+                    continue
+                del self._warm[connection]
+                for connections in self._idle.values():
+                    if connection in connections:
+                        connections.remove(connection)
+                        break
+                expired.append(connection)
+        for connection in expired:
+            connection.close()
+        return len(expired)
+
+    def clear(self):
+        """ 关闭全部空闲连接
+        """
+        with self._lock:
+            idle, self._idle = self._idle, {}
+            self._warm.clear()
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
+
+
+# http_downloader 使用的全局连接池
+http_pool = HTTPConnectionPool()
+
+
+def _http_send(method: str, url: str, headers: Dict[str, str],
+               body: Optional[bytes], timeout: float, verify: bool,
+               proxy: str = None):
+    """ 在一个（可能是复用的）连接上发送一次请求并读取响应
+    """
+    scheme, host, port, target = split_url(url)
+    connection, reused = http_pool.get(scheme, host, port, verify, proxy)
+    if proxy is not None and scheme == 'http':
+        # 通过代理访问 http 网站时使用完整的 url
+        target = url.split('#', 1)[0]
+        authorization = parse_proxy(proxy)[2]
+        if authorization:
+            headers = {**headers, 'Proxy-Authorization': authorization}
+    connection.timeout = timeout
+    if connection.sock is not None:
+        connection.sock.settimeout(timeout)
+    try:
+        connection.request(method, target, body, headers)
+        r = connection.getresponse()
+    except (http.client.RemoteDisconnected, ConnectionResetError,
+            BrokenPipeError):
+        connection.close()
+        if reused:
+            # 复用的空闲连接可能已经被服务器关闭，换一个新连接重试
+            return _http_send(method, url, headers, body, timeout, verify,
+                              proxy)
+        raise
+    except BaseException:
+        connection.close()
+        raise
+    try:
+        content = r.read()
+    except BaseException:
+        connection.close()
+        raise
+    header_list = r.getheaders()
+    lower_headers = {k.lower(): v for k, v in header_list}
+    if r.will_close:
+        connection.close()
+    else:
+        http_pool.put(scheme, host, port, connection, verify, proxy)
+    return r.status, r.reason, header_list, lower_headers, content
+
+
+def http_fetch(request: 'Request', proxy: str = None) -> 'Response':
+    """ 使用 http.client 下载一个 Request，会复用连接并自动跟随重定向。
+    超时和网络错误会以异常的形式抛出
+
+    Args:
+        request: 请求
+        proxy: http 代理地址，默认使用 Request 的 kwargs 中的 proxy
+    Returns:
+        magic Response
+    """
+    start_time = time.time()
+    method, url, headers, body = \
+        create_http_request_from_magic_request(request)
+    verify = request.kwargs.get('verify', True)
+    allow_redirects = request.kwargs.get('allow_redirects', True)
+    if proxy is None:
+        proxy = request.kwargs.get('proxy')
+    for _ in range(max_redirects + 1):
+        status_code, reason, header_list, lower_headers, content = \
+            _http_send(method, url, headers, body,
+                       request.time_out, verify, proxy)
+        redirect = get_redirect(method, url, status_code, lower_headers) \
+            if allow_redirects else None
+        if redirect is None:
+            return create_response_from_http(
+                request, url, status_code, reason, header_list,
+                decode_content(lower_headers, content),
+                time.time() - start_time
+            )
+        new_method, new_url = redirect
+        headers = get_redirect_headers(headers, method, new_method,
+                                       url, new_url)
+        if new_method != method:
+            method, body = new_method, None
+        url = new_url
+    raise ConnectionError(f'Exceeded {max_redirects} redirects')
+
+
+# asyncio
+
+class _AsyncioConnectionPool:
+    """ asyncio 连接池，按 (scheme, host, port, proxy) 保存空闲连接。
+    一个连接池只属于一个事件循环
+    """
+
+    def __init__(self):
+        self.idle: Dict[tuple, List[tuple]] = {}
+        # 预热后还没有被使用的连接 -> 建立的时间（time.monotonic()）
+        self.warm: Dict[tuple, float] = {}
+        self.warm_hits = 0
+
+    def get(self, key: tuple) -> Optional[tuple]:
+        connections = self.idle.get(key)
+        while connections:
+            connection = connections.pop()
+            warm = self.warm.pop(connection, None) is not None
+            reader, writer = connection
+            if not writer.is_closing() and not reader.at_eof():
+                if warm:
+                    self.warm_hits += 1
+                return connection
+            writer.close()
+        return None
+
+    def put(self, key: tuple, connection: tuple):
+        self.idle.setdefault(key, []).append(connection)
+
+    def expire_warm(self, max_idle_time: float):
+        """ 关闭预热后超过 max_idle_time 秒还没有被使用的连接
+        """
+        deadline = time.monotonic() - max_idle_time
+        for connection, created in list(self.warm.items()):
+            if created > deadline:
+                continue
+            del self.warm[connection]
+            for connections in self.idle.values():
+                if connection in connections:
+                    connections.remove(connection)
+                    break
+            connection[1].close()
+
+
+_asyncio_pools: 'weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _AsyncioConnectionPool]' = \
+    weakref.WeakKeyDictionary()
+
+
+def _get_asyncio_pool() -> _AsyncioConnectionPool:
+    loop = asyncio.get_running_loop()
+    pool = _asyncio_pools.get(loop)
+    if pool is None:
+        pool = _asyncio_pools[loop] = _AsyncioConnectionPool()
+    return pool
+
+
+async def _asyncio_read_body(reader: asyncio.StreamReader,
+                             headers: Dict[str, str]) -> Tuple[bytes, bool]:
+    """ 读取响应体
+
+    Returns:
+        (body, 是否读取到了连接关闭)
+    """
+    if 'chunked' in headers.get('transfer-encoding', '').lower():
+        chunks = []
+        while True:
+            size_line = await reader.readline()
+            size = int(size_line.split(b';', 1)[0].strip(), 16)
+            if size == 0:
+                # trailer
+                while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                    pass
+                return b''.join(chunks), False
+            chunks.append(await reader.readexactly(size))
+            await reader.readline()
+    if 'content-length' in headers:
+        return await reader.readexactly(
+            int(headers['content-length'])), False
+    return await reader.read(), True
+
+
+async def _asyncio_open(scheme: str, host: str, port: int, verify: bool,
+                        proxy: Optional[str]) -> tuple:
+    """ 打开一个新连接，使用代理时 https 网站会通过 CONNECT 隧道访问
+
+    Returns:
+        (reader, writer)
+    """
+    if proxy is None:
+        return await asyncio.open_connection(
+            host, port,
+            ssl=get_ssl_context(verify) if scheme == 'https' else None
+        )
+    proxy_host, proxy_port, authorization = parse_proxy(proxy)
+    reader, writer = await asyncio.open_connection(proxy_host, proxy_port)
+    if scheme == 'http':
+        return reader, writer
+    lines = [f'CONNECT {host}:{port} HTTP/1.1', f'Host: {host}:{port}']
+    if authorization:
+        lines.append(f'Proxy-Authorization: {authorization}')
+    try:
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+        _, status_code, reason = parse_status_line(await reader.readline())
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if status_code != 200:
+            raise ConnectionError(
+                f'Proxy CONNECT failed: {status_code} {reason}')
+        if not hasattr(writer, 'start_tls'):
+            raise ConnectionError(
+                'HTTPS through a proxy needs Python 3.11 or later')
+        await writer.start_tls(get_ssl_context(verify),
+                               server_hostname=host)
+    except BaseException:
+        writer.close()
+        raise
+    return reader, writer
+
+
+async def asyncio_warm(scheme: str, host: str, port: int,
+                       verify: bool = True, proxy: str = None,
+                       max_idle_per_host: int = 16) -> bool:
+    """ 在当前事件循环的连接池中预先建立一个连接（预热），asyncio_downloader 会优先使用它。
+    连接失败时抛出异常
+
+    Returns:
+        是否放入了空闲连接，这个主机的空闲连接已满时会关闭新连接并返回 False
+    """
+    key = (scheme, host, port, proxy)
+    pool = _get_asyncio_pool()
+    connection = await _asyncio_open(scheme, host, port, verify, proxy)
+    if len(pool.idle.get(key, ())) >= max_idle_per_host:
+        connection[1].close()
+        return False
+    pool.put(key, connection)
+    pool.warm[connection] = time.monotonic()
+    return True
+
+
+def get_asyncio_pool_of(loop: asyncio.AbstractEventLoop) \
+        -> Optional[_AsyncioConnectionPool]:
+    """ 获取一个事件循环的连接池，还没有创建时返回 None
+    """
+    return _asyncio_pools.get(loop)
+
+
+# 自己负责关闭连接池的事件循环，其他事件循环的连接池在每次下载结束时关闭
+_managed_loops: 'weakref.WeakSet[asyncio.AbstractEventLoop]' = weakref.WeakSet()
+
+
+def manage_asyncio_pool(loop: asyncio.AbstractEventLoop) -> None:
+    """ 标记一个事件循环会自己调用 close_asyncio_pool（或者一直运行到进程结束），
+    这个事件循环中的连接在下载之间会一直保留
+    """
+    _managed_loops.add(loop)
+
+
+def is_asyncio_pool_managed(loop: asyncio.AbstractEventLoop) -> bool:
+    return loop in _managed_loops
+
+
+def close_asyncio_pool(loop: asyncio.AbstractEventLoop = None) -> None:
+    """ 关闭并移除一个事件循环的连接池。
+    池中的连接引用着事件循环，不关闭的话连接和事件循环都不会被回收
+
+    Args:
+        loop: 事件循环，默认是正在运行的事件循环
+    """
+    if loop is None:
+        loop = asyncio.get_running_loop()
+    pool = _asyncio_pools.pop(loop, None)
+    if pool is None:
+        return
+    for connections in pool.idle.values():
+        for reader, writer in connections:
+            writer.close()
+    pool.idle.clear()
+    pool.warm.clear()
+
+
+def run_asyncio(coroutine):
+    """ 和 asyncio.run 一样在新的事件循环中运行协程，
+    下载结束后关闭这个事件循环的连接池，同一个事件循环中的下载之间可以复用连接
+    """
+
+    async def main():
+        manage_asyncio_pool(asyncio.get_running_loop())
+        try:
+            return await coroutine
+        finally:
+            close_asyncio_pool()
+
+    return asyncio.run(main())
+
+
+async def _asyncio_send(method: str, url: str, headers: Dict[str, str],
+                        body: Optional[bytes], verify: bool,
+                        proxy: str = None):
+    """ 在一个（可能是复用的）连接上发送一次请求并读取响应
+    """
+    scheme, host, port, target = split_url(url)
+    key = (scheme, host, port, proxy)
+    pool = _get_asyncio_pool()
+    connection = pool.get(key)
+    reused = connection is not None
+    if connection is None:
+        connection = await _asyncio_open(scheme, host, port, verify, proxy)
+    reader, writer = connection
+    if proxy is not None and scheme == 'http':
+        # 通过代理访问 http 网站时使用完整的 url
+        target = url.split('#', 1)[0]
+        authorization = parse_proxy(proxy)[2]
+        if authorization:
+            headers = {**headers, 'Proxy-Authorization': authorization}
+
+    lines = [f'{method} {target} HTTP/1.1']
+    if not any(k.lower() == 'host' for k in headers):
+        lines.append(f'Host: {host}' if port == _default_ports[scheme]
+                     else f'Host: {host}:{port}')
+    lines.extend(f'{k}: {v}' for k, v in headers.items())
+    data = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+    try:
+        writer.write(data + body if body else data)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by server')
+    except (ConnectionError, asyncio.IncompleteReadError):
+        writer.close()
+        if reused:
+            # 复用的空闲连接可能已经被服务器关闭，换一个新连接重试
+            return await _asyncio_send(method, url, headers, body, verify,
+                                       proxy)
+        raise
+    try:
+        version, status_code, reason = parse_status_line(status_line)
+        header_list = []
+        lower_headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            name, value = name.strip(), value.strip()
+            header_list.append((name, value))
+            lower_headers[name.lower()] = value
+        if method == 'HEAD' or status_code in (204, 304) or \
+                100 <= status_code < 200:
+            content, closed = b'', False
+        else:
+            content, closed = await _asyncio_read_body(reader, lower_headers)
+    except BaseException:
+        writer.close()
+        raise
+    if not closed and is_keep_alive(version, lower_headers):
+        pool.put(key, (reader, writer))
+    else:
+        writer.close()
+    return status_code, reason, header_list, lower_headers, content
+
+
+async def asyncio_fetch(request: 'Request', proxy: str = None) -> 'Response':
+    """ 使用 asyncio 下载一个 Request，会自动跟随重定向。
+    超时和网络错误会以异常的形式抛出
+
+    Args:
+        request: 请求
+        proxy: http 代理地址，默认使用 Request 的 kwargs 中的 proxy
+    Returns:
+        magic Response
+    """
+    start_time = time.time()
+    method, url, headers, body = \
+        create_http_request_from_magic_request(request)
+    verify = request.kwargs.get('verify', True)
+    allow_redirects = request.kwargs.get('allow_redirects', True)
+    if proxy is None:
+        proxy = request.kwargs.get('proxy')
+    for _ in range(max_redirects + 1):
+        status_code, reason, header_list, lower_headers, content = \
+            await _asyncio_send(method, url, headers, body, verify, proxy)
+        redirect = get_redirect(method, url, status_code, lower_headers) \
+            if allow_redirects else None
+        if redirect is None:
+            return create_response_from_http(
+                request, url, status_code, reason, header_list,
+                decode_content(lower_headers, content),
+                time.time() - start_time
+            )
+        new_method, new_url = redirect
+        headers = get_redirect_headers(headers, method, new_method,
+                                       url, new_url)
+        if new_method != method:
+            method, body = new_method, None
+        url = new_url
+    raise ConnectionError(f'Exceeded {max_redirects} redirects')
@@ -0,0 +1,225 @@
+"""连接预热，提前为请求队列最前面的请求建立连接
+"""
+import asyncio
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, Optional, NoReturn, Tuple
+
+import requests_magic.downloader as magic_d
+from requests_magic.engine import DownloadEngine, AsyncioEngine
+from requests_magic.http_adapter import http_pool, split_url, asyncio_warm, \
+    get_asyncio_pool_of
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request
+
+
+class ConnectionPrewarmer:
+    """ 连接预热，交给调度器的 prewarm 参数使用。
+    调度器每次分发请求后会查看请求队列最前面 depth 个请求，为它们的主机预先建立连接
+    （包括 TCP、代理的 CONNECT 隧道和 TLS 握手）并放入下载器的连接池，
+    这些请求开始下载时可以直接在已经建立好的连接上发送。
+    预热后还没有被使用的连接总数不会超过 idle_budget，超过 max_idle_time 秒没有被使用的会被关闭。
+
+    Warnings:
+        只有 http_downloader 和 asyncio 下载引擎中的 asyncio_downloader（以及被换成它的 requests_downloader）
+        有连接池，其他下载器的请求不会预热。
+        使用代理池的请求在下载时才选择代理，也不会预热
+    """
+
+    def __init__(self, depth: int = 16,
+                 idle_budget: int = 8,
+                 max_per_host: int = 2,
+                 max_idle_time: float = 15,
+                 timeout: float = 10,
+                 workers: int = 4):
+        """ 连接预热
+
+        Args:
+            depth: 查看请求队列最前面多少个请求，默认 16
+            idle_budget: 预热后还没有被使用（包括正在建立）的连接总数上限，默认 8
+            max_per_host: 每个主机最多预热到多少个空闲连接，默认 2
+            max_idle_time: 预热的连接超过这个时间还没有被使用就关闭，默认 15 秒
+            timeout: 建立连接的超时时间，默认 10 秒
+            workers: http_downloader 建立连接使用的线程数，默认 4
+        """
+        self.depth = depth
+        self.idle_budget = idle_budget
+        self.max_per_host = max_per_host
+        self.max_idle_time = max_idle_time
+        self.timeout = timeout
+        self.workers = workers
+        # 正在建立的连接：连接池的键 -> 数量
+        self._pending: Counter = Counter()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        self.opened = 0
+        self.failed = 0
+
+    @staticmethod
+    def _get_target(request: 'Request', engine: DownloadEngine) \
+            -> Optional[Tuple[str, tuple, bool]]:
+        """ 获取请求下载时使用的连接池
+
+        Returns:
+            (连接池类型 'http' 或 'asyncio', 连接池的键, verify)，没有连接池或不能确定连接时返回 None
+        """
+        downloader = request.downloader
+        if downloader is magic_d.http_downloader:
+            kind = 'http'
+        elif isinstance(engine, AsyncioEngine) and \
+                engine.loop.is_running() and \
+                downloader in (magic_d.asyncio_downloader,
+                               magic_d.requests_downloader):
+            if downloader is magic_d.requests_downloader and \
+                    set(request.kwargs) - engine.asyncio_kwargs:
+                return None
+            kind = 'asyncio'
+        else:
+            return None
+        if 'proxies' in request.kwargs:
+            return None
+        proxy = request.kwargs.get('proxy')
+        if proxy is None and \
+                getattr(request.scheduler, 'proxy_pool', None) is not None:
+            return None
+        try:
+            scheme, host, port, _ = split_url(request.url)
+        except ValueError:
+            return None
+        verify = request.kwargs.get('verify', True)
+        if kind == 'http':
+            return kind, (scheme, host, port, verify, proxy), verify
+        return kind, (scheme, host, port, proxy), verify
+
+    def _count_idle(self, kind: str, key: tuple,
+                    engine: DownloadEngine) -> int:
+        if kind == 'http':
+            return http_pool.count_idle(*key)
+        pool = get_asyncio_pool_of(engine.loop)
+        return 0 if pool is None else len(pool.idle.get(key, ()))
+
+    def count_warm(self, engine: DownloadEngine = None) -> int:
+        """ 获取预热后还没有被使用的连接数（不包括正在建立的）
+        """
+        count = http_pool.count_warm()
+        if isinstance(engine, AsyncioEngine):
+            pool = get_asyncio_pool_of(engine.loop)
+            if pool is not None:
+                count += len(pool.warm)
+        return count
+
+    def prewarm(self, requests: Iterable['Request'],
+                engine: DownloadEngine) -> int:
+        """ 为即将下载的请求预热连接，连接在后台建立，不会阻塞
+
+        Args:
+            requests: 即将下载的请求，按下载顺序
+            engine: 调度器的下载引擎
+
+        Returns:
+            新开始建立的连接数
+        """
+        self._expire(engine)
+        with self._lock:
+            budget = self.idle_budget - self.count_warm(engine) - \
+                sum(self._pending.values())
+        if budget <= 0:
+            return 0
+        # (连接池类型, 连接池的键) -> 需要的连接数
+        needs: Dict[tuple, int] = Counter()
+        verifies: Dict[tuple, bool] = {}
+        for request in requests:
+            target = self._get_target(request, engine)
+            if target is None:
+                continue
+            kind, key, verify = target
+            needs[(kind, key)] += 1
+            verifies[(kind, key)] = verify
+        started = 0
+        for (kind, key), need in needs.items():
+            with self._lock:
+                have = self._count_idle(kind, key, engine) + \
+                    self._pending[(kind, key)]
+                count = min(need, self.max_per_host, budget) - have
+                if count <= 0:
+                    continue
+                self._pending[(kind, key)] += count
+            budget -= count
+            started += count
+            for _ in range(count):
+                self._start(kind, key, verifies[(kind, key)], engine)
+            if budget <= 0:
+                break
+        return started
+
+    def _start(self, kind: str, key: tuple, verify: bool,
+               engine: DownloadEngine) -> NoReturn:
+        if kind == 'http':
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(
+                        self.workers, thread_name_prefix='mm-Prewarm'
+                    )
+            self._executor.submit(self._warm_http, key)
+            return
+        scheme, host, port, proxy = key
+        future = asyncio.run_coroutine_threadsafe(
+            asyncio.wait_for(
+                asyncio_warm(scheme, host, port, verify, proxy),
+                self.timeout
+            ),
+            engine.loop
+        )
+        future.add_done_callback(
+            lambda f: self._done((kind, key),
+                                 not f.cancelled() and f.exception() is None)
+        )
+
+    def _warm_http(self, key: tuple) -> NoReturn:
+        success = False
+        try:
+            http_pool.warm(*key, timeout=self.timeout)
+            success = True
+        except Exception:
+            pass
+        finally:
+            self._done(('http', key), success)
+
+    def _done(self, target: tuple, success: bool) -> NoReturn:
+        with self._lock:
+            self._pending[target] -= 1
+            if self._pending[target] <= 0:
+                del self._pending[target]
+            if success:
+                self.opened += 1
+            else:
+                self.failed += 1
+
+    def _expire(self, engine: DownloadEngine) -> NoReturn:
+        """ 关闭太久没有被使用的预热连接
+        """
+        http_pool.expire_warm(self.max_idle_time)
+        if isinstance(engine, AsyncioEngine):
+            pool = get_asyncio_pool_of(engine.loop)
+            if pool is not None and pool.warm:
+                engine.loop.call_soon_threadsafe(
+                    pool.expire_warm, self.max_idle_time
+                )
+
+    def get_stats(self, engine: DownloadEngine = None) -> Dict[str, int]:
+        """ 获取统计数据：建立的连接数、被使用的连接数、失败次数、空闲的预热连接数
+        """
+        used = http_pool.warm_hits
+        if isinstance(engine, AsyncioEngine):
+            pool = get_asyncio_pool_of(engine.loop)
+            if pool is not None:
+                used += pool.warm_hits
+        return {
+            'prewarm_opened': self.opened,
+            'prewarm_used': used,
+            'prewarm_failed': self.failed,
+            'prewarm_idle': self.count_warm(engine),
+        }
@@ -1,22 +1,30 @@
-"""请求类和请求线程类
+"""请求类和响应类
 """
-import hashlib
-import threading
+import codecs
+import re
+import sys
 import time
 import json
-from typing import Callable, NoReturn, Dict, Any, List, Union
+import threading
+from typing import Callable, NoReturn, Dict, Any, List, Union, Mapping
 from dataclasses import dataclass
 from requests_magic.mmlog import logger
 import requests_magic.downloader as magic_d
+import requests_magic.fingerprint as magic_f
 from requests_magic.utils import getattr_in_module, get_log_name
 
 __FUCK_CIRCULAR_IMPORT = False
 if __FUCK_CIRCULAR_IMPORT:
     from .scheduler import Scheduler
+    from .fingerprint import Fingerprinter
+
+
+# 对冲的两个下载可能在不同的线程中同时完成
+_hedge_lock = threading.Lock()
 
 
 class Request:
-    """表示一个请求，这里会自动创建 RequestThread
+    """表示一个请求，由调度器交给下载引擎下载
     """
 
     # 会被持久化的字段，这些字段必须在 init 参数、self 字段中保持一致
@@ -25,15 +33,40 @@ class Request:
         'url',
         'method',
         'data',
-        'params'
+        'params',
         'tags',
         'headers',
         'time_out',
         'time_out_wait',
         'time_out_retry',
-        'wait'
+        'wait',
+        'recrawl_ttl',
+        'depth',
+        'deadline',
+        'hedge'
     )
 
+    # 按需创建或写时复制的字段，真正的值保存在以下划线开头的属性中
+    _lazy_fields = ('data', 'params', 'tags', 'headers')
+
+    # 等待中的请求可能有上百万个，所以使用 __slots__，并且尽量不为每个请求创建新的 dict
+    __slots__ = (
+        'name', 'url', 'method', 'wait',
+        '_data', '_params', '_headers', '_cookies', '_tags', '_kwargs',
+        '_shared',
+        '_callback_func', '_callback_owner', '_preparse',
+        'downloader', 'downloader_filter', 'scheduler', 'spider',
+        'start_time', 'total_time',
+        'time_out', 'time_out_wait', 'time_out_retry',
+        'recrawl_ttl', 'depth', 'deadline',
+        'hedge', 'hedged',
+        'response', '_task', '_hedge_task',
+    )
+
+    # _shared 的标志位：headers、cookies 仍然是和 Spider 共享的
+    _SHARED_HEADERS = 1
+    _SHARED_COOKIES = 2
+
     def __init__(self, url: str,
                  callback: Callable[[Any, 'Request'], NoReturn],
                  method: str = 'GET',
@@ -46,8 +79,13 @@ class Request:
                  downloader_filter: Callable[['Response', 'Request'], NoReturn] = magic_d.requests_downloader_filter,
                  preparse: Callable[['Response', 'Request'], NoReturn] = None,
                  name: str = '',
+                 recrawl_ttl: float = None,
+                 depth: int = None,
+                 deadline: float = None,
+                 ttl: float = None,
+                 hedge: bool = None,
                  **kwargs):
-        """表示一个请求，这里会自动创建 RequestThread
+        """表示一个请求，由调度器交给下载引擎下载
 
         Args:
             url: 请求的目标地址
@@ -55,7 +93,8 @@ class Request:
             data: 请求数据
             params: 请求查询数据
             method: 请求方法，默认：GET
-            headers: 请求头，如果为空，则从 requests_magic.request.default_headers copy一份
+            headers: 请求头，如果为空，则使用 Spider 的 headers（写时复制）
+            cookies: cookies，如果为空，则使用 Spider 的 cookies（写时复制）
             time_out: 超时时限，默认：10秒
             time_out_wait: 超时后重试前的等待时间，默认：15秒
             time_out_retry: 超时重试次数，默认：3次
@@ -64,47 +103,53 @@ class Request:
             downloader_filter: 下载过滤器，这个方法需要有两个参数分别表示 请求结果 和 Request，默认使用基于 requests 实现，如果要持久化请求，则需要把你的下载过滤器定义在某个模块顶级
             preparse: 预解析器，这必须是爬虫类中的方法，默认使用解析函数所在爬虫类的 preparse 方法
             name: 请求的名字，希望能帮助 debug
+            recrawl_ttl: 下载多少秒后可以再次下载这个请求（不再被去重），默认使用 Spider 的 recrawl_ttl
+            depth: 爬取深度，默认由调度器设置：start 方法产生的请求为 0，解析函数产生的请求为所属请求的深度 + 1
+            deadline: 截止时间（time.time() 时间戳），到这个时间还没有开始下载的请求会被调度器丢弃，默认 None 不限制
+            ttl: 从现在开始多少秒内有效，会换算成 deadline，同时设置时使用更早的那个
+            hedge: 调度器开启 hedge 时，下载太慢是否再发送一次对冲的下载，默认使用 Spider 的 hedge
             kwargs: 直接记录在自己的 kwargs 属性上，默认的 requests 下载器会把这里的值添加到 requests.request 方法的参数上
+
+        Warnings:
+            没有指定 headers 和 cookies 时，请求和 Spider 共享同一个 dict，
+            第一次访问请求的 headers 或 cookies 属性时才会复制一份，
+            所以在这之前修改 Spider 的 headers 和 cookies 也会影响这个请求。
         """
-        super().__init__()
+        # get spider by callback
+        spider = callback.__self__
+        from .spider import Spider
+        if not isinstance(spider, Spider):
+            raise TypeError('callback must be a method in spider')
 
         self.wait = wait
         self.name = name
-        if tags is None:
-            tags = {}
-        if data is None:
-            data = {}
-        if params is None:
-            params = {}
+        self._shared = 0
         if headers is None:
-            headers = callback.__self__.headers.copy()
+            headers = spider.headers
+            self._shared |= Request._SHARED_HEADERS
         if cookies is None:
-            cookies = callback.__self__.cookies.copy()
+            cookies = spider.cookies
+            self._shared |= Request._SHARED_COOKIES
 
         # http
         self.url: str = url
-        self.data: dict = data
-        self.params: dict = params
-        self.method: str = method
-        self.headers: dict = headers
-        self.cookies: dict = cookies
+        self._data: dict = data
+        self._params: dict = params
+        self.method: str = sys.intern(method)
+        self._headers: dict = headers
+        self._cookies: dict = cookies
 
         # scheduler
-        self.callback: Callable[[Any, 'Request'], NoReturn] = callback
+        # 只保存函数和所属的爬虫，不为每个请求保存一个绑定方法
+        self._callback_func = callback.__func__
+        self._callback_owner = spider
         self.downloader = downloader
         self.downloader_filter = downloader_filter
-        self.tags: dict = tags
+        self._tags: dict = tags
         self.scheduler = None
-        # get spider by callback
-
-        self.spider = callback.__self__
-        from .spider import Spider
-        if not isinstance(self.spider, Spider):
-            raise TypeError('callback must be a method in spider')
-        # preparse
-        self.preparse = preparse
-        if self.preparse is None:
-            self.preparse = self.spider.preparse
+        self.spider = spider
+        # preparse，为空时使用 callback 所在爬虫的 preparse
+        self._preparse = preparse
         # time
         self.start_time: float = -1
         self.total_time: float = -1
@@ -112,52 +157,250 @@ class Request:
         self.time_out: float = time_out
         self.time_out_wait: float = time_out_wait
         self.time_out_retry: int = time_out_retry
-
-        self.kwargs = kwargs
+        # 重新爬取
+        self.recrawl_ttl: float = recrawl_ttl
+        self.depth: int = depth
+        # 过期时间
+        if ttl is not None:
+            expires = time.time() + ttl
+            deadline = expires if deadline is None else min(deadline, expires)
+        self.deadline: float = deadline
+        # 对冲
+        self.hedge: bool = hedge
+        # 0 没有对冲，1 已经对冲，2 结果来自对冲的下载
+        self.hedged: int = 0
+
+        self._kwargs = kwargs or None
 
         # Request self field
-        self.response:'Response' = None
-        self.show_url = \
-            (self.url if len(self.url) < 40 else '...') + \
-            self.url[-37:-1]
-        self._thread: threading.Thread = None
+        self.response: 'Response' = None
+        # 当前下载任务的标识，由下载引擎使用
+        self._task: object = None
+        # 对冲下载任务的标识
+        self._hedge_task: object = None
+
+    # lazy fields
+
+    @property
+    def callback(self) -> Callable[[Any, 'Request'], NoReturn]:
+        return self._callback_func.__get__(self._callback_owner)
+
+    @callback.setter
+    def callback(self, value: Callable[[Any, 'Request'], NoReturn]):
+        self._callback_func = value.__func__
+        self._callback_owner = value.__self__
+
+    @property
+    def preparse(self) -> Callable[['Response', 'Request'], NoReturn]:
+        if self._preparse is None:
+            return self._callback_owner.preparse
+        return self._preparse
+
+    @preparse.setter
+    def preparse(self, value: Callable[['Response', 'Request'], NoReturn]):
+        self._preparse = value
+
+    @property
+    def headers(self) -> dict:
+        if self._shared & Request._SHARED_HEADERS:
+            self._headers = self._headers.copy()
+            self._shared &= ~Request._SHARED_HEADERS
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: dict):
+        self._headers = value
+        self._shared &= ~Request._SHARED_HEADERS
+
+    @property
+    def cookies(self) -> dict:
+        if self._shared & Request._SHARED_COOKIES:
+            self._cookies = self._cookies.copy()
+            self._shared &= ~Request._SHARED_COOKIES
+        return self._cookies
+
+    @cookies.setter
+    def cookies(self, value: dict):
+        self._cookies = value
+        self._shared &= ~Request._SHARED_COOKIES
+
+    @property
+    def data(self) -> dict:
+        if self._data is None:
+            self._data = {}
+        return self._data
+
+    @data.setter
+    def data(self, value: dict):
+        self._data = value
+
+    @property
+    def params(self) -> dict:
+        if self._params is None:
+            self._params = {}
+        return self._params
+
+    @params.setter
+    def params(self, value: dict):
+        self._params = value
+
+    @property
+    def tags(self) -> dict:
+        if self._tags is None:
+            self._tags = {}
+        return self._tags
+
+    @tags.setter
+    def tags(self, value: dict):
+        self._tags = value
+
+    @property
+    def kwargs(self) -> dict:
+        if self._kwargs is None:
+            self._kwargs = {}
+        return self._kwargs
+
+    @kwargs.setter
+    def kwargs(self, value: dict):
+        self._kwargs = value
+
+    @property
+    def show_url(self) -> str:
+        """ 在日志中显示的 url，过长时只显示结尾部分
+        """
+        url = self.url
+        return url if len(url) < 40 else '...' + url[-37:]
+
+    def get_headers_copy(self) -> dict:
+        """ 获取一份 headers 的拷贝，不会触发写时复制
+        """
+        return self._headers.copy()
+
+    def get_cookies_copy(self) -> dict:
+        """ 获取一份 cookies 的拷贝，不会触发写时复制
+        """
+        return self._cookies.copy()
+
+    def get_tags_copy(self) -> dict:
+        """ 获取一份 tags 的拷贝，没有 tags 时不会为请求创建新的 dict
+        """
+        return self._tags.copy() if self._tags else {}
+
+    def get_data_copy(self) -> dict:
+        """ 获取一份 data 的拷贝，没有 data 时不会为请求创建新的 dict
+        """
+        if not self._data:
+            return {}
+        return self._data.copy() if isinstance(self._data, dict) \
+            else self._data
 
     def __str__(self) -> str:
         return get_log_name(self, False)
 
     def is_requesting(self) -> bool:
-        """ 是否正在请求中，根据是否存在下载线程判断
+        """ 是否正在请求中，根据是否存在下载任务判断
+        """
+        return self._task is not None
+
+    def is_expired(self, now: float = None) -> bool:
+        """ 是否已经超过截止时间（deadline）
+
+        Args:
+            now: 当前时间戳，默认 time.time()
         """
-        return self._thread is not None
+        if self.deadline is None:
+            return False
+        return (time.time() if now is None else now) >= self.deadline
 
     def is_finish(self) -> bool:
         """ 是否已经请求完成，根据是否有结果和 is_requesting 判断
         """
         return self.response and not self.is_requesting()
 
-    def start(self):
-        """开始下载，自动创建 RequestThread，下载完成后会自动调用调度器的方法
+    def _begin(self) -> object:
+        """ 开始下载前的准备，记录开始时间并创建下载标识
+
+        Returns:
+            下载标识，如果正在下载中则返回 None
         """
-        if self._thread:
+        if self._task:
             logger.error(f"{self} downloading, Can't start")
-            return
+            return None
         logger.info_request(
             f"{self} [{self.method.upper()} START] {self.show_url}"
         )
-        self._thread = threading.Thread(target=self._request_thread)
+        self._task = task = object()
+        self.hedged = 0
         self.start_time = time.time()
-        self._thread.start()
+        return task
+
+    def start_hedge(self) -> bool:
+        """ 用同一个请求再开始一次对冲的下载，两次下载中先完成的有效，另一个会被取消
+
+        Returns:
+            是否开始了，没有在下载中或已经对冲过时返回 False
+        """
+        with _hedge_lock:
+            if self._task is None or self.hedged:
+                return False
+            self._hedge_task = task = object()
+            self.hedged = 1
+        logger.info_request(
+            f"{self} [{self.method.upper()} HEDGE] {self.show_url}"
+        )
+        self.scheduler.engine.start(self, task)
+        return True
+
+    def start(self):
+        """开始下载，交给调度器的下载引擎执行，下载完成后会自动调用调度器的方法
+        """
+        task = self._begin()
+        if task is not None:
+            self.scheduler.engine.start(self, task)
+
+    @staticmethod
+    def start_batch(requests: List['Request']):
+        """ 一起开始下载一批请求，它们必须使用同一个批量下载器（见 downloader.batch_downloader）
+
+        Args:
+            requests: 请求们
+        """
+        started, tasks = [], []
+        for request in requests:
+            task = request._begin()
+            if task is not None:
+                started.append(request)
+                tasks.append(task)
+        if started:
+            started[0].scheduler.engine.start_batch(started, tasks)
+
+    def fingerprint(self, fingerprinter: 'Fingerprinter' = None) -> bytes:
+        """计算用于去重的指纹，默认使用所属爬虫的 fingerprinter 指纹策略
+
+        Args:
+            fingerprinter: 指定指纹策略
+
+        Returns:
+            16 字节的指纹
+        """
+        if fingerprinter is None:
+            spider = self.spider if self.spider is not None \
+                else self._callback_owner
+            fingerprinter = getattr(spider, 'fingerprinter', None) \
+                or magic_f.default_fingerprinter
+        return fingerprinter.fingerprint(self)
+
+    def md5(self, fingerprinter: 'Fingerprinter' = None) -> str:
+        """根据某些属性计算自己的md5，用于url去重。
+        默认使用所属爬虫的 fingerprinter，根据请求方法、规范化的 url（包括 params）、data 计算
+
+        Args:
+            fingerprinter: 指定指纹策略
 
-    def md5(self) -> str:
-        """根据某些属性计算自己的md5，
-        用于url去重，默认时使用 请求方法、url、data、time_out_retry 按照 utf-8 编码计算
         Returns:
             md5字符串
         """
-        return hashlib.md5(
-            f'{self.method};{self.url};{self.data};'
-            f'{self.time_out_retry}'.encode('utf-8')
-        ).hexdigest()
+        return self.fingerprint(fingerprinter).hex()
 
     def _request_thread_error(self, error: Exception) -> NoReturn:
         """ 当下载器或下载过滤器返回错误时调用。（在下载线程中调用）。
@@ -189,6 +432,8 @@ class Request:
                 self.scheduler.downloader_retry(
                     self, wait=self.time_out_wait
                 )
+            else:
+                self.scheduler.downloader_abandon(self)
         elif isinstance(operate, magic_d.Retry):
             logger.warning(
                 f'{self} Retry [{self.method.upper()}] '
@@ -197,7 +442,8 @@ class Request:
             # if operate.wait > 0:
             #     time.sleep(operate.wait)
             self.scheduler.downloader_retry(
-                self, jump_in_line=operate.jump_in_line, wait=operate.wait
+                self, jump_in_line=operate.jump_in_line, wait=operate.wait,
+                failure=getattr(operate, 'failure', True)
             )
         elif isinstance(operate, magic_d.Abandon):
             logger.warning(
@@ -220,15 +466,37 @@ class Request:
         )
         self.scheduler.downloader_finish(self.response, self)
 
-    def _request_thread(self) -> NoReturn:
-        """开始下载，这是新线程执行的方法
-        """
-        self.start_time = time.time()
+    def _download_done(self, task: object, response) -> NoReturn:
+        """ 下载器返回后由下载引擎调用（在下载线程或事件循环线程中调用）。
+        这会执行下载过滤器，然后完成、重试或放弃这个请求
 
-        # download
-        response = self.downloader(self)
-        if self._thread != threading.current_thread():
-            return
+        Args:
+            task: 开始下载时交给引擎的标识，已经被 stop 的下载的结果会被忽略
+            response: 下载器的返回值
+        """
+        with _hedge_lock:
+            if task is None:
+                return
+            if task is self._task:
+                other = self._hedge_task
+            elif task is self._hedge_task:
+                other = self._task
+            else:
+                return
+            if other is not None:
+                if isinstance(response, (magic_d.DownloaderFailOperate,
+                                         Exception)):
+                    # 另一个下载还在进行中，由它决定结果
+                    if task is self._task:
+                        # 剩下的是对冲的下载
+                        self.hedged = 2
+                    self._task, self._hedge_task = other, None
+                    return
+                if task is self._hedge_task:
+                    self.hedged = 2
+                self._task, self._hedge_task = task, None
+        if other is not None and self.scheduler is not None:
+            self.scheduler.engine.cancel(other)
         self.total_time = time.time() - self.start_time
         if isinstance(response, magic_d.DownloaderFailOperate):
             self._request_thread_fail(response)
@@ -239,7 +507,7 @@ class Request:
 
         # filter
         response_filter = self.downloader_filter(response, self)
-        if self._thread != threading.current_thread():
+        if self._task is not task:
             return
         if isinstance(response_filter, magic_d.DownloaderFailOperate):
             self._request_thread_fail(response_filter)
@@ -251,12 +519,17 @@ class Request:
         self._request_thread_finish(response)
 
     def stop(self) -> NoReturn:
-        """终止请求线程
+        """终止下载
         Warnings:
-            这并不会真正停止请求线程，只是让正在进行中的线程不再返回结果。
+            多线程引擎并不会真正停止下载线程，只是让正在进行中的下载不再返回结果。
             这不是放弃请求，stop 后这个请求仍然会留在调度器的 link_request 中。
         """
-        self._thread = None
+        with _hedge_lock:
+            tasks = (self._task, self._hedge_task)
+            self._task = self._hedge_task = None
+        for task in tasks:
+            if task is not None and self.scheduler is not None:
+                self.scheduler.engine.cancel(task)
 
     def to_dict(self) -> Dict[str, Union[int, float, str]]:
         """把请求转换成用字符串表示的 Dict，可以保存起来以后再读取再请求
@@ -288,11 +561,16 @@ class Request:
                 'callback': self.callback.__name__,
                 'preparse': self.preparse.__name__,
                 'spider': self.spider.identity,
-                'kwargs': self.kwargs,
+                'kwargs': self._kwargs or {},
             }
         }
         for field in Request._dict_fields:
-            json_dict[field] = getattr(self, field)
+            if field in Request._lazy_fields:
+                # 不触发写时复制和懒创建
+                value = getattr(self, '_' + field)
+                json_dict[field] = {} if value is None else value
+            else:
+                json_dict[field] = getattr(self, field)
         return json_dict
 
     @staticmethod
@@ -347,45 +625,196 @@ class SetCookie:
     comment: str = None
 
 
-@dataclass
+# 表示缓存还没有计算
+_UNSET = object()
+
+# 在 html 开头查找 <meta charset> 的范围
+_META_SNIFF_SIZE = 2048
+_META_CHARSET = re.compile(
+    rb'''<meta[^>]+charset\s*=\s*["\']?\s*([\w.:-]+)''', re.IGNORECASE
+)
+
+
 class Response:
-    request: Request
-    url: str
-    content: bytes
-    status_code: int
-    headers: dict
-    set_cookies: List[SetCookie]
-    reason: str
-    request_time: float
+    """ 下载结果。
+    text、json、encoding、headers 和 set_cookies 都在第一次使用时才计算，之后直接使用缓存
+    """
+
+    __slots__ = (
+        'request', 'url', 'status_code', 'reason', 'request_time',
+        '_content', '_headers', '_lower_headers', '_set_cookies',
+        '_encoding', '_text', '_json',
+    )
+
+    def __init__(self, request: Request, url: str, content: bytes,
+                 status_code: int, headers: Mapping[str, str],
+                 set_cookies: Union[List[SetCookie],
+                                    Callable[[], List[SetCookie]]],
+                 reason: str, request_time: float):
+        """ 下载结果
+
+        Args:
+            request: 请求
+            url: 最终的 url
+            content: 响应体
+            status_code: 状态码
+            headers: 响应头，可以是任意 Mapping，第一次访问 headers 时才复制成 dict
+            set_cookies: SetCookie 列表，也可以是一个返回列表的无参方法，第一次访问 set_cookies 时才调用
+            reason: 状态码说明
+            request_time: 下载用时
+        """
+        self.request = request
+        self.url = url
+        self.status_code = status_code
+        self.reason = reason
+        self.request_time = request_time
+        self._content = content
+        self._headers = headers
+        self._lower_headers: Dict[str, str] = None
+        self._set_cookies = set_cookies
+        self._encoding: str = None
+        self._text: str = None
+        self._json = _UNSET
+
+    def __repr__(self) -> str:
+        return f'<Response [{self.status_code}] {self.url}>'
+
+    @property
+    def size(self) -> int:
+        """ 响应体占用的字节数，释放后为 0
+        """
+        return len(self._content) if self._content else 0
+
+    @property
+    def is_released(self) -> bool:
+        """ 响应体是否已经被 release 释放
+        """
+        return self._content is None
+
+    def release(self) -> NoReturn:
+        """ 释放响应体和解码缓存，并断开和请求之间的相互引用。
+        调度器会在解析函数执行完后自动调用
+        """
+        self._content = None
+        self._encoding = None
+        self._text = None
+        self._json = _UNSET
+        if self.request is not None and self.request.response is self:
+            self.request.response = None
+        self.request = None
+
+    def with_request(self, request: Request) -> 'Response':
+        """ 复制一份属于另一个请求的 Response，响应体和已经计算好的缓存是共享的
+        """
+        result = Response.__new__(Response)
+        for name in Response.__slots__:
+            setattr(result, name, getattr(self, name))
+        result.request = request
+        return result
+
+    @property
+    def content(self) -> bytes:
+        return self._content
+
+    @content.setter
+    def content(self, value: bytes):
+        self._content = value
+        self._encoding = None
+        self._text = None
+        self._json = _UNSET
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        if not isinstance(self._headers, dict):
+            self._headers = dict(self._headers)
+        return self._headers
+
+    @headers.setter
+    def headers(self, value: Mapping[str, str]):
+        self._headers = value
+        self._lower_headers = None
+        self._encoding = None
+        self._text = None
+        self._json = _UNSET
+
+    def get_header(self, name: str, default: str = None) -> str:
+        """ 不区分大小写地获取一个响应头
+        """
+        if self._lower_headers is None:
+            self._lower_headers = {
+                k.lower(): v for k, v in self._headers.items()
+            }
+        return self._lower_headers.get(name.lower(), default)
+
+    @property
+    def set_cookies(self) -> List[SetCookie]:
+        if callable(self._set_cookies):
+            self._set_cookies = self._set_cookies()
+        return self._set_cookies
+
+    @set_cookies.setter
+    def set_cookies(self, value: List[SetCookie]):
+        self._set_cookies = value
 
     @property
     def is_redirect(self) -> bool:
-        return 'location' in self.headers and 300 <= self.status_code <= 399
+        return self.get_header('location') is not None and \
+            300 <= self.status_code <= 399
 
     @property
     def location(self) -> str:
-        return self.headers['location']
+        return self.get_header('location')
 
     @property
     def encoding(self) -> str:
-        encoding = 'UTF-8'
-        ct: str = self.headers.get('content-type', 'text/html; charset=utf-8')
+        """ 响应的编码，优先使用 Content-Type 中的 charset，
+        没有时在 html 开头的 <meta> 中查找，都没有则是 UTF-8
+        """
+        if self._encoding is None:
+            self._encoding = self._detect_encoding()
+        return self._encoding
+
+    def _detect_encoding(self) -> str:
+        ct: str = self.get_header('content-type', 'text/html')
         for s in ct.split(';'):
             s: str = s.strip()
-            if s.startswith('charset='):
-                encoding = s[8:]
-                break
-        return encoding
+            if s.lower().startswith('charset='):
+                encoding = s[8:].strip('"\' ')
+                if _is_codec(encoding):
+                    return encoding
+        if 'html' in ct.lower() and isinstance(self._content, bytes):
+            match = _META_CHARSET.search(
+                self._content, 0, _META_SNIFF_SIZE
+            )
+            if match:
+                encoding = match.group(1).decode('ascii', 'replace')
+                if _is_codec(encoding):
+                    return encoding
+        return 'UTF-8'
 
     @property
     def text(self) -> str:
-        return self.text_by(self.encoding)
+        if self._text is None:
+            self._text = self.text_by(self.encoding)
+        return self._text
 
     @property
     def json(self) -> dict:
-        return json.loads(self.text)
+        """ 把 text 解析为 json，结果会被缓存，修改它会影响之后的访问
+        """
+        if self._json is _UNSET:
+            self._json = json.loads(self.text)
+        return self._json
 
     def text_by(self, encoding: str) -> str:
-        if isinstance(self.content, str):
-            return self.content
-        return self.content.decode(encoding, 'replace')
+        if isinstance(self._content, str):
+            return self._content
+        return self._content.decode(encoding, 'replace')
+
+
+def _is_codec(encoding: str) -> bool:
+    try:
+        codecs.lookup(encoding)
+        return True
+    except LookupError:
+        return False
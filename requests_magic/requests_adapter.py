@@ -1,9 +1,10 @@
+import functools
 from typing import List, Any, Dict
 
 __FUCK_CIRCULAR_IMPORT = False
 if __FUCK_CIRCULAR_IMPORT:
     import requests
-    from .request import Response, Request
+    from .request import Response, Request, SetCookie
 
 
 def create_response_from_requests(r: 'requests.Response', request: 'Request') -> 'Response':
@@ -17,9 +18,31 @@ def create_response_from_requests(r: 'requests.Response', request: 'Request') ->
         magic Response
 
     """
-    from .request import Response, SetCookie
+    from .request import Response
+    return Response(
+        request=request,
+        url=r.url,
+        status_code=r.status_code,
+        reason=r.reason,
+        content=r.content,
+        headers=r.headers,
+        request_time=r.elapsed.total_seconds(),
+        set_cookies=functools.partial(create_set_cookies_from_requests, r.cookies)
+    )
+
+
+def create_set_cookies_from_requests(cookies: 'requests.cookies.RequestsCookieJar') -> List['SetCookie']:
+    """ 根据 Requests 库中的 CookieJar 创建 SetCookie 列表，Response 第一次访问 set_cookies 时才会调用
+
+    Args:
+        cookies: Requests 库 Response 的 cookies.
+
+    Returns:
+        SetCookie 列表
+    """
+    from .request import SetCookie
     set_cookies: List[SetCookie] = []
-    for c in r.cookies:
+    for c in cookies:
         set_cookies.append(SetCookie(
             version=c.version,
             name=c.name,
@@ -30,16 +53,7 @@ def create_response_from_requests(r: 'requests.Response', request: 'Request') ->
             secure=c.secure,
             comment=c.comment,
         ))
-    return Response(
-        request=request,
-        url=r.url,
-        status_code=r.status_code,
-        reason=r.reason,
-        content=r.content,
-        headers=dict(r.headers),
-        request_time=r.elapsed.total_seconds(),
-        set_cookies=set_cookies
-    )
+    return set_cookies
 
 
 def create_requests_request_kwargs_from_magic_request(request: "Request") -> Dict[str, Any]:
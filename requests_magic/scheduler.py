@@ -1,14 +1,33 @@
+import hashlib
+import itertools
 import json
 import os.path
-from collections import Generator
-from typing import Sequence, List, NoReturn, Dict, Any, Callable
-from dataclasses import dataclass
+from collections import Counter, deque
+from collections.abc import Iterator
+from typing import Sequence, List, NoReturn, Dict, Any, Callable, \
+    Tuple, Optional
+from dataclasses import dataclass, field
 from requests_magic.request import Request, Response
 from requests_magic.item import Item
 from requests_magic.spider import Spider
 from requests_magic.saver import Saver
 from requests_magic.mmlog import logger
 from requests_magic.exception import ExistingIdentityError
+from requests_magic.archive import ResponseArchive
+from requests_magic.fingerprint import Fingerprinter
+from requests_magic.simhash import NearDuplicateDetector
+from requests_magic.trap import TrapDetector
+from requests_magic.breaker import CircuitBreaker, get_host
+from requests_magic.hedge import HedgePolicy
+from requests_magic.proxy import ProxyPool, create_proxy_pool
+from requests_magic.dns import DNSCache
+from requests_magic.prewarm import ConnectionPrewarmer
+from requests_magic.frontier import Frontier, FairFrontier, create_frontier
+from requests_magic.seen import SeenStore, MemorySeenStore, MmapSeenStore, \
+    DigestStore, MemoryDigestStore, MmapDigestStore
+from requests_magic.engine import DownloadEngine, create_engine
+from requests_magic.downloader import is_batch_downloader
+from requests_magic.http_adapter import split_url
 import threading
 
 import time
@@ -26,7 +45,25 @@ class Scheduler:
                  request_interval: float = 0,
                  distinct: bool = True,
                  start_pause: bool = False,
-                 web_view=None):
+                 web_view=None,
+                 response_archive=None,
+                 engine='thread',
+                 coalesce=False,
+                 release_response=True,
+                 frontier_window: int = 1000,
+                 seen_store=None,
+                 content_digest=None,
+                 near_duplicate=None,
+                 trap_detector=None,
+                 frontier='bfs',
+                 max_depth: int = None,
+                 fair: bool = True,
+                 circuit_breaker=None,
+                 hedge=None,
+                 proxy_pool=None,
+                 dns_cache=None,
+                 dns_prefetch: int = 64,
+                 prewarm=None):
         """调度器，核心组件，爬虫的开始，负责请求管理与 item 转发
 
         Args:
@@ -38,6 +75,49 @@ class Scheduler:
             distinct: 是否开启去重，默认开启.
             start_pause: 调度器开启时是否处于暂停状态.
             web_view: 可在浏览器上查看的页面，默认关闭（None），可以设置为一个端口号，或是一个包含ip与端口的元组
+            response_archive: 响应存档，可以是 ResponseArchive 实例或存档文件路径，
+                默认 None。recording_downloader 和 replay_downloader 会用到它
+            engine: 下载引擎，可以是 'thread'（默认，每个请求一个线程）、
+                'asyncio'（全部请求在一个事件循环线程中）或 DownloadEngine 实例
+            coalesce: 是否合并正在下载中的相同请求，默认关闭。
+                开启（True）时用 Request.md5 判断请求是否相同，也可以传入一个 (Request) -> str 的方法作为判断依据。
+                相同的请求只会下载一次，其他请求会等待它完成并各自用共享的 Response 调用自己的解析函数
+            release_response: 解析函数执行完后是否释放 Response 的响应体，默认开启。
+                设置为 'archive' 时会先把 Response 保存到 response_archive 再释放。
+                如果需要在解析函数之后继续使用 Response，需要关闭这个功能
+            frontier_window: Spider 的 start 方法和解析函数返回的生成器不会一次迭代完，
+                只有请求队列短于这个长度时才继续迭代，默认 1000
+            seen_store: 去重使用的指纹存储，可以是 SeenStore 实例或文件路径（使用 MmapSeenStore），
+                默认 None 表示保存在内存中并随状态保存到 md5.txt
+            content_digest: 是否记录每个请求的响应体摘要，默认 None 关闭。
+                开启后响应体与上一次下载相同时不再调用预解析和解析函数，而是调用 Spider 的 on_unchanged。
+                可以是 True（保存在内存中并随状态保存到 digests.txt）、DigestStore 实例或文件路径（使用 MmapDigestStore）
+            near_duplicate: 近似重复页面检测，默认 None 关闭。
+                可以是 True（使用默认的 NearDuplicateDetector）或 NearDuplicateDetector 实例，
+                近似重复的页面会被丢弃或不再扩展链接
+            trap_detector: 爬虫陷阱检测，默认 None 关闭。
+                可以是 True（使用默认的 TrapDetector）或 TrapDetector 实例，
+                超出主机或 url 模式预算的请求会被丢弃或推迟到请求队列空了之后
+            frontier: 请求队列的策略，可以是 'bfs'（默认，先进先出）、'dfs'（后进先出，队列更短）、
+                评分函数 (Request) -> float（最佳优先，分数高的先下载）或 Frontier 实例
+            max_depth: 最大爬取深度，深度超过它的请求会被丢弃，默认 None 不限制
+            fair: 是否在多个爬虫之间公平调度，默认开启。
+                开启后每个爬虫有自己的请求队列（使用 frontier 指定的策略），按 Spider.weight 加权轮流下载，
+                并且每个爬虫同时使用的连接数不超过 Spider.max_link。frontier 是 Frontier 实例时不会开启
+            circuit_breaker: 按主机的熔断器，默认 None 关闭。
+                可以是 True（使用默认的 CircuitBreaker）或 CircuitBreaker 实例，
+                连续失败的主机的请求会被暂存起来不再下载，直到探测请求成功
+            hedge: 对冲请求，默认 None 关闭。
+                可以是 True（使用默认的 HedgePolicy）或 HedgePolicy 实例，
+                Request.hedge 或 Spider.hedge 为 True 的请求下载时间超过主机的 p95 耗时后会再下载一次，
+                对冲的下载不占用 max_link
+            proxy_pool: 代理池，默认 None 不使用。可以是代理地址列表或 ProxyPool 实例，
+                默认的下载器会从代理池中选择代理，并根据下载结果给代理评分
+            dns_cache: DNS 解析缓存，默认 None 关闭。可以是 True（使用默认的 DNSCache）或 DNSCache 实例，
+                start 时会替换整个进程的 socket.getaddrinfo，请求线程结束（close）时恢复
+            dns_prefetch: 开启 dns_cache 时，每秒预解析请求队列最前面多少个请求的主机，默认 64，0 表示不预解析
+            prewarm: 连接预热，默认 None 关闭。可以是 True（使用默认的 ConnectionPrewarmer）或 ConnectionPrewarmer 实例，
+                每次分发请求后为请求队列最前面的请求预先建立连接，look-ahead 深度和空闲连接预算由 ConnectionPrewarmer 设置
 
         Warnings:
             注意线程安全问题
@@ -57,27 +137,141 @@ class Scheduler:
         self.request_interval: float = request_interval
         self._tags = tags.copy()
 
+        # 响应存档
+        if isinstance(response_archive, str):
+            response_archive = ResponseArchive(response_archive)
+        self.response_archive: ResponseArchive = response_archive
+
+        # 下载引擎
+        self.engine: DownloadEngine = create_engine(engine)
+
+        # 合并相同的下载
+        if coalesce is True:
+            coalesce = default_coalesce_key
+        self.coalesce: Callable[[Request], str] = coalesce or None
+
+        # 解析后释放响应
+        self.release_response = release_response
+
+        # 还没有迭代完的生成器，后加入的先迭代
+        self.frontier_window: int = frontier_window
+        self._generators: List[GeneratorSource] = []
+        # 流水线中的 Response 正在占用的字节数
+        self._response_bytes: int = 0
+        self._held_responses = set()
+        self._response_bytes_lock = threading.Lock()
+
         # load dir
         self.load_from: str = ''
 
         # looper
-        self.request_looper = Looper(target=self._request_loop)
-        self.response_looper = Looper(target=self._response_loop)
+        self.request_looper = Looper(target=self._request_loop,
+                                     on_close=self._request_loop_closed)
+        self.response_looper = Looper(target=self._response_loop,
+                                      on_close=self._looper_closed)
+        # 还在运行的调度器线程数量，都结束后关闭 seen_store 等存储
+        self._running_loopers: int = 0
+        self._stores_closed: bool = False
 
         # lock
         self._request_list_lock = threading.Lock()
         self._other_lock = threading.Lock()
 
         # 请求队列
-        self._request_list: List[Request] = []
+        if fair and not isinstance(frontier, Frontier):
+            self.frontier: Frontier = FairFrontier(
+                lambda: create_frontier(frontier)
+            )
+        else:
+            self.frontier: Frontier = create_frontier(frontier)
+        self.frontier.on_expired = self._shed_expired
+        # 每隔多少秒清理一次请求队列中过期（超过 deadline）的请求，取出时也会检查
+        self.expired_sweep_interval: float = 5
+        self._expired_sweep_time: float = 0
+        self.max_depth: int = max_depth
+        # 被推迟的请求（可能是爬虫陷阱），请求队列空了之后才会下载
+        self._deferred_requests: List[Request] = []
         # 正在请求中的请求
         self._link_requests: List[Request] = []
         # 请求冷却剩余时间
         self._request_wait_time: float = 0
-        # 添加过的请求的 MD5
-        self._requests_md5: List[str] = []
+        # 添加过的请求的指纹
+        if seen_store is None:
+            seen_store = MemorySeenStore()
+        elif isinstance(seen_store, str):
+            seen_store = MmapSeenStore(seen_store)
+        self.seen_store: SeenStore = seen_store
+        # (统计时间, 可以重新爬取的指纹数量)
+        self._recrawl_due: Tuple[float, int] = (0, 0)
+
+        # 响应体摘要
+        if content_digest is True:
+            content_digest = MemoryDigestStore()
+        elif isinstance(content_digest, str):
+            content_digest = MmapDigestStore(content_digest)
+        elif content_digest is False:
+            content_digest = None
+        self.content_digest: DigestStore = content_digest
+
+        # 近似重复页面检测
+        if near_duplicate is True:
+            near_duplicate = NearDuplicateDetector()
+        self.near_duplicate: NearDuplicateDetector = near_duplicate or None
+
+        # 爬虫陷阱检测
+        if trap_detector is True:
+            trap_detector = TrapDetector()
+        self.trap_detector: TrapDetector = trap_detector or None
+
+        # 熔断器
+        if circuit_breaker is True:
+            circuit_breaker = CircuitBreaker()
+        self.circuit_breaker: CircuitBreaker = circuit_breaker or None
+        # 主机 -> 因为熔断被暂存的请求
+        self._parked: Dict[str, List[Request]] = {}
+        # 正在进行的探测请求 -> 主机
+        self._probes: Dict[Request, str] = {}
+
+        # 对冲请求
+        if hedge is True:
+            hedge = HedgePolicy()
+        self.hedge_policy: HedgePolicy = hedge or None
+
+        # 代理池
+        self.proxy_pool: ProxyPool = create_proxy_pool(proxy_pool)
+
+        # DNS 缓存
+        if dns_cache is True:
+            dns_cache = DNSCache()
+        # start 时才安装，请求线程结束时卸载
+        self.dns_cache: DNSCache = dns_cache \
+            if isinstance(dns_cache, DNSCache) else None
+        self.dns_prefetch: int = dns_prefetch
+        self._dns_prefetch_time: float = 0
+
+        # 连接预热
+        if prewarm is True:
+            prewarm = ConnectionPrewarmer()
+        self.prewarmer: ConnectionPrewarmer = prewarm or None
+        # 统计数据，显示在 web 页面上
+        self._stats: Dict[str, int] = {
+            'accepted': 0,
+            'duplicate': 0,
+        }
+        self._stats_lock = threading.Lock()
+        # 爬虫标识 -> 完成下载的数量
+        self._spider_finished: Counter = Counter()
+        # 爬虫标识 -> 最近一分钟内完成下载的时间
+        self._spider_recent: Dict[str, deque] = {}
+        # 爬虫标识 -> 因为过期被丢弃的请求数量
+        self._spider_expired: Counter = Counter()
         # 响应队列
         self._response_list: List[tuple] = []
+        # 合并中的下载，合并键 -> [正在下载的请求, 等待它的请求...]
+        self._coalesced: Dict[str, List[Request]] = {}
+        # 正在下载的请求 -> 合并键
+        self._coalesce_keys: Dict[Request, str] = {}
+        self._coalesce_lock = threading.Lock()
 
         # 是否暂停了
         self._pause: bool = start_pause
@@ -125,27 +319,91 @@ class Scheduler:
     # add
 
     def add_request(self, request: Request,
-                    from_spider: Spider) -> NoReturn:
+                    from_spider: Spider, depth: int = 0) -> NoReturn:
         """添加一个新的请求到请求队列（不会立刻执行）
 
         Args:
             request: 请求
             from_spider: 产生请求的 Spider
+            depth: 请求没有指定深度时使用的深度，默认 0
+        """
+        self.add_requests([request], from_spider, depth)
+
+    def add_requests(self, requests: Sequence[Request],
+                     from_spider: Spider,
+                     depth: int = 0) -> Tuple[int, int]:
+        """批量添加请求到请求队列（不会立刻执行）。
+        先在锁外计算全部 md5，再只加一次锁去重并加入队列，批次内部的重复请求也会被去掉
+
+        Args:
+            requests: 请求们
+            from_spider: 产生这些请求的 Spider
+            depth: 请求没有指定深度时使用的深度，默认 0
+
+        Returns:
+            (加入队列的数量, 重复的数量)，被爬虫陷阱检测丢弃或推迟的请求不计入加入队列的数量
         """
-        md5: str = request.md5()
+        if not requests:
+            return 0, 0
+        fingerprinter = getattr(from_spider, 'fingerprinter', None)
+        for request in requests:
+            if request.depth is None:
+                request.depth = depth
+        if self.max_depth is not None:
+            count = len(requests)
+            requests = [r for r in requests if r.depth <= self.max_depth]
+            if len(requests) < count:
+                self._add_stats(too_deep=count - len(requests))
+            if not requests:
+                return 0, 0
+        fingerprints = [r.fingerprint(fingerprinter) for r in requests]
+        spider_ttl = getattr(from_spider, 'recrawl_ttl', None)
+        now = time.time()
+        accepted: List[Request] = []
+        repeated: List[Request] = []
+        trapped: List[Request] = []
         # lock
-        self._request_list_lock.acquire()
-        if self.distinct and md5 in self._requests_md5:
+        with self._request_list_lock:
+            for request, fingerprint in zip(requests, fingerprints):
+                ttl = request.recrawl_ttl if request.recrawl_ttl is not None \
+                    else spider_ttl
+                if self.distinct and fingerprint in self.seen_store:
+                    repeated.append(request)
+                    continue
+                request.spider = from_spider
+                request.scheduler = self
+                if self.trap_detector is not None and \
+                        self.trap_detector.check(request) is not None:
+                    trapped.append(request)
+                    # 丢弃的请求不记录指纹，提高限制后续爬时还可以重新加入
+                    if self.trap_detector.action == 'defer':
+                        self.seen_store.add(fingerprint, ttl, now)
+                    continue
+                self.seen_store.add(fingerprint, ttl, now)
+                accepted.append(request)
+            self.frontier.extend(accepted)
+            if trapped and self.trap_detector.action == 'defer':
+                self._deferred_requests.extend(trapped)
+        # 扩容在锁外进行
+        self.seen_store.maintain()
+        self._add_stats(accepted=len(accepted), duplicate=len(repeated))
+        if trapped:
+            action = self.trap_detector.action
+            self._add_stats(**{f'trap_{action}': len(trapped)})
+            logger.info_trap(
+                f'{action.capitalize()} {len(trapped)} '
+                f'suspected trap requests from {from_spider}'
+            )
+        # log
+        if len(repeated) == 1:
             logger.info_repetated(
-                f'Repeated request: {request} {request.show_url}'
+                f'Repeated request: {repeated[0]} {repeated[0].show_url}'
             )
-            self._request_list_lock.release()
-            return
-        request.spider = from_spider
-        request.scheduler = self
-        self._requests_md5.append(md5)
-        self._request_list.append(request)
-        self._request_list_lock.release()
+        elif repeated:
+            logger.info_repetated(
+                f'Repeated {len(repeated)} requests from {from_spider}'
+            )
+        return len(accepted), len(repeated)
 
     def add_item(self, item: Item, from_spider: Spider) -> NoReturn:
         """ 添加一个新的 Item，这会转发给每个Saver
@@ -161,29 +419,142 @@ class Scheduler:
                 saver.add_item(item)
 
     def add_callback_result(
-            self, result_ite, from_spider: Spider) -> NoReturn:
-        """自动解析解析函数返回的结果，会自动迭代、添加请求或转发 Item
+            self, result_ite, from_spider: Spider,
+            responses: List[Response] = None,
+            follow: bool = True,
+            depth: int = 0) -> bool:
+        """自动解析解析函数返回的结果，会自动迭代、添加请求或转发 Item。
+        生成器（迭代器）不会立刻迭代，而是交给请求线程在请求队列有空位时逐步迭代
 
         Args
             result_ite: 结果
             from_spider: 产生结果的爬虫
+            responses: 生成器迭代完之前需要保留的 Response，迭代完后才会释放
+            follow: 是否添加结果中的请求，为 False 时请求会被丢弃，只转发 Item
+            depth: 结果中的请求没有指定深度时使用的深度
+
+        Returns:
+            结果是否是留待之后迭代的生成器
         """
 
         if result_ite is None:
-            return
-        if not isinstance(result_ite, Generator) and \
-                not isinstance(result_ite, list):
+            return False
+        if isinstance(result_ite, Iterator):
+            self._add_generator(GeneratorSource(
+                iterator=result_ite, spider=from_spider,
+                responses=responses or [], follow=follow, depth=depth
+            ))
+            return True
+        if not isinstance(result_ite, list):
             result_ite = [result_ite]
 
+        requests = []
         for result in result_ite:
             if isinstance(result, Request):
-                self.add_request(result, from_spider=from_spider)
-            elif isinstance(result, Item):
-                self.add_item(result, from_spider=from_spider)
+                requests.append(result)
             else:
-                logger.error(
-                    f"Cannot handle {str(type(result))}, "
-                    "Please do not generate it in spider methods.")
+                self._add_result(result, from_spider)
+        if follow:
+            self.add_requests(requests, from_spider, depth)
+        else:
+            self._add_stats(not_followed=len(requests))
+        return False
+
+    def _add_result(self, result, from_spider: Spider) -> NoReturn:
+        """ 添加解析函数返回的一个结果
+        """
+        if isinstance(result, Request):
+            self.add_request(result, from_spider=from_spider)
+        elif isinstance(result, Item):
+            self.add_item(result, from_spider=from_spider)
+        else:
+            logger.error(
+                f"Cannot handle {str(type(result))}, "
+                "Please do not generate it in spider methods.")
+
+    def _add_start_result(self, spider: Spider,
+                          position=None) -> NoReturn:
+        """ 执行爬虫的 start 方法并添加结果
+
+        Args:
+            position: 读取状态时 start 生成器上次迭代到的位置，为空表示从头开始
+        """
+        result = spider.start()
+        if not isinstance(result, Iterator):
+            if position is None:
+                self.add_callback_result(result, spider)
+            return
+        source = GeneratorSource(iterator=result, spider=spider,
+                                 is_start=True)
+        if position is not None:
+            source.restore(position)
+        self._add_generator(source)
+
+    def _add_generator(self, source: 'GeneratorSource') -> NoReturn:
+        self._generators.append(source)
+
+    def _pull_generators(self) -> NoReturn:
+        """ 请求队列有空位时继续迭代生成器，每次最多迭代 frontier_window 次。
+        同一个生成器连续产生的请求会一起批量加入请求队列
+        """
+        pulled = 0
+        while self._generators and pulled < self.frontier_window:
+            room = self.frontier_window - len(self.frontier)
+            if room <= 0:
+                return
+            source = self._generators[-1]
+            requests = []
+            finished = False
+            try:
+                while len(requests) < room and pulled < self.frontier_window:
+                    result = next(source.iterator)
+                    source.position += 1
+                    pulled += 1
+                    if isinstance(result, Request):
+                        requests.append(result)
+                    else:
+                        self._add_result(result, source.spider)
+            except StopIteration:
+                finished = True
+            except Exception as e:
+                logger.ERROR(f"{source.spider} Error: {e}")
+                finished = True
+            self._add_source_requests(source, requests)
+            if finished:
+                self._finish_generator(source)
+
+    def _add_source_requests(self, source: 'GeneratorSource',
+                             requests: List[Request]) -> NoReturn:
+        if source.follow:
+            self.add_requests(requests, source.spider, source.depth)
+        else:
+            self._add_stats(not_followed=len(requests))
+
+    def _finish_generator(self, source: 'GeneratorSource') -> NoReturn:
+        """ 生成器迭代完成，释放它保留的 Response
+        """
+        self._generators.remove(source)
+        for response in source.responses:
+            self._release(response)
+
+    def _drain_generators(self) -> NoReturn:
+        """ 迭代完全部解析函数返回的生成器（start 生成器除外），保存状态时使用
+        """
+        for source in self._generators.copy():
+            if source.is_start:
+                continue
+            requests = []
+            try:
+                for result in source.iterator:
+                    source.position += 1
+                    if isinstance(result, Request):
+                        requests.append(result)
+                    else:
+                        self._add_result(result, source.spider)
+            except Exception as e:
+                logger.ERROR(f"{source.spider} Error: {e}")
+            self._add_source_requests(source, requests)
+            self._finish_generator(source)
 
     def add_spider(self, spider: Spider,
                    call_start: bool = False) -> NoReturn:
@@ -202,7 +573,7 @@ class Scheduler:
             self._other_lock.release()
             raise ExistingIdentityError(identity)
         if call_start:
-            self.add_callback_result(spider.start(), spider)
+            self._add_start_result(spider)
         self._spiders[identity] = spider
         self._other_lock.release()
 
@@ -232,35 +603,446 @@ class Scheduler:
     def _request_loop(self, delta_time: float):
         self._request_wait_time = \
             max(self._request_wait_time - delta_time, 0)
-        for r in self._request_list.copy():
-            # time
-            r.wait = max(r.wait - delta_time, 0)
-            if r.wait > 0:
+        self._pull_generators()
+        self._resume_deferred()
+        self._sweep_expired()
+        self._prefetch_dns()
+        # 使用批量下载器的请求，按下载器分组后一起开始
+        batches: Dict[Callable, List[Request]] = {}
+        # 每个爬虫正在使用的连接数
+        links = None
+        full = set()
+        if isinstance(self.frontier, FairFrontier):
+            links = Counter(r.spider.identity for r in self._link_requests)
+            full = {i for i in links if self._is_spider_full(i, links[i])}
+        # 有暂存请求的主机，每次循环最多探测一次
+        probe_hosts = list(self._parked)
+        while self._request_wait_time <= 0 and \
+                len(self._link_requests) < self.max_link:
+            r = self._next_probe(probe_hosts) if probe_hosts else None
+            if r is None:
+                if links is None:
+                    r = self.frontier.pop()
+                else:
+                    r = self.frontier.pop(full)
+                if r is None:
+                    break
+                if self._park(r):
+                    continue
+            if self.coalesce and self._coalesce_or_lead(r):
+                # 合并到其他请求上的探测请求不会自己下载
+                self._release_probe(r)
                 continue
-            # new link
-            if self._request_wait_time <= 0 and \
-                    len(self._link_requests) < self.max_link:
-                self._request_list.remove(r)
-                self._link_requests.append(r)
+            self._link_requests.append(r)
+            if self.hedge_policy is not None:
+                self.hedge_policy.count_request()
+            if links is not None:
+                identity = r.spider.identity
+                links[identity] += 1
+                if self._is_spider_full(identity, links[identity]):
+                    full.add(identity)
+            if is_batch_downloader(r.downloader):
+                batches.setdefault(r.downloader, []).append(r)
+            else:
                 r.start()
-                # wait
-                self._request_wait_time = self.request_interval
+            # wait
+            self._request_wait_time = self.request_interval
+        for downloader, requests in batches.items():
+            size = downloader.batch_max_size or len(requests)
+            for i in range(0, len(requests), size):
+                Request.start_batch(requests[i:i + size])
+        self._hedge_slow()
+        self._prewarm()
+
+    def _prewarm(self) -> NoReturn:
+        """ 为请求队列最前面的请求预热连接，熔断中的主机不会预热
+        """
+        if self.prewarmer is None:
+            return
+        requests = self.frontier.peek(self.prewarmer.depth)
+        if self.circuit_breaker is not None:
+            requests = [r for r in requests
+                        if not self.circuit_breaker.is_open(get_host(r.url))]
+        self.prewarmer.prewarm(requests, self.engine)
+
+    def get_prewarm_stats(self) -> Dict[str, int]:
+        """ 获取连接预热的统计数据，没有开启连接预热时返回空字典
+        """
+        if self.prewarmer is None:
+            return {}
+        return self.prewarmer.get_stats(self.engine)
+
+    def _hedge_slow(self) -> NoReturn:
+        """ 对下载时间超过主机对冲等待时间的请求开始对冲的下载
+        """
+        if self.hedge_policy is None:
+            return
+        now = time.time()
+        for r in list(self._link_requests):
+            if r.hedged or not r.is_requesting() or \
+                    is_batch_downloader(r.downloader):
+                continue
+            hedge = r.hedge if r.hedge is not None \
+                else getattr(r.spider, 'hedge', False)
+            if not hedge:
+                continue
+            delay = self.hedge_policy.get_delay(get_host(r.url))
+            if delay is None or now - r.start_time < delay:
+                continue
+            if not self.hedge_policy.acquire():
+                break
+            if r.start_hedge():
+                self._add_stats(hedged=1)
+
+    def _park(self, request: Request) -> bool:
+        """ 主机处于熔断状态时暂存这个请求
+
+        Returns:
+            是否暂存了
+        """
+        if self.circuit_breaker is None:
+            return False
+        host = get_host(request.url)
+        if not self.circuit_breaker.is_open(host):
+            return False
+        with self._request_list_lock:
+            self._parked.setdefault(host, []).append(request)
+        self._add_stats(parked=1)
+        return True
+
+    def _next_probe(self, hosts: List[str]) -> Optional[Request]:
+        """ 从可以探测的主机的暂存请求中取出一个作为探测请求
+
+        Args:
+            hosts: 还没有检查过的有暂存请求的主机，检查过的会被移除
+        """
+        while hosts:
+            host = hosts.pop()
+            with self._request_list_lock:
+                parked = self._parked.get(host)
+                if not parked or not self.circuit_breaker.allow(host):
+                    continue
+                request = parked.pop(0)
+                if not parked:
+                    del self._parked[host]
+                self._probes[request] = host
+            logger.info_breaker(f"Probe {host} with {request}")
+            return request
+        return None
+
+    def _breaker_record(self, request: Request, success: bool) -> NoReturn:
+        """ 把下载结果交给熔断器，主机恢复时把暂存的请求放回请求队列
+        """
+        if self.circuit_breaker is None:
+            return
+        with self._request_list_lock:
+            self._probes.pop(request, None)
+        host = get_host(request.url)
+        if not success:
+            if self.circuit_breaker.record_failure(host):
+                logger.warning(f"Circuit breaker opened for {host}")
+            return
+        if not self.circuit_breaker.record_success(host):
+            return
+        with self._request_list_lock:
+            parked = self._parked.pop(host, [])
+        for r in reversed(parked):
+            self.frontier.push(r, front=True)
+        logger.info_breaker(
+            f"Circuit breaker closed for {host}, resume {len(parked)} requests"
+        )
+
+    def _release_probe(self, request: Request) -> NoReturn:
+        """ 探测请求没有得到成功或失败的结果时归还探测名额，让熔断器可以选择下一个探测请求
+        """
+        if self.circuit_breaker is None:
+            return
+        with self._request_list_lock:
+            host = self._probes.pop(request, None)
+        if host is not None:
+            self.circuit_breaker.release_probe(host)
+
+    def get_proxy_info(self) -> List[dict]:
+        """ 获取代理池中全部代理的状态，没有代理池时返回空列表
+        """
+        if self.proxy_pool is None:
+            return []
+        return self.proxy_pool.get_info()
+
+    def get_breaker_info(self) -> List[dict]:
+        """ 获取熔断器中有失败记录的主机的状态和暂存的请求数（parked），没有开启熔断器时返回空列表
+        """
+        if self.circuit_breaker is None:
+            return []
+        result = self.circuit_breaker.get_info()
+        with self._request_list_lock:
+            for i in result:
+                i['parked'] = len(self._parked.get(i['host'], ()))
+        return result
+
+    def _prefetch_dns(self) -> NoReturn:
+        """ 每秒在后台预解析一次请求队列最前面的请求的主机
+        """
+        # 使用代理池时由代理解析主机
+        if self.dns_cache is None or self.dns_prefetch <= 0 or \
+                self.proxy_pool is not None:
+            return
+        now = time.time()
+        if now - self._dns_prefetch_time < 1:
+            return
+        self._dns_prefetch_time = now
+        hosts = set()
+        for r in self.frontier.peek(self.dns_prefetch):
+            # 使用代理的请求由代理解析
+            if 'proxy' in r.kwargs or 'proxies' in r.kwargs:
+                continue
+            try:
+                _, host, port, _ = split_url(r.url)
+            except ValueError:
+                continue
+            hosts.add((host, port))
+        if hosts:
+            self.dns_cache.prefetch(hosts)
+
+    def _sweep_expired(self) -> NoReturn:
+        """ 每隔 expired_sweep_interval 秒清理一次过期的请求
+        """
+        now = time.time()
+        if now - self._expired_sweep_time < self.expired_sweep_interval:
+            return
+        self._expired_sweep_time = now
+        self.frontier.sweep_expired(now)
+        if self._deferred_requests:
+            with self._request_list_lock:
+                expired = [r for r in self._deferred_requests
+                           if r.is_expired(now)]
+                if expired:
+                    self._deferred_requests = [
+                        r for r in self._deferred_requests
+                        if not r.is_expired(now)
+                    ]
+            for r in expired:
+                self._shed_expired(r)
+        if self._parked:
+            expired = []
+            with self._request_list_lock:
+                for host, parked in list(self._parked.items()):
+                    if not any(r.deadline is not None for r in parked):
+                        continue
+                    expired.extend(r for r in parked if r.is_expired(now))
+                    parked[:] = [r for r in parked if not r.is_expired(now)]
+                    if not parked:
+                        del self._parked[host]
+            for r in expired:
+                self._shed_expired(r)
+
+    def _shed_expired(self, request: Request) -> NoReturn:
+        """ 丢弃一个超过截止时间还没有开始下载的请求
+        """
+        logger.info_request(f"{request} Expired, dropped {request.show_url}")
+        self._add_request_log(request, 'Expired')
+        with self._stats_lock:
+            self._stats['expired'] = self._stats.get('expired', 0) + 1
+            if request.spider is not None:
+                self._spider_expired[request.spider.identity] += 1
+
+    def _is_spider_full(self, identity: str, links: int) -> bool:
+        """ 爬虫正在使用的连接数是否达到了它的 max_link
+        """
+        spider = self._spiders.get(identity)
+        limit = getattr(spider, 'max_link', None)
+        if limit is None:
+            return False
+        if isinstance(limit, float) and limit < 1:
+            limit = max(int(self.max_link * limit), 1)
+        return links >= limit
+
+    def _resume_deferred(self) -> NoReturn:
+        """ 请求队列和生成器都空了之后，把被推迟的请求放回请求队列
+        """
+        if not self._deferred_requests or self.frontier or \
+                self._generators:
+            return
+        with self._request_list_lock:
+            count = self.frontier_window
+            self.frontier.extend(self._deferred_requests[:count])
+            del self._deferred_requests[:count]
+
+    def _coalesce_or_lead(self, request: Request) -> bool:
+        """ 如果已经有相同的请求正在下载，则让这个请求等待它
+
+        Returns:
+            是否合并到了正在下载的请求上，为 False 时这个请求需要自己下载
+        """
+        key = self.coalesce(request)
+        with self._coalesce_lock:
+            group = self._coalesced.get(key)
+            if group is not None:
+                group.append(request)
+                logger.info_coalesce(
+                    f'{request} wait for {group[0]} {request.show_url}'
+                )
+                return True
+            self._coalesced[key] = [request]
+            self._coalesce_keys[request] = key
+        return False
+
+    def _pop_coalesced(self, request: Request) -> List[Request]:
+        """ 结束一个请求的合并
+
+        Returns:
+            等待这个请求的其他请求
+        """
+        with self._coalesce_lock:
+            key = self._coalesce_keys.pop(request, None)
+            if key is None:
+                return []
+            return self._coalesced.pop(key)[1:]
 
     def _response_loop(self, delta_time: float):
         for r in self._response_list.copy():
             response = r[0]
             request: Request = r[1]
+            responses = [response]
+            deferred = False
             try:
-                preparse_response = request.preparse(response, request)
-                call = request.callback(preparse_response, request)
+                deferred = self._parse_response(response, request, responses)
             except Exception as e:
                 logger.ERROR(
                     f"{request.spider} - {request} Error: {e}"
                 )
-                return
-            self.add_callback_result(call, request.spider)
             # remove
             self._response_list.remove(r)
+            # 返回生成器时，迭代完才释放
+            if not deferred:
+                for i in responses:
+                    self._release(i)
+
+    def _parse_response(self, response: Response, request: Request,
+                        responses: List[Response]) -> bool:
+        """ 解析一个响应（在 response_looper 线程中调用）
+
+        Args:
+            responses: 解析完需要释放的 Response，预解析得到的新 Response 会加入这里
+
+        Returns:
+            解析函数是否返回了留待之后迭代的生成器
+        """
+        depth = (request.depth or 0) + 1
+        # 与上一次下载的内容相同
+        if self._is_unchanged(response, request):
+            call = request.spider.on_unchanged(response, request)
+            return self.add_callback_result(
+                call, request.spider, responses, depth=depth
+            )
+        # 近似重复
+        follow = True
+        if self.near_duplicate is not None:
+            similar = self.near_duplicate.check(response, request)
+            if similar is not None:
+                self._add_stats(near_duplicate=1)
+                logger.info_request(
+                    f'{request} Near duplicate of {similar} '
+                    f'{request.show_url}'
+                )
+                if self.near_duplicate.action == 'drop':
+                    return False
+                follow = False
+        preparse_response = request.preparse(response, request)
+        if isinstance(preparse_response, Response) and \
+                preparse_response is not response:
+            responses.append(preparse_response)
+        call = request.callback(preparse_response, request)
+        return self.add_callback_result(
+            call, request.spider, responses, follow, depth
+        )
+
+    def _is_unchanged(self, response: Response, request: Request) -> bool:
+        """ 记录响应体摘要，并判断是否与上一次下载的相同
+        """
+        if self.content_digest is None or response.content is None:
+            return False
+        content = response.content
+        if isinstance(content, str):
+            content = content.encode('utf-8')
+        digest = hashlib.md5(content).digest()
+        fingerprint = request.fingerprint()
+        with self._request_list_lock:
+            old = self.content_digest.swap(fingerprint, digest)
+        self.content_digest.maintain()
+        if old != digest:
+            return False
+        self._add_stats(unchanged=1, unchanged_bytes=len(content))
+        logger.info_request(f'{request} Unchanged {request.show_url}')
+        return True
+
+    def _touch_seen(self, request: Request) -> NoReturn:
+        """ 请求下载完成，需要重新爬取的请求从现在开始重新计算过期时间
+        """
+        ttl = request.recrawl_ttl if request.recrawl_ttl is not None \
+            else getattr(request.spider, 'recrawl_ttl', None)
+        if ttl is None:
+            return
+        fingerprint = request.fingerprint()
+        with self._request_list_lock:
+            self.seen_store.touch(fingerprint, ttl)
+
+    def evict_seen(self) -> int:
+        """ 从指纹存储中批量删除已经过期（可以重新爬取）的指纹，释放空间。
+        保存状态时会自动执行，过期的指纹即使没有删除也不会参与去重。
+        先在锁外统计过期的指纹，没有过期的或不够 seen_store.evict_ratio 比例时不删除，
+        MmapSeenStore 的重建也在锁外进行
+
+        Returns:
+            删除的数量
+        """
+        if not self.seen_store.should_evict():
+            return 0
+        if self.seen_store.concurrent_evict:
+            count = self.seen_store.evict_expired()
+        else:
+            with self._request_list_lock:
+                count = self.seen_store.evict_expired()
+        if count:
+            logger.info_scheduler(f"Evict {count} expired fingerprints")
+        return count
+
+    def get_recrawl_due(self) -> int:
+        """ 获取已经过期、可以重新爬取的指纹数量。
+        这需要遍历全部指纹，所以结果会缓存 30 秒
+        """
+        now = time.time()
+        if now - self._recrawl_due[0] > 30:
+            self._recrawl_due = (now, self.seen_store.count_expired(now))
+        return self._recrawl_due[1]
+
+    def _hold(self, response: Response) -> NoReturn:
+        """ 记录进入流水线的 Response 占用的内存
+        """
+        with self._response_bytes_lock:
+            self._response_bytes += response.size
+            self._held_responses.add(response)
+
+    def _release(self, response: Response) -> NoReturn:
+        """ Response 离开流水线，根据 release_response 释放或存档
+        """
+        size = response.size if response in self._held_responses else 0
+        self._held_responses.discard(response)
+        if self.release_response:
+            if self.release_response == 'archive' and \
+                    self.response_archive is not None and \
+                    response.request is not None:
+                self.response_archive.put(response.request.md5(), response)
+            response.release()
+        with self._response_bytes_lock:
+            self._response_bytes -= size
+
+    @property
+    def response_bytes(self) -> int:
+        """ 流水线中（已下载、未解析完）的 Response 正在占用的响应体字节数。
+        合并的请求共享同一份响应体，但会分别计算
+        """
+        return self._response_bytes
 
     def start(self, load_from: str = None,
               load_encoding: str = 'utf-8',
@@ -278,6 +1060,9 @@ class Scheduler:
             logger.WARNING_SCHEDULER("Scheduler is running")
             return
 
+        if self.dns_cache is not None:
+            self.dns_cache.install()
+
         for saver in self._savers.values():
             saver.start()
 
@@ -286,16 +1071,69 @@ class Scheduler:
         if load_from and os.path.exists(load_from):
             self.load(load_from, load_encoding)
             if only_load:
-                self.request_looper.start()
-                self.response_looper.start()
+                self._start_loopers()
                 return
 
         for spider in self._spiders.values():
-            call = spider.start()
-            self.add_callback_result(call, from_spider=spider)
+            self._add_start_result(spider)
+        self._start_loopers()
+
+    def _start_loopers(self) -> NoReturn:
+        with self._other_lock:
+            self._running_loopers = 2
         self.request_looper.start()
         self.response_looper.start()
 
+    def close(self) -> NoReturn:
+        """ 关闭调度器线程和下载引擎，正在进行的下载不会被取消，但是结果不会再被解析。
+        调度器线程都结束后会写入并关闭 seen_store、content_digest 和 response_archive
+        """
+        self.request_looper.close()
+        self.response_looper.close()
+        self.engine.close()
+        with self._other_lock:
+            running = self._running_loopers
+        if not running:
+            self._close_stores()
+
+    def _request_loop_closed(self) -> NoReturn:
+        """ 请求线程结束时卸载 DNS 缓存并把存储写入磁盘
+        """
+        if self.dns_cache is not None:
+            self.dns_cache.uninstall()
+        self._flush_stores()
+        self._looper_closed()
+
+    def _looper_closed(self) -> NoReturn:
+        """ 调度器线程结束时调用，最后一个结束的线程关闭存储
+        """
+        with self._other_lock:
+            self._running_loopers -= 1
+            running = self._running_loopers
+        if not running:
+            self._close_stores()
+
+    def _flush_stores(self) -> NoReturn:
+        """ 把 seen_store、content_digest 和 response_archive 写入磁盘，
+        MmapHashTable 写入后会清除 dirty 标志，下次打开时不需要重新统计数量
+        """
+        for store in (self.seen_store, self.content_digest,
+                      self.response_archive):
+            if store is not None:
+                store.flush()
+
+    def _close_stores(self) -> NoReturn:
+        """ 写入并关闭 seen_store、content_digest 和 response_archive，只执行一次
+        """
+        with self._other_lock:
+            if self._stores_closed:
+                return
+            self._stores_closed = True
+        for store in (self.seen_store, self.content_digest,
+                      self.response_archive):
+            if store is not None:
+                store.close()
+
     # downloader
 
     def downloader_finish(self, response: Response, request: Request) -> NoReturn:
@@ -308,9 +1146,29 @@ class Scheduler:
             )
             return
         # append response
+        self._touch_seen(request)
+        self._breaker_record(request, True)
+        if self.hedge_policy is not None:
+            # 对冲的下载胜出时 total_time 包括了对冲等待时间，只记录对冲的下载自己的耗时
+            seconds = request.total_time
+            if request.hedged == 2:
+                self._add_stats(hedge_won=1)
+                if response.request_time is not None:
+                    seconds = response.request_time
+            self.hedge_policy.record(get_host(request.url), seconds)
+        self._count_spider_finished(request)
+        self._hold(response)
         self._response_list.append((response, request))
         # log
         self._add_request_log(request, str(response.status_code))
+        # coalesced
+        for r in self._pop_coalesced(request):
+            r.start_time = request.start_time
+            r.total_time = request.total_time
+            r.response = response.with_request(r)
+            self._hold(r.response)
+            self._response_list.append((r.response, r))
+            self._add_request_log(r, f'{response.status_code} (Coalesced)')
         # remove
         self._link_requests.remove(request)
 
@@ -325,34 +1183,42 @@ class Scheduler:
 
         # log
         self._add_request_log(request, 'Abandon')
+        self._breaker_record(request, False)
+        self._requeue_coalesced(request)
         self._link_requests.remove(request)
 
+    def _requeue_coalesced(self, request: Request) -> NoReturn:
+        """ 请求没有成功下载时，让等待它的请求回到请求队列最前面，它们会重新自己下载
+        """
+        for r in reversed(self._pop_coalesced(request)):
+            self.frontier.push(r, front=True)
+
     def downloader_retry(self, request: Request,
                          jump_in_line: bool = False,
-                         wait: float = 0) -> NoReturn:
+                         wait: float = 0,
+                         failure: bool = True) -> NoReturn:
         """重试一个请求，如果有等待，则会让调用的线程暂停
+
+        Args:
+            failure: 是否算作主机的一次失败（熔断器会统计）
         """
         if request not in self._link_requests:
             logger.error(
                 f"The retry download is not in link_request list. {request}"
             )
             return
-        if request in self._request_list:
-            logger.error(
-                f"The retry download have not started to request. {request}"
-            )
-            return
-
         # log
         self._add_request_log(request, 'To Retry')
+        if failure:
+            self._breaker_record(request, False)
+        else:
+            self._release_probe(request)
+        self._requeue_coalesced(request)
         # remove and wait
         self._link_requests.remove(request)
         request.wait = wait
         # insert or append
-        if jump_in_line:
-            self._request_list.insert(0, request)
-        else:
-            self._request_list.append(request)
+        self.frontier.push(request, front=jump_in_line)
 
     # tags
 
@@ -413,6 +1279,12 @@ class Scheduler:
         """
         return len(self._response_list) > 0
 
+    @property
+    def is_generating(self) -> bool:
+        """ 是否有还没有迭代完的生成器
+        """
+        return len(self._generators) > 0
+
     @property
     def is_saving(self) -> bool:
         """ 是否正处于保存中
@@ -463,6 +1335,68 @@ class Scheduler:
 
     # get info
 
+    def get_trap_suspects(self) -> List[dict]:
+        """ 获取可能是爬虫陷阱的 url 模式，没有开启爬虫陷阱检测时返回空列表
+        """
+        if self.trap_detector is None:
+            return []
+        with self._request_list_lock:
+            return self.trap_detector.get_suspects()
+
+    def get_stats_copy(self) -> Dict[str, Any]:
+        """ 获取一份统计数据的拷贝，包括加入队列的请求数（accepted）、重复的请求数（duplicate）等
+        """
+        with self._stats_lock:
+            return self._stats.copy()
+
+    def _count_spider_finished(self, request: Request) -> NoReturn:
+        """ 记录爬虫完成的下载，用来统计吞吐量
+        """
+        if request.spider is None:
+            return
+        identity = request.spider.identity
+        now = time.time()
+        with self._stats_lock:
+            self._spider_finished[identity] += 1
+            recent = self._spider_recent.setdefault(identity, deque())
+            recent.append(now)
+            while recent[0] < now - 60:
+                recent.popleft()
+
+    def get_spider_stats(self) -> List[dict]:
+        """ 获取每个爬虫的调度信息：权重（weight）、连接数限制（max_link）、
+        等待中的请求数（queued）、正在下载的请求数（links）、完成下载的数量（finished）、
+        最近一分钟完成下载的数量（per_minute）、因为过期被丢弃的请求数量（expired）
+        """
+        queued = {}
+        if isinstance(self.frontier, FairFrontier):
+            queued = self.frontier.get_queue_sizes()
+        links = Counter(r.spider.identity for r in list(self._link_requests)
+                        if r.spider is not None)
+        now = time.time()
+        result = []
+        with self._stats_lock:
+            for identity, spider in list(self._spiders.items()):
+                recent = self._spider_recent.get(identity, ())
+                result.append({
+                    'identity': identity,
+                    'weight': getattr(spider, 'weight', 1),
+                    'max_link': getattr(spider, 'max_link', None),
+                    'queued': queued.get(identity, 0),
+                    'links': links[identity],
+                    'finished': self._spider_finished[identity],
+                    'per_minute': sum(1 for t in recent if t >= now - 60),
+                    'expired': self._spider_expired[identity],
+                })
+        return result
+
+    def _add_stats(self, **counts: int) -> NoReturn:
+        """ 增加统计数据
+        """
+        with self._stats_lock:
+            for k, v in counts.items():
+                self._stats[k] = self._stats.get(k, 0) + v
+
     def get_pending_request_info(self) -> List[dict]:
         """ 获取请求等待队列的信息
 
@@ -470,17 +1404,18 @@ class Scheduler:
             表示信息的字典，不是请求实例！
         """
         result: List[dict] = []
-        for r in self._request_list:
+        for r in self.frontier:
             result.append({
                 'method': r.method,
                 'url': r.url,
-                'data': r.data.copy(),
-                'headers': r.headers.copy(),
-                'tags': r.tags.copy(),
+                'data': r.get_data_copy(),
+                'headers': r.get_headers_copy(),
+                'tags': r.get_tags_copy(),
                 'spider': r.spider.identity,
                 'downloader': r.downloader.__name__,
                 'downloader_filter': r.downloader_filter.__name__,
-                'wait': r.wait
+                'wait': r.wait,
+                'depth': r.depth
             })
 
         # result.sort(key=lambda x: x['wait'], reverse=False)
@@ -497,9 +1432,9 @@ class Scheduler:
             result.append({
                 'method': r.method,
                 'url': r.url,
-                'data': r.data.copy(),
-                'headers': r.headers.copy(),
-                'tags': r.tags.copy(),
+                'data': r.get_data_copy(),
+                'headers': r.get_headers_copy(),
+                'tags': r.get_tags_copy(),
                 'spider': r.spider.identity,
                 'downloader': r.downloader.__name__,
                 'downloader_filter': r.downloader_filter.__name__,
@@ -565,8 +1500,11 @@ class Scheduler:
             stops.reverse()
             for s in stops:
                 self._link_requests.remove(s)
-                self._request_list.insert(0, s)
+                for r in reversed([s] + self._pop_coalesced(s)):
+                    self.frontier.push(r, front=True)
             self._request_list_lock.release()
+            for s in stops:
+                self._release_probe(s)
             logger.info_scheduler(
                 "Fast save canceled the connection "
                 f"in {len(stops)} requests"
@@ -631,17 +1569,39 @@ class Scheduler:
                         f"The saver is missing: {saver_identity}"
                     )
 
+        # load fingerprinters
+        fingerprints_file = os.path.join(dir_path, 'fingerprints.json')
+        if os.path.exists(fingerprints_file):
+            with open(fingerprints_file, 'r', encoding=encoding) as f:
+                for identity, value in json.loads(f.read()).items():
+                    if identity not in self._spiders:
+                        continue
+                    spider = self._spiders[identity]
+                    fingerprinter = Fingerprinter.from_dict(value)
+                    if fingerprinter != spider.fingerprinter:
+                        logger.warning(
+                            f"{spider} fingerprinter is different from "
+                            f"the saved one, the saved one will be used"
+                        )
+                        spider.fingerprinter = fingerprinter
+
         # load requests
+        # 保存的请求（包括推迟和暂存的）在保存之前已经去重并通过了爬虫陷阱检测，
+        # 直接放回请求队列，否则持久化的指纹存储会把它们全部当作重复请求丢弃
         with open(os.path.join(dir_path, 'request_list.json'),
                   'r', encoding=encoding) as f:
             request_list = json.loads(f.read())
-            count = 0
+            restored = []
             for request_dict in request_list:
                 r = Request.from_dict(request_dict, self)
                 if r.spider is None:
                     logger.warning("Request parse Spider fil")
-                self.add_request(r, r.spider)
-                count += 1
+                    continue
+                r.scheduler = self
+                restored.append(r)
+            with self._request_list_lock:
+                self.frontier.extend(restored)
+            self._add_stats(accepted=len(restored))
 
         # load tags
         with open(os.path.join(dir_path, 'tags.json'), 'r',
@@ -655,16 +1615,62 @@ class Scheduler:
                 self[k] = v
 
         # load MD5 list
-        with open(os.path.join(dir_path, 'md5.txt'),
-                  'r', encoding=encoding) as f:
-            self._requests_md5 = f.read().split('\n')
+        md5_file = os.path.join(dir_path, 'md5.txt')
+        if not self.seen_store.persistent and os.path.exists(md5_file):
+            with open(md5_file, 'r', encoding=encoding) as f:
+                self.seen_store.load(
+                    md5 for md5 in f.read().split('\n') if md5
+                )
+
+        # load content digests
+        digests_file = os.path.join(dir_path, 'digests.txt')
+        if self.content_digest is not None and \
+                not self.content_digest.persistent and \
+                os.path.exists(digests_file):
+            with open(digests_file, 'r', encoding=encoding) as f:
+                self.content_digest.load(f.read().split('\n'))
+
+        # load circuit breakers
+        breakers_file = os.path.join(dir_path, 'breakers.json')
+        if self.circuit_breaker is not None and \
+                os.path.exists(breakers_file):
+            with open(breakers_file, 'r', encoding=encoding) as f:
+                self.circuit_breaker.load_dict(json.loads(f.read()))
+
+        # load start generators
+        generators_file = os.path.join(dir_path, 'generators.json')
+        if os.path.exists(generators_file):
+            with open(generators_file, 'r', encoding=encoding) as f:
+                for identity, position in json.loads(f.read()).items():
+                    if identity not in self._spiders:
+                        continue
+                    self._add_start_result(
+                        self._spiders[identity], position
+                    )
         logger.info_scheduler(f"Load '{dir_path}' finish")
 
     def get_save_info(self) -> 'SchedulerSaveInfo':
+        # 解析函数返回的生成器无法保存，先迭代完
+        self._drain_generators()
         save_info = SchedulerSaveInfo(
+            fingerprinters={
+                identity: spider.fingerprinter.to_dict()
+                for identity, spider in self._spiders.items()
+            },
+            generator_positions={
+                g.spider.identity: g.get_position()
+                for g in self._generators if g.is_start
+            },
             tags=self._tags.copy(),
-            request_list=self._request_list.copy(),
-            requests_md5=self._requests_md5.copy(),
+            request_list=self.frontier.to_list() + self._deferred_requests +
+            [r for parked in self._parked.values() for r in parked],
+            breakers=None if self.circuit_breaker is None
+            else self.circuit_breaker.to_dict(),
+            requests_md5=None if self.seen_store.persistent
+            else self.seen_store.dump(),
+            content_digests=None if self.content_digest is None or
+            self.content_digest.persistent
+            else self.content_digest.dump(),
             saver_identity_list=list(self._savers.keys()),
             spider_identity_list=list(self._spiders.keys())
         )
@@ -672,10 +1678,61 @@ class Scheduler:
         pass
 
 
+def default_coalesce_key(request: Request) -> str:
+    """ 默认的合并键，相同 md5 的请求会被合并
+    """
+    return request.md5()
+
+
+@dataclass
+class GeneratorSource:
+    """ 一个还没有迭代完的生成器
+    """
+    iterator: Iterator
+    spider: Spider
+    # 是否是 Spider 的 start 方法返回的
+    is_start: bool = False
+    # 已经迭代的次数
+    position: int = 0
+    # 迭代完之后才能释放的 Response
+    responses: List[Response] = field(default_factory=list)
+    # 是否添加生成器产生的请求
+    follow: bool = True
+    # 生成器产生的请求的深度
+    depth: int = 0
+
+    def get_position(self):
+        """ 获取可以保存的位置。
+        如果迭代器有 position 属性和 restore 方法，使用迭代器自己的位置，否则使用迭代次数
+        """
+        if hasattr(self.iterator, 'restore'):
+            return self.iterator.position
+        return self.position
+
+    def restore(self, position) -> NoReturn:
+        """ 恢复到保存的位置。
+        迭代器没有 restore 方法时，会重新迭代并丢弃前 position 个结果，
+        其中的请求本来就会被去重
+        """
+        if hasattr(self.iterator, 'restore'):
+            self.iterator.restore(position)
+            return
+        for _ in itertools.islice(self.iterator, position):
+            pass
+        self.position = position
+
+
 @dataclass
 class SchedulerSaveInfo:
     tags: Dict[str, Any]
-    requests_md5: List[str]
+    generator_positions: Dict[str, Any]
+    fingerprinters: Dict[str, Dict[str, Any]]
+    # 指纹存储自己保存在磁盘上时为 None
+    requests_md5: Optional[List[str]]
+    # 没有开启或摘要存储自己保存在磁盘上时为 None
+    content_digests: Optional[List[str]]
+    # 没有开启熔断器时为 None
+    breakers: Optional[Dict[str, Dict[str, Any]]]
     request_list: List[Request]
     spider_identity_list: List[str]
     saver_identity_list: List[str]
@@ -720,15 +1777,41 @@ class SchedulerSaver(threading.Thread):
             time.sleep(0.1)
         try:
             # SAVE
+            self.scheduler.evict_seen()
             info = self.scheduler.get_save_info()
-            self._save_to_file(
-                'md5.txt', '\n'.join(info.requests_md5)
-            )
+            if info.requests_md5 is None:
+                self.scheduler.seen_store.flush()
+            else:
+                self._save_to_file(
+                    'md5.txt', '\n'.join(info.requests_md5)
+                )
+            if info.content_digests is not None:
+                self._save_to_file(
+                    'digests.txt', '\n'.join(info.content_digests)
+                )
+            elif self.scheduler.content_digest is not None:
+                self.scheduler.content_digest.flush()
+            if info.breakers is not None:
+                self._save_to_file(
+                    'breakers.json', json.dumps(
+                        info.breakers, ensure_ascii=False
+                    )
+                )
             self._save_to_file(
                 'tags.json', json.dumps(
                     info.tags, ensure_ascii=False
                 )
             )
+            self._save_to_file(
+                'generators.json', json.dumps(
+                    info.generator_positions, ensure_ascii=False
+                )
+            )
+            self._save_to_file(
+                'fingerprints.json', json.dumps(
+                    info.fingerprinters, ensure_ascii=False
+                )
+            )
             self._save_to_file(
                 'spider_list.json', json.dumps(
                     info.spider_identity_list, ensure_ascii=False
@@ -746,6 +1829,8 @@ class SchedulerSaver(threading.Thread):
                 'request_list.json',
                 json.dumps(result, ensure_ascii=False)
             )
+            if self.scheduler.response_archive is not None:
+                self.scheduler.response_archive.flush()
             logger.info_scheduler("Scheduler save finish")
         except Exception as e:
             self.error_callback(e)
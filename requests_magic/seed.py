@@ -0,0 +1,163 @@
+"""种子源，从大文件中流式读取起始 url
+"""
+import csv
+import json
+import os
+from typing import Callable, Dict, Any, NoReturn, Optional
+from requests_magic.request import Request
+from requests_magic.mmlog import logger
+
+
+class SeedSource:
+    """ 种子源，逐行读取种子文件并生成 Request，不会把整个文件读入内存。
+    在 Spider.start 中直接 return 它，调度器会在请求队列有空位时逐步迭代，
+    保存状态时会记录读取到的字节位置，读取状态时从这个位置继续。
+
+    支持三种格式：
+        text: 每行一个 url，忽略空行和 # 开头的行
+        csv: 第一行是表头，url_field 列是 url，其他列作为 tags
+        jsonl: 每行一个 json 对象，url_field 键是 url，其他键作为 tags
+
+    Warnings:
+        csv 的字段中不能包含换行
+    """
+
+    formats = ('text', 'csv', 'jsonl')
+
+    def __init__(self, path: str,
+                 callback: Callable,
+                 file_format: str = None,
+                 url_field: str = 'url',
+                 encoding: str = 'utf-8',
+                 make_request: Callable[[str, Dict[str, Any]], Request] = None,
+                 **request_kwargs):
+        """ 种子源
+
+        Args:
+            path: 种子文件路径
+            callback: 生成的 Request 的解析函数
+            file_format: 文件格式 text、csv、jsonl，默认根据扩展名判断，无法判断时为 text
+            url_field: csv 和 jsonl 中 url 所在的列名或键名，默认 url
+            encoding: 文件编码，默认 utf-8
+            make_request: 自定义生成 Request 的函数 (url, fields) -> Request，
+                fields 是这一行中除 url 外的其他字段，返回 None 表示跳过这一行
+            **request_kwargs: 其他交给 Request 的参数，例如 method、headers、downloader
+        """
+        if file_format is None:
+            file_format = self.guess_format(path)
+        if file_format not in self.formats:
+            raise ValueError(f"Unknown seed file format: {file_format}")
+        self.path = path
+        self.callback = callback
+        self.file_format = file_format
+        self.url_field = url_field
+        self.encoding = encoding
+        self.make_request = make_request
+        self.request_kwargs = request_kwargs
+
+        # 下一行开始的字节位置
+        self._position: int = 0
+        self._file = None
+        self._header: Optional[list] = None
+
+    @staticmethod
+    def guess_format(path: str) -> str:
+        """ 根据扩展名判断文件格式
+        """
+        ext = os.path.splitext(path)[1].lower()
+        if ext == '.csv':
+            return 'csv'
+        if ext in ('.jsonl', '.ndjson'):
+            return 'jsonl'
+        return 'text'
+
+    @property
+    def position(self) -> int:
+        """ 已经读取到的字节位置，用于保存状态
+        """
+        return self._position
+
+    def restore(self, position: int) -> NoReturn:
+        """ 从某个字节位置继续读取，用于读取状态
+        """
+        self._position = position
+        if self._file is not None:
+            self._file.seek(position)
+
+    def _open(self) -> NoReturn:
+        self._file = open(self.path, 'rb')
+        if self.file_format == 'csv':
+            # 表头总是从文件开头读取
+            self._header = next(csv.reader(
+                [self._file.readline().decode(self.encoding)]
+            ), [])
+            if self._position < self._file.tell():
+                self._position = self._file.tell()
+        self._file.seek(self._position)
+
+    def close(self) -> NoReturn:
+        """ 关闭文件，迭代完后会自动关闭
+        """
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __iter__(self) -> 'SeedSource':
+        return self
+
+    def __next__(self) -> Request:
+        if self._file is None:
+            self._open()
+        while True:
+            line = self._file.readline()
+            if not line:
+                self.close()
+                raise StopIteration
+            self._position += len(line)
+            try:
+                request = self._parse_line(
+                    line.decode(self.encoding).strip()
+                )
+            except ValueError as e:
+                logger.error(f"Bad seed line in '{self.path}': {e}")
+                continue
+            if request is not None:
+                return request
+
+    def _parse_line(self, line: str) -> Optional[Request]:
+        """ 把一行转换为 Request，跳过的行返回 None
+        """
+        if not line:
+            return None
+        if self.file_format == 'text':
+            if line.startswith('#'):
+                return None
+            url, fields = line, {}
+        else:
+            if self.file_format == 'csv':
+                row = next(csv.reader([line]))
+                fields = dict(zip(self._header, row))
+            else:
+                fields = json.loads(line)
+                if not isinstance(fields, dict):
+                    raise ValueError(f"not a json object: {line[:50]}")
+            if self.url_field not in fields:
+                raise ValueError(
+                    f"missing '{self.url_field}': {line[:50]}"
+                )
+            url = fields.pop(self.url_field)
+        if self.make_request is not None:
+            return self.make_request(url, fields)
+        return self._create_request(url, fields)
+
+    def _create_request(self, url: str,
+                        fields: Dict[str, Any]) -> Request:
+        kwargs = self.request_kwargs
+        if fields:
+            tags = kwargs.get('tags')
+            tags = {**tags, **fields} if tags else fields
+            kwargs = {**kwargs, 'tags': tags}
+        return Request(url, self.callback, **kwargs)
+
+    def __del__(self):
+        self.close()
@@ -0,0 +1,726 @@
+"""请求去重使用的指纹存储
+"""
+import mmap
+import os
+import struct
+import threading
+import time
+from typing import Optional, Iterator, Tuple, NoReturn, Iterable, List, \
+    Dict, Callable
+from requests_magic.mmlog import logger
+
+
+class MmapHashTable:
+    """ 保存在文件中、通过内存映射访问的开放寻址（线性探测）哈希表，键和值的长度固定。
+    打开时不需要读取整个文件，查询和插入只访问用到的几页。
+
+    文件开头是表头：魔数、版本、键长度、值长度、dirty 标志、容量、数量，
+    随后是 容量 个 (键, 值) 槽位，键全为 0 表示空槽位。
+
+    崩溃安全：
+        写入前会设置 dirty 标志，flush 后清除。打开时如果 dirty 标志还在，会重新统计数量；
+        扩容写入临时文件，完成后用 os.replace 替换，中途崩溃不会损坏原文件
+
+    重建（扩容、批量删除）时只在复制每一块槽位时加锁，期间可以继续查询和插入，
+    期间插入的键最后在锁内补到新表中
+
+    Warnings:
+        键应该是均匀分布的摘要（例如 md5），全为 0 的键会被改写最后一个字节
+    """
+
+    MAGIC = b'MMHT'
+    VERSION = 1
+    _head = struct.Struct('<4sHHHB7xQQ')
+
+    # 延迟扩容时，装载率超过这个值仍然会在插入时立刻扩容
+    hard_load: float = 0.9
+
+    def __init__(self, path: str, key_size: int = 16, value_size: int = 0,
+                 capacity: int = 1 << 16, max_load: float = 0.7,
+                 defer_grow: bool = False):
+        """ 打开或创建哈希表文件
+
+        Args:
+            path: 文件路径
+            key_size: 键的字节数，默认 16（md5）
+            value_size: 值的字节数，默认 0（只当作集合使用）
+            capacity: 新建时的槽位数量，会向上取整为 2 的幂，默认 65536
+            max_load: 超过这个装载率时容量翻倍，默认 0.7
+            defer_grow: 是否延迟扩容，为 True 时插入只标记需要扩容，
+                由调用者在合适的时候（例如不持有其他锁时）调用 grow_if_needed，默认 False
+        """
+        self.path = path
+        self.max_load = max_load
+        self.defer_grow = defer_grow
+        self._lock = threading.RLock()
+        # 重建完成的通知，重建期间插入的键记录在 _pending 中
+        self._rebuilt = threading.Condition(self._lock)
+        self._pending: Optional[Dict[bytes, bytes]] = None
+        self._empty_key = bytes(key_size)
+
+        tmp = path + '.tmp'
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._open()
+            if (self.key_size, self.value_size) != (key_size, value_size):
+                self.close()
+                raise ValueError(
+                    f"'{path}' has key_size={self.key_size} "
+                    f"value_size={self.value_size}"
+                )
+        else:
+            folder = os.path.dirname(os.path.abspath(path))
+            if not os.path.exists(folder):
+                os.makedirs(folder)
+            size = 1
+            while size < capacity:
+                size <<= 1
+            self._create(path, key_size, value_size, size)
+            self._open()
+
+    @classmethod
+    def _create(cls, path: str, key_size: int, value_size: int,
+                capacity: int) -> NoReturn:
+        """ 创建一个空的哈希表文件
+        """
+        with open(path, 'wb') as f:
+            f.write(cls._head.pack(cls.MAGIC, cls.VERSION, key_size,
+                                   value_size, 0, capacity, 0))
+            f.truncate(cls._head.size + capacity * (key_size + value_size))
+
+    def _open(self) -> NoReturn:
+        self._file = open(self.path, 'r+b')
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        magic, version, self.key_size, self.value_size, dirty, \
+            self.capacity, self._count = self._head.unpack_from(self._map, 0)
+        if magic != self.MAGIC or version != self.VERSION:
+            self.close()
+            raise ValueError(f"'{self.path}' is not a hash table file")
+        self._slot_size = self.key_size + self.value_size
+        self._mask = self.capacity - 1
+        self._dirty = bool(dirty)
+        if self._dirty:
+            # 上次没有正常关闭，数量可能不准确
+            self._count = sum(1 for _ in self._slots())
+            self._write_head()
+
+    def _write_head(self) -> NoReturn:
+        self._head.pack_into(
+            self._map, 0, self.MAGIC, self.VERSION, self.key_size,
+            self.value_size, int(self._dirty), self.capacity, self._count
+        )
+
+    def _key(self, key: bytes) -> bytes:
+        if len(key) != self.key_size:
+            raise ValueError(f"key must be {self.key_size} bytes")
+        if key == self._empty_key:
+            return key[:-1] + b'\x01'
+        return key
+
+    def _find(self, key: bytes) -> Tuple[int, bool]:
+        """ 查找键所在的槽位
+
+        Returns:
+            (槽位偏移, 是否找到)，没找到时偏移是可以插入的空槽位
+        """
+        m = self._map
+        ks = self.key_size
+        index = int.from_bytes(key[:8], 'little') & self._mask
+        while True:
+            offset = self._head.size + index * self._slot_size
+            slot = m[offset:offset + ks]
+            if slot == key:
+                return offset, True
+            if slot == self._empty_key:
+                return offset, False
+            index = (index + 1) & self._mask
+
+    def _slots(self) -> Iterator[Tuple[int, bytes]]:
+        """ 遍历全部非空槽位
+
+        Returns:
+            (槽位偏移, 键)
+        """
+        m = self._map
+        ks = self.key_size
+        for i in range(self.capacity):
+            offset = self._head.size + i * self._slot_size
+            slot = m[offset:offset + ks]
+            if slot != self._empty_key:
+                yield offset, slot
+
+    def __len__(self) -> int:
+        return self._count
+
+    def scan(self, chunk_size: int = 4096) -> Iterator[Tuple[bytes, bytes]]:
+        """ 遍历全部 (键, 值)，每次只在读取 chunk_size 个槽位时加锁，遍历期间可以继续插入。
+        遍历期间发生扩容时结果可能有遗漏或重复，只适合用于统计
+
+        Args:
+            chunk_size: 每次加锁读取的槽位数量，默认 4096
+        """
+        ks = self.key_size
+        i = 0
+        while True:
+            with self._lock:
+                if self._map is None or i >= self.capacity:
+                    return
+                end = min(i + chunk_size, self.capacity)
+                batch = []
+                for j in range(i, end):
+                    offset = self._head.size + j * self._slot_size
+                    slot = self._map[offset:offset + self._slot_size]
+                    if slot[:ks] != self._empty_key:
+                        batch.append((slot[:ks], slot[ks:]))
+            yield from batch
+            i = end
+
+    def __contains__(self, key: bytes) -> bool:
+        with self._lock:
+            return self._find(self._key(key))[1]
+
+    def get(self, key: bytes) -> Optional[bytes]:
+        """ 获取键对应的值，不存在时返回 None
+        """
+        with self._lock:
+            offset, found = self._find(self._key(key))
+            if not found:
+                return None
+            start = offset + self.key_size
+            return self._map[start:start + self.value_size]
+
+    def put(self, key: bytes, value: bytes = b'') -> bool:
+        """ 插入或更新一个键
+
+        Returns:
+            是否是新插入的键
+        """
+        key = self._key(key)
+        if len(value) != self.value_size:
+            raise ValueError(f"value must be {self.value_size} bytes")
+        with self._lock:
+            # 另一个线程正在重建并且已经太满，等待重建完成
+            while self._pending is not None and \
+                    self._count >= self.capacity * self.hard_load:
+                self._rebuilt.wait()
+            offset, found = self._find(key)
+            if not self._dirty:
+                self._dirty = True
+                self._write_head()
+            if self._pending is not None:
+                self._pending[key] = value
+            start = offset + self.key_size
+            self._map[start:start + self.value_size] = value
+            if found:
+                return False
+            self._map[offset:start] = key
+            self._count += 1
+            self._write_head()
+            if self._pending is None and (
+                    self._count > self.capacity * self.hard_load or
+                    not self.defer_grow and self.need_grow):
+                self._grow()
+            return True
+
+    def items(self) -> Iterator[Tuple[bytes, bytes]]:
+        """ 遍历全部 (键, 值)
+        """
+        with self._lock:
+            for offset, key in self._slots():
+                start = offset + self.key_size
+                yield key, self._map[start:start + self.value_size]
+
+    @property
+    def need_grow(self) -> bool:
+        """ 装载率是否超过了 max_load
+        """
+        return self._count > self.capacity * self.max_load
+
+    def grow_if_needed(self) -> bool:
+        """ 装载率超过 max_load 时扩容，延迟扩容时由调用者调用
+
+        Returns:
+            是否扩容了
+        """
+        if not self.need_grow:
+            return False
+        self._grow()
+        return True
+
+    def _grow(self) -> NoReturn:
+        """ 容量翻倍
+        """
+        self.rebuild(capacity=self.capacity * 2)
+
+    def rebuild(self, keep: Callable[[bytes, bytes], bool] = None,
+                capacity: int = None) -> int:
+        """ 在临时文件中重建哈希表后替换原文件，可以同时批量删除键。
+        线性探测的哈希表不能直接删除单个键，批量删除都通过重建完成。
+        已经有线程在重建时直接返回 0
+
+        Args:
+            keep: (键, 值) -> 是否保留，默认全部保留
+            capacity: 新的容量，默认不变
+
+        Returns:
+            删除的键的数量
+        """
+        with self._lock:
+            if self._map is None or self._pending is not None:
+                return 0
+            if capacity is None:
+                capacity = self.capacity
+            self._pending = {}
+        try:
+            tmp = self.path + '.tmp'
+            self._create(tmp, self.key_size, self.value_size, capacity)
+            new = MmapHashTable.__new__(MmapHashTable)
+            new.path = tmp
+            new._lock = threading.RLock()
+            new._empty_key = self._empty_key
+            new._open()
+            count = 0
+
+            def copy(key: bytes, value: bytes) -> int:
+                if keep is not None and not keep(key, value):
+                    return 0
+                offset, found = new._find(key)
+                new._map[offset:offset + self._slot_size] = key + value
+                return 0 if found else 1
+
+            # 分块加锁复制，重建期间不会有其他的重建，scan 不会遗漏
+            for key, value in self.scan():
+                count += copy(key, value)
+            with self._lock:
+                # 复制期间插入或更新的键
+                for key, value in self._pending.items():
+                    count += copy(key, value)
+                removed = self._count - count
+                new._count = count
+                new._write_head()
+                new.close()
+                self._close_map()
+                os.replace(tmp, self.path)
+                self._open()
+                return removed
+        finally:
+            with self._lock:
+                self._pending = None
+                self._rebuilt.notify_all()
+
+    def flush(self) -> NoReturn:
+        """ 写入磁盘并清除 dirty 标志
+        """
+        with self._lock:
+            if self._map is None:
+                return
+            self._map.flush()
+            if self._dirty:
+                self._dirty = False
+                self._write_head()
+                self._map.flush()
+
+    def _close_map(self) -> NoReturn:
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self._file.close()
+
+    def close(self) -> NoReturn:
+        """ 写入磁盘并关闭文件
+        """
+        with self._lock:
+            if self._map is None:
+                return
+            self.flush()
+            self._close_map()
+
+
+class SeenStore:
+    """ 记录添加过的请求指纹，用于请求去重。
+    每个指纹还记录了最后下载时间和过期时间（秒级时间戳），过期的指纹不再参与去重，
+    过期时间为 0 表示永不过期
+    """
+
+    # 是否自己保存在磁盘上，不需要随调度器状态保存
+    persistent: bool = False
+    # 过期的指纹至少占全部指纹的这个比例时，should_evict 才返回 True
+    evict_ratio: float = 0
+    # evict_expired 是否可以和添加指纹同时进行，不需要调度器加锁
+    concurrent_evict: bool = False
+    # 是否有设置了过期时间的指纹，None 表示不知道（需要遍历一次）
+    _has_ttl: Optional[bool] = None
+
+    def _get(self, fingerprint: bytes) -> Optional[Tuple[int, int]]:
+        """ 获取 (最后下载时间, 过期时间)，不存在时返回 None
+        """
+        raise NotImplementedError()
+
+    def _put(self, fingerprint: bytes, fetched_at: int,
+             expires_at: int) -> NoReturn:
+        raise NotImplementedError()
+
+    def _items(self) -> Iterator[Tuple[bytes, int, int]]:
+        """ 遍历全部 (指纹, 最后下载时间, 过期时间)
+        """
+        raise NotImplementedError()
+
+    def _remove_expired(self, now: int) -> int:
+        raise NotImplementedError()
+
+    def _scan_items(self) -> Iterator[Tuple[bytes, int, int]]:
+        """ 和 _items 相同，但是不会在整个遍历期间阻塞添加指纹，用于统计
+        """
+        return self._items()
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    @staticmethod
+    def _times(ttl: Optional[float], now: Optional[float]) -> Tuple[int, int]:
+        now = int(time.time() if now is None else now)
+        return now, 0 if ttl is None else int(now + ttl)
+
+    def add(self, fingerprint: bytes, ttl: float = None,
+            now: float = None) -> bool:
+        """ 添加一个指纹，已经存在但过期的指纹会被重新添加
+
+        Args:
+            fingerprint: 指纹
+            ttl: 多少秒后过期，默认 None 表示永不过期
+            now: 当前时间，默认 time.time()
+
+        Returns:
+            是否是新的（或已经过期的）指纹
+        """
+        fetched_at, expires_at = self._times(ttl, now)
+        times = self._get(fingerprint)
+        if times is not None and not 0 < times[1] <= fetched_at:
+            return False
+        if expires_at:
+            self._has_ttl = True
+        self._put(fingerprint, fetched_at, expires_at)
+        return True
+
+    def touch(self, fingerprint: bytes, ttl: float = None,
+              now: float = None) -> NoReturn:
+        """ 更新指纹的最后下载时间和过期时间，请求下载完成时调用
+        """
+        fetched_at, expires_at = self._times(ttl, now)
+        if expires_at:
+            self._has_ttl = True
+        self._put(fingerprint, fetched_at, expires_at)
+
+    def __contains__(self, fingerprint: bytes) -> bool:
+        times = self._get(fingerprint)
+        return times is not None and \
+            not 0 < times[1] <= int(time.time())
+
+    def get_times(self, fingerprint: bytes) -> Optional[Tuple[int, int]]:
+        """ 获取指纹的 (最后下载时间, 过期时间)，不存在时返回 None
+        """
+        return self._get(fingerprint)
+
+    def count_expired(self, now: float = None) -> int:
+        """ 统计已经过期、可以重新下载的指纹数量，这会遍历全部指纹，
+        但是没有设置过过期时间的指纹时直接返回 0
+        """
+        return self._scan_expired(now)[0]
+
+    def _scan_expired(self, now: float = None) -> Tuple[int, int]:
+        """ 遍历全部指纹，统计过期的和设置了过期时间的数量
+
+        Returns:
+            (过期的数量, 设置了过期时间的数量)
+        """
+        if self._has_ttl is False:
+            return 0, 0
+        now = int(time.time() if now is None else now)
+        # 遍历期间添加的带过期时间的指纹会重新设置为 True
+        self._has_ttl = None
+        expired = with_ttl = 0
+        for _, _, e in self._scan_items():
+            if e:
+                with_ttl += 1
+                if e <= now:
+                    expired += 1
+        if with_ttl:
+            self._has_ttl = True
+        elif self._has_ttl is None:
+            self._has_ttl = False
+        return expired, with_ttl
+
+    def should_evict(self, now: float = None) -> bool:
+        """ 是否值得执行 evict_expired：没有设置过过期时间的指纹时不需要遍历，
+        否则遍历一次（不阻塞添加指纹），过期的指纹达到全部的 evict_ratio 比例时返回 True
+        """
+        expired, _ = self._scan_expired(now)
+        return expired > 0 and expired >= len(self) * self.evict_ratio
+
+    def evict_expired(self, now: float = None) -> int:
+        """ 批量删除已经过期的指纹
+
+        Returns:
+            删除的数量
+        """
+        return self._remove_expired(
+            int(time.time() if now is None else now)
+        )
+
+    def dump(self) -> List[str]:
+        """ 获取全部指纹，保存调度器状态时使用
+
+        Returns:
+            每一项是 '16 进制指纹 最后下载时间 过期时间'
+        """
+        return [f'{fp.hex()} {f} {e}' for fp, f, e in self._items()]
+
+    def load(self, lines: Iterable[str]) -> NoReturn:
+        """ 添加 dump 得到的指纹，读取调度器状态时使用。
+        兼容只有 16 进制指纹的旧格式
+        """
+        for line in lines:
+            parts = line.split()
+            if not parts:
+                continue
+            if len(parts) == 3:
+                if int(parts[2]):
+                    self._has_ttl = True
+                self._put(bytes.fromhex(parts[0]),
+                          int(parts[1]), int(parts[2]))
+            else:
+                self._put(bytes.fromhex(parts[0]), 0, 0)
+
+    def maintain(self) -> NoReturn:
+        """ 维护存储（例如扩容），调度器在不持有锁时调用
+        """
+        pass
+
+    def flush(self) -> NoReturn:
+        pass
+
+    def close(self) -> NoReturn:
+        pass
+
+
+class MemorySeenStore(SeenStore):
+    """ 保存在内存中的指纹集合，这是默认的存储，随调度器状态保存到 md5.txt
+    """
+
+    def __init__(self):
+        self._dict: Dict[bytes, Tuple[int, int]] = {}
+        self._has_ttl = False
+
+    def _get(self, fingerprint: bytes) -> Optional[Tuple[int, int]]:
+        return self._dict.get(fingerprint)
+
+    def _put(self, fingerprint: bytes, fetched_at: int,
+             expires_at: int) -> NoReturn:
+        self._dict[fingerprint] = (fetched_at, expires_at)
+
+    def _items(self) -> Iterator[Tuple[bytes, int, int]]:
+        for fingerprint, (f, e) in list(self._dict.items()):
+            yield fingerprint, f, e
+
+    def _remove_expired(self, now: int) -> int:
+        expired = [fp for fp, f, e in self._items() if 0 < e <= now]
+        for fp in expired:
+            del self._dict[fp]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._dict)
+
+
+class MmapSeenStore(SeenStore):
+    """ 保存在磁盘上、通过内存映射访问的指纹集合。
+    打开时不需要读取全部指纹，新指纹直接写入文件，适合指纹非常多或需要跨多次运行去重的情况。
+    每个指纹的值是 8 字节：最后下载时间、过期时间（各 4 字节无符号整数）
+    """
+
+    persistent = True
+    # 删除过期的指纹需要重建整个文件，过期的指纹足够多时才删除
+    evict_ratio = 0.1
+    concurrent_evict = True
+
+    _value = struct.Struct('<II')
+
+    def __init__(self, path: str, capacity: int = 1 << 20):
+        """ 打开或创建指纹文件，旧版本（没有时间）的指纹文件会自动转换
+
+        Args:
+            path: 文件路径
+            capacity: 新建时的槽位数量，默认 1048576，不够时会自动扩容
+        """
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._upgrade(path)
+        self.table = MmapHashTable(path, 16, self._value.size, capacity,
+                                   defer_grow=True)
+        # 已有的指纹是否设置了过期时间要等第一次遍历才知道
+        self._has_ttl = None if len(self.table) else False
+
+    @classmethod
+    def _upgrade(cls, path: str) -> NoReturn:
+        """ 把没有时间的旧格式（值长度为 0）转换为新格式
+        """
+        with open(path, 'rb') as f:
+            head = MmapHashTable._head.unpack(
+                f.read(MmapHashTable._head.size)
+            )
+        if head[3] != 0:
+            return
+        logger.info_scheduler(f"Upgrade seen store '{path}'")
+        old = MmapHashTable(path, 16, 0)
+        new_path = path + '.new'
+        if os.path.exists(new_path):
+            os.remove(new_path)
+        new = MmapHashTable(new_path, 16, cls._value.size, old.capacity)
+        empty = cls._value.pack(0, 0)
+        for key, _ in old.items():
+            new.put(key, empty)
+        new.close()
+        old.close()
+        os.replace(new_path, path)
+
+    def _get(self, fingerprint: bytes) -> Optional[Tuple[int, int]]:
+        value = self.table.get(fingerprint)
+        if value is None:
+            return None
+        return self._value.unpack(value)
+
+    def _put(self, fingerprint: bytes, fetched_at: int,
+             expires_at: int) -> NoReturn:
+        self.table.put(fingerprint, self._value.pack(fetched_at, expires_at))
+
+    def _items(self) -> Iterator[Tuple[bytes, int, int]]:
+        for key, value in self.table.items():
+            yield (key, *self._value.unpack(value))
+
+    def _scan_items(self) -> Iterator[Tuple[bytes, int, int]]:
+        for key, value in self.table.scan():
+            yield (key, *self._value.unpack(value))
+
+    def _remove_expired(self, now: int) -> int:
+        def keep(key: bytes, value: bytes) -> bool:
+            expires_at = self._value.unpack(value)[1]
+            return not 0 < expires_at <= now
+
+        return self.table.rebuild(keep)
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def maintain(self) -> NoReturn:
+        self.table.grow_if_needed()
+
+    def flush(self) -> NoReturn:
+        self.table.flush()
+
+    def close(self) -> NoReturn:
+        self.table.close()
+
+
+class DigestStore:
+    """ 记录每个请求指纹上一次下载到的响应体摘要，用于判断页面是否变化
+    """
+
+    # 是否自己保存在磁盘上，不需要随调度器状态保存
+    persistent: bool = False
+
+    def swap(self, fingerprint: bytes, digest: bytes) -> Optional[bytes]:
+        """ 保存新的摘要
+
+        Returns:
+            上一次的摘要，没有时返回 None
+        """
+        raise NotImplementedError()
+
+    def __len__(self) -> int:
+        raise NotImplementedError()
+
+    def _items(self) -> Iterator[Tuple[bytes, bytes]]:
+        raise NotImplementedError()
+
+    def dump(self) -> List[str]:
+        """ 获取全部摘要，保存调度器状态时使用
+
+        Returns:
+            每一项是 '16 进制指纹 16 进制摘要'
+        """
+        return [f'{fp.hex()} {digest.hex()}' for fp, digest in self._items()]
+
+    def load(self, lines: Iterable[str]) -> NoReturn:
+        """ 添加 dump 得到的摘要，读取调度器状态时使用
+        """
+        for line in lines:
+            parts = line.split()
+            if len(parts) == 2:
+                self.swap(bytes.fromhex(parts[0]), bytes.fromhex(parts[1]))
+
+    def maintain(self) -> NoReturn:
+        """ 维护存储（例如扩容），调度器在不持有锁时调用
+        """
+        pass
+
+    def flush(self) -> NoReturn:
+        pass
+
+    def close(self) -> NoReturn:
+        pass
+
+
+class MemoryDigestStore(DigestStore):
+    """ 保存在内存中的摘要，随调度器状态保存到 digests.txt
+    """
+
+    def __init__(self):
+        self._dict: Dict[bytes, bytes] = {}
+
+    def swap(self, fingerprint: bytes, digest: bytes) -> Optional[bytes]:
+        old = self._dict.get(fingerprint)
+        self._dict[fingerprint] = digest
+        return old
+
+    def __len__(self) -> int:
+        return len(self._dict)
+
+    def _items(self) -> Iterator[Tuple[bytes, bytes]]:
+        return iter(list(self._dict.items()))
+
+
+class MmapDigestStore(DigestStore):
+    """ 保存在磁盘上、通过内存映射访问的摘要，可以在多次运行之间比较页面是否变化
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, capacity: int = 1 << 20):
+        """ 打开或创建摘要文件
+
+        Args:
+            path: 文件路径
+            capacity: 新建时的槽位数量，默认 1048576，不够时会自动扩容
+        """
+        self.table = MmapHashTable(path, 16, 16, capacity, defer_grow=True)
+
+    def swap(self, fingerprint: bytes, digest: bytes) -> Optional[bytes]:
+        with self.table._lock:
+            old = self.table.get(fingerprint)
+            self.table.put(fingerprint, digest)
+        return old
+
+    def __len__(self) -> int:
+        return len(self.table)
+
+    def _items(self) -> Iterator[Tuple[bytes, bytes]]:
+        return self.table.items()
+
+    def maintain(self) -> NoReturn:
+        self.table.grow_if_needed()
+
+    def flush(self) -> NoReturn:
+        self.table.flush()
+
+    def close(self) -> NoReturn:
+        self.table.close()
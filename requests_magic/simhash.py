@@ -0,0 +1,186 @@
+"""近似重复页面检测（SimHash）
+"""
+import hashlib
+import re
+import threading
+from collections import Counter
+from typing import Iterable, List, Dict, Tuple, Optional, NoReturn
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request, Response
+
+_tag = re.compile(r'<(script|style)\b.*?</\1>|<[^>]*>', re.S | re.I)
+_word = re.compile(r'\w+')
+_cjk = re.compile(r'[\u3040-\u30ff\u3400-\u9fff\uac00-\ud7af]')
+
+
+def get_features(text: str, shingle: int = 3) -> List[str]:
+    """ 从 html 或文本中提取特征：去掉标签后按词切分，每 shingle 个相邻的词组成一个特征。
+    中日韩文字没有空格分词，每个字当作一个词
+
+    Args:
+        text: html 或文本
+        shingle: 每个特征包含的词数，默认 3
+
+    Returns:
+        特征列表
+    """
+    text = _tag.sub(' ', text).lower()
+    words = []
+    for word in _word.findall(text):
+        if _cjk.search(word):
+            words.extend(word)
+        else:
+            words.append(word)
+    if len(words) <= shingle:
+        return [' '.join(words)] if words else []
+    return [' '.join(words[i:i + shingle])
+            for i in range(len(words) - shingle + 1)]
+
+
+def simhash(features: Iterable[str], bits: int = 64) -> int:
+    """ 计算 SimHash 签名，相似的文本签名之间的汉明距离也小
+
+    Args:
+        features: 特征，重复的特征会增加权重
+        bits: 签名位数，最多 128，默认 64
+
+    Returns:
+        签名
+    """
+    # 全部特征的摘要连在一起，每 16 字节一个
+    digests = b''.join(
+        hashlib.md5(feature.encode('utf-8')).digest() for feature in features
+    )
+    total = len(digests) // 16
+    result = 0
+    for start in range(0, bits, 8):
+        # 摘要第 start // 8 个字节的每种取值出现的次数，签名的 8 位由它一起算出
+        counts = Counter(digests[start // 8::16])
+        for i in range(min(8, bits - start)):
+            ones = sum(n for value, n in counts.items() if value >> i & 1)
+            # 这一位为 1 的权重多于为 0 的
+            if ones * 2 > total:
+                result |= 1 << start + i
+    return result
+
+
+def hamming_distance(a: int, b: int) -> int:
+    """ 两个签名之间的汉明距离
+    """
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """ SimHash 签名索引，可以快速查找汉明距离不超过 distance 的签名。
+    签名被切分为 distance + 1 段，距离不超过 distance 的两个签名至少有一段完全相同，
+    所以只需要比较至少有一段相同的签名
+    """
+
+    def __init__(self, bits: int = 64, distance: int = 3):
+        """ SimHash 签名索引
+
+        Args:
+            bits: 签名位数，默认 64
+            distance: 汉明距离不超过这个值认为是近似重复，默认 3
+        """
+        self.bits = bits
+        self.distance = distance
+        size = bits // (distance + 1)
+        # 每一段的 (起始位, 掩码)，最后一段包含余下的位
+        self._bands: List[Tuple[int, int]] = []
+        for i in range(distance + 1):
+            start = i * size
+            width = bits - start if i == distance else size
+            self._bands.append((start, (1 << width) - 1))
+        # (段序号, 段的值) -> [(签名, 键)]
+        self._buckets: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+    def find(self, signature: int) -> Optional[Tuple[int, str]]:
+        """ 查找近似重复的签名
+
+        Returns:
+            (签名, 键)，没有找到时返回 None
+        """
+        for i, (start, mask) in enumerate(self._bands):
+            bucket = self._buckets.get((i, signature >> start & mask))
+            if not bucket:
+                continue
+            for other, key in bucket:
+                if hamming_distance(signature, other) <= self.distance:
+                    return other, key
+        return None
+
+    def add(self, signature: int, key: str) -> NoReturn:
+        """ 添加一个签名
+
+        Args:
+            signature: 签名
+            key: 签名对应的键，例如 url
+        """
+        for i, (start, mask) in enumerate(self._bands):
+            self._buckets.setdefault(
+                (i, signature >> start & mask), []
+            ).append((signature, key))
+        self._count += 1
+
+
+class NearDuplicateDetector:
+    """ 近似重复页面检测器，交给调度器的 near_duplicate 参数使用。
+    每个成功下载的页面都会计算 SimHash 签名，与之前的页面近似重复时：
+        action 为 'drop'：不调用预解析和解析函数，直接丢弃
+        action 为 'no_follow'：正常解析，但丢弃解析函数返回的请求（不再扩展链接），Item 正常保存
+
+    Warnings:
+        索引只保存在内存中，不会随调度器状态保存
+    """
+
+    actions = ('drop', 'no_follow')
+
+    def __init__(self, distance: int = 3, action: str = 'drop',
+                 min_features: int = 16, shingle: int = 3,
+                 bits: int = 64):
+        """ 近似重复页面检测器
+
+        Args:
+            distance: 签名的汉明距离不超过这个值认为是近似重复，默认 3
+            action: 发现近似重复页面时的操作 'drop' 或 'no_follow'，默认 'drop'
+            min_features: 特征少于这个数量的页面（太短）不参与检测，默认 16
+            shingle: 每个特征包含的词数，默认 3
+            bits: 签名位数，默认 64
+        """
+        if action not in self.actions:
+            raise ValueError(f"Unknown near duplicate action: {action}")
+        self.action = action
+        self.min_features = min_features
+        self.shingle = shingle
+        self.index = SimHashIndex(bits, distance)
+        self._lock = threading.Lock()
+
+    def check(self, response: 'Response', request: 'Request') \
+            -> Optional[str]:
+        """ 检测页面是否与之前的页面近似重复，不重复时会加入索引
+
+        Returns:
+            近似重复的页面的 url，不重复或是同一个 url 重新爬取时返回 None
+        """
+        try:
+            text = response.text
+        except (UnicodeDecodeError, LookupError):
+            return None
+        features = get_features(text, self.shingle)
+        if len(features) < self.min_features:
+            return None
+        signature = simhash(features, self.index.bits)
+        with self._lock:
+            found = self.index.find(signature)
+            if found is None:
+                self.index.add(signature, request.url)
+            elif found[1] != request.url:
+                return found[1]
+        return None
@@ -1,4 +1,6 @@
 from requests_magic.request import Request, Response
+from requests_magic.seed import SeedSource
+from requests_magic.fingerprint import Fingerprinter
 from requests_magic.utils import get_log_name
 
 __FUCK_CIRCULAR_IMPORT = False
@@ -22,6 +24,17 @@ class Spider:
         self.name = name
         self.headers: dict = {}
         self.cookies: dict = {}
+        # 请求去重使用的指纹策略
+        self.fingerprinter: Fingerprinter = Fingerprinter()
+        # 下载多少秒后请求可以再次下载（不再被去重），None 表示永远去重
+        self.recrawl_ttl: float = None
+        # 调度器开启 fair 时，这个爬虫在多个爬虫之间分到的下载份额（权重）
+        self.weight: float = 1
+        # 调度器开启 fair 时，这个爬虫最多同时使用的连接数，
+        # 可以是整数或小于 1 的小数（调度器 max_link 的比例），None 表示不单独限制
+        self.max_link = None
+        # 调度器开启 hedge 时，这个爬虫的请求下载太慢是否再发送一次对冲的下载
+        self.hedge: bool = False
 
     def __str__(self) -> str:
         return get_log_name(self, True)
@@ -39,6 +52,22 @@ class Spider:
         """
         pass
 
+    def seeds(self, path: str, callback=None, **kwargs) -> SeedSource:
+        """ 从种子文件中流式读取起始 url，可以在 start 方法中直接 return。
+        读取位置会随调度器状态保存，读取状态后从上次的位置继续
+
+        Args:
+            path: 种子文件路径，支持 text、csv、jsonl
+            callback: 解析函数，默认 self.parse
+            **kwargs: 其他交给 SeedSource 的参数
+
+        Returns:
+            SeedSource
+        """
+        if callback is None:
+            callback = self.parse
+        return SeedSource(path, callback, **kwargs)
+
     def parse(self, response: Response, request: Request):
         """解析函数的例子，默认情况下并没有人会调用这个函数
         Warnings:
@@ -46,6 +75,12 @@ class Spider:
         """
         pass
 
+    def on_unchanged(self, response: Response, request: Request):
+        """调度器开启 content_digest 时，响应体与上一次下载的完全相同会调用这个方法，
+        而不是预解析函数和解析函数。默认什么也不做，可以像解析函数一样返回 Request 或 Item
+        """
+        pass
+
     def preparse(self, response: Response,
                  request: Request) -> Response:
         """默认的预解析函数
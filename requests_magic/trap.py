@@ -0,0 +1,140 @@
+"""爬虫陷阱检测，按主机和 url 模式限制请求数量
+"""
+import re
+from collections import Counter
+from typing import Dict, List, Optional, Tuple, Any
+from urllib.parse import urlsplit, parse_qsl
+
+__FUCK_CIRCULAR_IMPORT = False
+if __FUCK_CIRCULAR_IMPORT:
+    from .request import Request
+
+_number = re.compile(r'^\d+$|^\d[\d\-_.]*\d$')
+_hex_id = re.compile(r'^[0-9a-fA-F\-]{16,}$')
+
+
+def get_url_pattern(url: str) -> Tuple[str, str]:
+    """ 获取 url 的主机和模式。
+    模式由路径模板和查询参数名组成：路径中的数字（包括日期）替换为 {n}、长的 16 进制 id 替换为 {id}，
+    查询参数只保留排序后的参数名，例如
+    https://a.com/cal/2021/12/15?month=1&y=2 的模式是 a.com/cal/{n}/{n}/{n}?month&y
+
+    Returns:
+        (主机, 模式)
+    """
+    _, host, path, query, _ = urlsplit(url)
+    host = host.lower()
+    segments = []
+    for segment in path.split('/'):
+        if not segment:
+            continue
+        if _number.match(segment):
+            segment = '{n}'
+        elif _hex_id.match(segment):
+            segment = '{id}'
+        segments.append(segment)
+    pattern = host + '/' + '/'.join(segments)
+    if query:
+        keys = sorted({k for k, _ in parse_qsl(query, keep_blank_values=True)})
+        pattern += '?' + '&'.join(keys)
+    return host, pattern
+
+
+class TrapDetector:
+    """ 爬虫陷阱检测器，交给调度器的 trap_detector 参数使用。
+    统计每个主机、每个 url 模式已经加入队列的请求数量，以下请求会被认为可能是陷阱：
+        主机的请求数超过 max_per_host
+        url 模式的请求数超过 max_per_pattern
+        路径层数超过 max_depth
+        路径中同一段重复出现超过 max_repeat 次（例如 /a/b/a/b/a/b）
+    这些请求会根据 action 被丢弃（'drop'）或推迟（'defer'，请求队列空了之后才会下载）
+    """
+
+    actions = ('drop', 'defer')
+
+    def __init__(self, max_per_host: int = None,
+                 max_per_pattern: int = 1000,
+                 max_depth: int = 16,
+                 max_repeat: int = 3,
+                 action: str = 'defer',
+                 warn_ratio: float = 0.8):
+        """ 爬虫陷阱检测器
+
+        Args:
+            max_per_host: 每个主机最多加入队列的请求数量，默认 None 不限制
+            max_per_pattern: 每个 url 模式最多加入队列的请求数量，默认 1000，None 不限制
+            max_depth: url 路径最多的层数，默认 16，None 不限制
+            max_repeat: url 路径中同一段最多出现的次数，默认 3，None 不限制
+            action: 超出限制的请求的操作 'drop' 或 'defer'，默认 'defer'
+            warn_ratio: 请求数量达到限制的这个比例时就在 web 页面上显示为可疑，默认 0.8
+        """
+        if action not in self.actions:
+            raise ValueError(f"Unknown trap action: {action}")
+        self.max_per_host = max_per_host
+        self.max_per_pattern = max_per_pattern
+        self.max_depth = max_depth
+        self.max_repeat = max_repeat
+        self.action = action
+        self.warn_ratio = warn_ratio
+        self._hosts: Counter = Counter()
+        self._patterns: Counter = Counter()
+        # 模式 -> 超出限制的请求数量
+        self._trapped: Counter = Counter()
+        # 模式 -> 第一次超出限制的原因
+        self._reasons: Dict[str, str] = {}
+
+    def check(self, request: 'Request') -> Optional[str]:
+        """ 检查一个将要加入队列的请求并计数（由调度器在持有请求队列锁时调用）
+
+        Returns:
+            超出限制的原因，没有超出时返回 None
+        """
+        host, pattern = get_url_pattern(request.url)
+        self._hosts[host] += 1
+        self._patterns[pattern] += 1
+        reason = self._get_reason(request.url, host, pattern)
+        if reason is not None:
+            self._trapped[pattern] += 1
+            self._reasons.setdefault(pattern, reason)
+        return reason
+
+    def _get_reason(self, url: str, host: str,
+                    pattern: str) -> Optional[str]:
+        if self.max_per_host is not None and \
+                self._hosts[host] > self.max_per_host:
+            return f'host budget {self.max_per_host}'
+        if self.max_per_pattern is not None and \
+                self._patterns[pattern] > self.max_per_pattern:
+            return f'pattern budget {self.max_per_pattern}'
+        if self.max_depth is None and self.max_repeat is None:
+            return None
+        segments = [i for i in urlsplit(url).path.split('/') if i]
+        if self.max_depth is not None and len(segments) > self.max_depth:
+            return f'path depth {len(segments)}'
+        if self.max_repeat is not None and segments:
+            segment, count = Counter(segments).most_common(1)[0]
+            if count > self.max_repeat:
+                return f"'{segment}' repeated {count} times"
+        return None
+
+    def get_suspects(self, limit: int = 20) -> List[Dict[str, Any]]:
+        """ 获取可疑的 url 模式：已经超出限制的，或请求数量接近 max_per_pattern 的
+
+        Returns:
+            按超出数量、请求数量排序的信息字典
+        """
+        result = []
+        warn = None if self.max_per_pattern is None \
+            else self.max_per_pattern * self.warn_ratio
+        for pattern, count in list(self._patterns.items()):
+            trapped = self._trapped.get(pattern, 0)
+            if not trapped and (warn is None or count < warn):
+                continue
+            result.append({
+                'pattern': pattern,
+                'count': count,
+                'trapped': trapped,
+                'reason': self._reasons.get(pattern, ''),
+            })
+        result.sort(key=lambda x: (x['trapped'], x['count']), reverse=True)
+        return result[:limit]
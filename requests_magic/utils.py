@@ -40,14 +40,17 @@ class Looper(threading.Thread):
     不过 loop 方法需要一个 delta_time 参数，类似 Unity 中的 Time.DeltaTime
     """
 
-    def __init__(self, target: Callable[[float], NoReturn] = None) -> None:
+    def __init__(self, target: Callable[[float], NoReturn] = None,
+                 on_close: Callable[[], NoReturn] = None) -> None:
         """ 循环线程
 
         Args:
             target: 可以指定一个目标方法，它需要一个 float 类型参数，如果为空则执行 loop 方法
+            on_close: 循环结束（被关闭或 target 抛出异常）时在循环线程中调用的方法，默认 None
         """
         super().__init__()
         self.target = target if target else self.loop
+        self.on_close = on_close
         self.loop_interval: float = 0.05
         self._close: bool = False
         self._pause: bool = False
@@ -63,15 +66,19 @@ class Looper(threading.Thread):
 
     def run(self):
         self._old_time = time.time()
-        while not self._close:
-            if not self._pause:
-                ct = time.time()
-                self._in_action = True
-                self.target(ct - self._old_time)
-                self._in_action = False
-                self._old_time = ct
-            if self.loop_interval > 0:
-                time.sleep(self.loop_interval)
+        try:
+            while not self._close:
+                if not self._pause:
+                    ct = time.time()
+                    self._in_action = True
+                    self.target(ct - self._old_time)
+                    self._in_action = False
+                    self._old_time = ct
+                if self.loop_interval > 0:
+                    time.sleep(self.loop_interval)
+        finally:
+            if self.on_close is not None:
+                self.on_close()
 
     def close(self):
         """ 关闭循环线程，这只在运行中有效
@@ -71,7 +71,22 @@ class SchedulerWebView(threading.Thread):
             'pause': self.scheduler.is_pause,
             'saving': self.scheduler.is_saving,
             'tags': self.scheduler.get_tags_copy(),
-            'load_from': self.scheduler.load_from
+            'load_from': self.scheduler.load_from,
+            'response_bytes': self.scheduler.response_bytes,
+            'stats': {
+                **self.scheduler.get_stats_copy(),
+                'frontier': len(self.scheduler.frontier),
+                'frontier_peak': self.scheduler.frontier.peak,
+                'seen': len(self.scheduler.seen_store),
+                'recrawl_due': self.scheduler.get_recrawl_due(),
+                **(self.scheduler.dns_cache.get_stats()
+                   if self.scheduler.dns_cache is not None else {}),
+                **self.scheduler.get_prewarm_stats()
+            },
+            'traps': self.scheduler.get_trap_suspects(),
+            'spiders': self.scheduler.get_spider_stats(),
+            'breakers': self.scheduler.get_breaker_info(),
+            'proxies': self.scheduler.get_proxy_info()
         }
         if debug:
             return load_template('index').render(**data)
@@ -0,0 +1,194 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests_magic as rm
+import requests_magic.downloader as magic_d
+from requests_magic.archive import ResponseArchive
+from requests_magic.request import Response, SetCookie
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """ 响应体包含路径和这是第几次请求，server.count 记录请求次数
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.count += 1
+        body = f'page {self.path} #{self.server.count}'.encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Set-Cookie', 'sid=abc; Path=/')
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ArchiveSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestResponseArchive(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'archive.bin')
+        self.spider = ArchiveSpider()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _response(self, url: str, content: bytes) -> Response:
+        request = rm.Request(url, self.spider.parse)
+        return Response(request, url, content, 200,
+                        {'Content-Type': 'text/html'},
+                        [SetCookie(0, 'sid', 'abc', 'example.com')],
+                        'OK', 0.25)
+
+    def _assert_same(self, response: Response, other: Response):
+        self.assertEqual(
+            (other.url, other.content, other.status_code, other.reason,
+             dict(other.headers), other.set_cookies, other.request_time),
+            (response.url, response.content, response.status_code,
+             response.reason, dict(response.headers), response.set_cookies,
+             response.request_time))
+
+    def test_put_get(self):
+        for compress in (True, False):
+            path = f'{self.path}.{compress}'
+            archive = ResponseArchive(path, compress=compress)
+            response = self._response('http://example.com/', b'<p>hi</p>')
+            key = response.request.md5()
+            archive.put(key, response)
+            self.assertIn(key, archive)
+            self._assert_same(response, archive.get(key, response.request))
+            self.assertIsNone(archive.get('0' * 32, response.request))
+            # 同一个键以最后一次为准
+            newer = self._response('http://example.com/', b'<p>new</p>')
+            archive.put(key, newer)
+            self.assertEqual(len(archive), 1)
+            self.assertEqual(archive.get(key, newer.request).content,
+                             b'<p>new</p>')
+            archive.close()
+
+    def test_reopen_rebuilds_index(self):
+        archive = ResponseArchive(self.path)
+        responses = [self._response(f'http://example.com/{i}',
+                                    f'page {i}'.encode()) for i in range(20)]
+        for response in responses:
+            archive.put(response.request.md5(), response)
+        archive.close()
+
+        archive = ResponseArchive(self.path)
+        self.assertEqual(len(archive), 20)
+        for response in responses:
+            self._assert_same(response, archive.get(response.request.md5(),
+                                                    response.request))
+        archive.close()
+
+    def test_truncate_partial_tail(self):
+        archive = ResponseArchive(self.path)
+        first = self._response('http://example.com/1', b'first')
+        archive.put(first.request.md5(), first)
+        archive.close()
+        size = os.path.getsize(self.path)
+        second = self._response('http://example.com/2', b'second')
+        archive = ResponseArchive(self.path)
+        archive.put(second.request.md5(), second)
+        archive.close()
+        # 模拟第二条记录只写了一半
+        with open(self.path, 'r+b') as f:
+            f.truncate(os.path.getsize(self.path) - 3)
+
+        archive = ResponseArchive(self.path)
+        self.assertEqual(os.path.getsize(self.path), size)
+        self.assertEqual(len(archive), 1)
+        self.assertNotIn(second.request.md5(), archive)
+        self._assert_same(first, archive.get(first.request.md5(),
+                                             first.request))
+        # 截断后追加的记录可以正常读取
+        archive.put(second.request.md5(), second)
+        archive.close()
+        archive = ResponseArchive(self.path)
+        self.assertEqual(len(archive), 2)
+        self._assert_same(second, archive.get(second.request.md5(),
+                                              second.request))
+        archive.close()
+
+
+class TestRecordReplay(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), PageHandler)
+        cls.server.count = 0
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'archive.bin')
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _request(self, scheduler: rm.Scheduler, path: str,
+                 downloader) -> rm.Request:
+        spider = scheduler.get_spider_by_identity(ArchiveSpider().identity)
+        request = rm.Request(self.base + path, spider.parse,
+                             downloader=downloader)
+        request.spider = spider
+        request.scheduler = scheduler
+        return request
+
+    def test_record_then_replay(self):
+        scheduler = rm.Scheduler(ArchiveSpider, response_archive=self.path)
+        recorded = {}
+        for path in ('/a', '/b?x=1'):
+            response = magic_d.recording_downloader(
+                self._request(scheduler, path, magic_d.recording_downloader))
+            self.assertEqual(response.status_code, 200)
+            recorded[path] = response
+        scheduler.close()
+        count = self.server.count
+
+        # 新的调度器从同一个存档回放，不再访问网络
+        scheduler = rm.Scheduler(ArchiveSpider, response_archive=self.path)
+        for path, response in recorded.items():
+            replayed = magic_d.replay_downloader(
+                self._request(scheduler, path, magic_d.replay_downloader))
+            self.assertEqual(replayed.content, response.content)
+            self.assertEqual(replayed.status_code, 200)
+            self.assertEqual(replayed.headers['Content-Type'], 'text/plain')
+            self.assertEqual([c.name for c in replayed.set_cookies], ['sid'])
+        missing = magic_d.replay_downloader(
+            self._request(scheduler, '/c', magic_d.replay_downloader))
+        self.assertIsInstance(missing, magic_d.Error)
+        self.assertEqual(self.server.count, count)
+        scheduler.close()
+
+    def test_without_archive(self):
+        scheduler = rm.Scheduler(ArchiveSpider)
+        for downloader in (magic_d.recording_downloader,
+                           magic_d.replay_downloader):
+            result = downloader(self._request(scheduler, '/', downloader))
+            self.assertIsInstance(result, magic_d.Error)
+        scheduler.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,156 @@
+import threading
+import time
+import unittest
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import requests_magic as rm
+import requests_magic.downloader as magic_d
+
+
+class CountHandler(BaseHTTPRequestHandler):
+    """ server.hits 记录每个路径的请求次数，/slow 开头的路径等待 0.3 秒再响应
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.server.lock:
+            self.server.hits[self.path] += 1
+        if self.path.startswith('/slow'):
+            time.sleep(0.3)
+        body = f'page {self.path}'.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@magic_d.batch_downloader(max_size=3)
+def small_batch_downloader(requests, complete):
+    requests[0].spider.batch_sizes.append(len(requests))
+    for request in requests:
+        complete(request, magic_d.http_downloader(request))
+
+
+@magic_d.batch_downloader
+def threaded_batch_downloader(requests, complete):
+    """ 在另一个线程中交回结果，每个请求调用两次 complete，只有第一次有效
+    """
+
+    def work():
+        for request in requests:
+            complete(request, magic_d.http_downloader(request))
+            complete(request, magic_d.Error('called twice'))
+
+    threading.Thread(target=work).start()
+
+
+class BatchSpider(rm.Spider):
+    def __init__(self, scheduler=None, name: str = ''):
+        super().__init__(scheduler, name)
+        self.start_requests = []
+        self.batch_sizes = []
+        self.parsed = Counter()
+        self.lock = threading.Lock()
+
+    def start(self):
+        return self.start_requests
+
+    def parse(self, response, request):
+        with self.lock:
+            self.parsed[(request.url, response.content)] += 1
+
+
+class TestSchedulerDownload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), CountHandler)
+        cls.server.lock = threading.Lock()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.server.hits = Counter()
+
+    def _crawl(self, downloader, paths, **kwargs) -> BatchSpider:
+        """ 运行调度器直到每个路径都解析了一次
+        """
+        scheduler = rm.Scheduler(BatchSpider, **kwargs)
+        spider = scheduler.get_spider_by_identity(BatchSpider().identity)
+        spider.start_requests = [
+            rm.Request(self.base + path, spider.parse, downloader=downloader)
+            for path in paths
+        ]
+        scheduler.start()
+        try:
+            deadline = time.time() + 10
+            while sum(spider.parsed.values()) < len(paths):
+                if time.time() > deadline:
+                    self.fail(f'parsed {dict(spider.parsed)}')
+                time.sleep(0.05)
+            # 多余的回调会在稍后出现
+            time.sleep(0.2)
+        finally:
+            scheduler.close()
+        return spider
+
+    def _assert_once(self, spider: BatchSpider, paths):
+        self.assertEqual(
+            spider.parsed,
+            Counter({(self.base + p, f'page {p}'.encode()): 1 for p in paths})
+        )
+
+    def test_max_size_splits_batches(self):
+        paths = [f'/split/{i}' for i in range(8)]
+        spider = self._crawl(small_batch_downloader, paths)
+        self._assert_once(spider, paths)
+        self.assertEqual(sum(spider.batch_sizes), 8)
+        self.assertTrue(all(0 < size <= 3 for size in spider.batch_sizes))
+
+    def test_complete_from_another_thread(self):
+        paths = [f'/thread/{i}' for i in range(6)]
+        spider = self._crawl(threaded_batch_downloader, paths)
+        self._assert_once(spider, paths)
+
+    def test_coroutine_batch_under_both_engines(self):
+        for engine in ('thread', 'asyncio'):
+            with self.subTest(engine=engine):
+                paths = [f'/{engine}/{i}' for i in range(6)]
+                spider = self._crawl(magic_d.asyncio_batch_downloader, paths,
+                                     engine=engine)
+                self._assert_once(spider, paths)
+
+    def test_coalesce_same_requests(self):
+        paths = ['/slow/same'] * 4 + ['/slow/other']
+        spider = self._crawl(magic_d.http_downloader, paths,
+                             coalesce=True, distinct=False)
+        self.assertEqual(spider.parsed, Counter({
+            (self.base + '/slow/same', b'page /slow/same'): 4,
+            (self.base + '/slow/other', b'page /slow/other'): 1,
+        }))
+        # 相同的请求只下载了一次
+        self.assertEqual(self.server.hits['/slow/same'], 1)
+
+    def test_downloaders_under_both_engines(self):
+        for engine in ('thread', 'asyncio'):
+            for downloader in (magic_d.requests_downloader,
+                               magic_d.http_downloader,
+                               magic_d.asyncio_downloader):
+                with self.subTest(engine=engine,
+                                  downloader=downloader.__name__):
+                    paths = [f'/{engine}/{downloader.__name__}/{i}'
+                             for i in range(4)]
+                    spider = self._crawl(downloader, paths, engine=engine)
+                    self._assert_once(spider, paths)
+
+
+if __name__ == '__main__':
+    unittest.main()
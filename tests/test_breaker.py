@@ -0,0 +1,71 @@
+import time
+import unittest
+
+import requests_magic as rm
+from requests_magic.breaker import CircuitBreaker, HALF_OPEN
+
+
+class BreakerSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_release_probe(self):
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        self.assertTrue(breaker.record_failure('h'))
+        self.assertTrue(breaker.allow('h'))
+        self.assertEqual(breaker.get_info()[0]['state'], HALF_OPEN)
+        self.assertFalse(breaker.allow('h'))
+        breaker.release_probe('h')
+        self.assertTrue(breaker.allow('h'))
+
+
+class TestSchedulerProbe(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = rm.Scheduler(
+            BreakerSpider,
+            circuit_breaker=CircuitBreaker(failure_threshold=1,
+                                           reset_timeout=0)
+        )
+        self.spider = self.scheduler.get_spider_by_identity(
+            BreakerSpider().identity)
+        self.host = 'example.com'
+        self.scheduler.circuit_breaker.record_failure(self.host,
+                                                      time.time() - 1)
+        for i in range(3):
+            request = rm.Request(f'http://{self.host}/{i}', self.spider.parse)
+            request.spider = self.spider
+            request.scheduler = self.scheduler
+            self.assertTrue(self.scheduler._park(request))
+
+    def _probe(self) -> rm.Request:
+        return self.scheduler._next_probe(list(self.scheduler._parked))
+
+    def test_retry_without_failure_releases_probe(self):
+        probe = self._probe()
+        self.assertIsNotNone(probe)
+        self.assertIsNone(self._probe())
+        # 例如代理池没有可用的代理时的重试
+        self.scheduler._link_requests.append(probe)
+        self.scheduler.downloader_retry(probe, failure=False)
+        request = self.scheduler.frontier.pop()
+        self.assertIs(request, probe)
+        self.assertTrue(self.scheduler._park(request))
+        self.assertIsNotNone(self._probe())
+
+    def test_abandoned_probe_reopens(self):
+        probe = self._probe()
+        self.scheduler._link_requests.append(probe)
+        self.scheduler.downloader_abandon(probe)
+        self.assertTrue(self.scheduler.circuit_breaker.is_open(self.host))
+        self.assertEqual(self.scheduler._probes, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,35 @@
+import socket
+import unittest
+
+import requests_magic as rm
+from requests_magic.dns import get_installed
+
+
+class DNSSpider(rm.Spider):
+    def start(self):
+        return []
+
+
+class TestDNSCacheInstall(unittest.TestCase):
+
+    def test_installed_only_while_running(self):
+        original = socket.getaddrinfo
+        scheduler = rm.Scheduler(DNSSpider, dns_cache=True)
+        self.assertIs(socket.getaddrinfo, original)
+        self.assertIsNone(get_installed())
+
+        scheduler.start()
+        try:
+            self.assertIs(get_installed(), scheduler.dns_cache)
+            self.assertEqual(socket.getaddrinfo,
+                             scheduler.dns_cache.getaddrinfo)
+        finally:
+            scheduler.close()
+            scheduler.request_looper.join(5)
+            scheduler.response_looper.join(5)
+        self.assertIs(socket.getaddrinfo, original)
+        self.assertIsNone(get_installed())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,104 @@
+import asyncio
+import gc
+import queue
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+
+import requests_magic as rm
+import requests_magic.downloader as magic_d
+import requests_magic.http_adapter as magic_h
+from requests_magic.engine import ThreadEngine, AsyncioEngine
+
+
+class EchoHandler(BaseHTTPRequestHandler):
+    """ 响应体是收到的 Authorization 请求头
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = self.headers.get('Authorization', '').encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class EngineSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestEngine(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), EchoHandler)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.base = 'http://127.0.0.1:%d' % cls.server.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.scheduler = rm.Scheduler(EngineSpider)
+        self.spider = self.scheduler.get_spider_by_identity(
+            EngineSpider().identity)
+
+    def _request(self, downloader=magic_d.requests_downloader,
+                 **kwargs) -> rm.Request:
+        request = rm.Request(self.base + '/', self.spider.parse,
+                             downloader=downloader, **kwargs)
+        request.spider = self.spider
+        request.scheduler = self.scheduler
+        return request
+
+    def test_thread_engine_closes_asyncio_pools(self):
+        gc.collect()
+        before = len(magic_h._asyncio_pools)
+        results = []
+        with mock.patch.object(rm.Request, '_download_done',
+                               lambda r, t, response: results.append(response)):
+            for i in range(20):
+                ThreadEngine._run(self._request(magic_d.asyncio_downloader), i)
+        self.assertEqual([r.status_code for r in results], [200] * 20)
+        gc.collect()
+        self.assertEqual(len(magic_h._asyncio_pools), before)
+
+    def test_asyncio_downloader_in_own_loop(self):
+        gc.collect()
+        before = len(magic_h._asyncio_pools)
+        for i in range(5):
+            response = asyncio.run(magic_d.asyncio_downloader(
+                self._request(magic_d.asyncio_downloader)))
+            self.assertEqual(response.status_code, 200)
+        gc.collect()
+        self.assertEqual(len(magic_h._asyncio_pools), before)
+
+    def test_asyncio_engine_keeps_requests_kwargs(self):
+        engine = AsyncioEngine()
+        self.assertIs(engine._swap_downloader(self._request(verify=False)),
+                      magic_d.asyncio_downloader)
+        results = queue.Queue()
+        try:
+            with mock.patch.object(rm.Request, '_download_done',
+                                   lambda r, t, response: results.put(response)):
+                engine.start(self._request(auth=('user', 'pass')), 0)
+                response = results.get(timeout=10)
+        finally:
+            engine.close()
+        self.assertTrue(engine._swap_warned)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'Basic dXNlcjpwYXNz')
+
+
+if __name__ == '__main__':
+    unittest.main()
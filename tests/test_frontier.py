@@ -0,0 +1,104 @@
+import heapq
+import random
+import unittest
+from collections import Counter
+
+import requests_magic as rm
+from requests_magic.frontier import BestFirstFrontier, FairFrontier
+
+
+class FrontierSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class HeavySpider(FrontierSpider):
+    pass
+
+
+class LightSpider(FrontierSpider):
+    def __init__(self, scheduler=None, name: str = ''):
+        super().__init__(scheduler, name)
+        self.weight = 3
+
+
+class TestBestFirstFrontier(unittest.TestCase):
+
+    def test_peek_matches_pop_order(self):
+        spider = FrontierSpider()
+        rng = random.Random(0)
+        scores = {}
+        frontier = BestFirstFrontier(lambda r: scores[r.url])
+        for i in range(2000):
+            url = f'http://example.com/{i}'
+            # 有重复的分数，分数相同时先进先出
+            scores[url] = rng.randint(0, 100)
+            frontier.push(rm.Request(url, spider.parse))
+        expected = [i[2] for i in heapq.nsmallest(100, frontier._heap)]
+        for n in (0, 1, 7, 100):
+            self.assertEqual(frontier.peek(n), expected[:n])
+        self.assertEqual([frontier.pop() for _ in range(100)], expected)
+        self.assertEqual(len(frontier.peek(5000)), 1900)
+
+
+class TestFairFrontier(unittest.TestCase):
+
+    def setUp(self):
+        self.scheduler = rm.Scheduler([HeavySpider, LightSpider])
+        self.heavy = self.scheduler.get_spider_by_identity(
+            HeavySpider().identity)
+        self.light = self.scheduler.get_spider_by_identity(
+            LightSpider().identity)
+        self.assertIsInstance(self.scheduler.frontier, FairFrontier)
+
+    def _add(self, spider: rm.Spider, count: int):
+        requests = [rm.Request(f'http://{spider.identity}.com/{i}',
+                               spider.parse) for i in range(count)]
+        self.assertEqual(self.scheduler.add_requests(requests, spider),
+                         (count, 0))
+
+    def _pop(self, count: int, exclude=None) -> Counter:
+        popped = [self.scheduler.frontier.pop(exclude) for _ in range(count)]
+        return Counter(r.spider.identity for r in popped)
+
+    def test_weighted_ratio(self):
+        # 先加入的 10000 个请求不会让后加入的爬虫饿死
+        self._add(self.heavy, 10000)
+        self._add(self.light, 1000)
+        first = self._pop(4)
+        self.assertEqual(first, Counter({self.light.identity: 3,
+                                         self.heavy.identity: 1}))
+        counts = self._pop(4000)
+        self.assertEqual(counts, Counter({self.light.identity: 997,
+                                          self.heavy.identity: 3003}))
+        self.assertEqual(self.scheduler.frontier.get_queue_sizes(), {
+            self.heavy.identity: 6996, self.light.identity: 0
+        })
+
+    def test_ratio_over_many_rounds(self):
+        self._add(self.heavy, 10000)
+        self._add(self.light, 10000)
+        counts = self._pop(8000)
+        self.assertEqual(counts, Counter({self.light.identity: 6000,
+                                          self.heavy.identity: 2000}))
+
+    def test_idle_queue_does_not_accumulate(self):
+        self._add(self.heavy, 1000)
+        self.assertEqual(self._pop(100), Counter({self.heavy.identity: 100}))
+        # 空闲的爬虫重新有请求时从当前进度开始，不会一次取走积累的份额
+        self._add(self.light, 100)
+        counts = self._pop(40)
+        self.assertAlmostEqual(counts[self.light.identity], 30, delta=1)
+
+    def test_exclude(self):
+        self._add(self.heavy, 100)
+        self._add(self.light, 100)
+        # 达到 max_link 的爬虫被排除时只从另一个取
+        counts = self._pop(10, {self.light.identity})
+        self.assertEqual(counts, Counter({self.heavy.identity: 10}))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+import requests_magic as rm
+from requests_magic.hedge import HedgePolicy
+from requests_magic.request import Response
+
+
+class HedgeSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestHedgeSamples(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = HedgePolicy(min_samples=1)
+        self.scheduler = rm.Scheduler(HedgeSpider, hedge=self.policy)
+        self.spider = self.scheduler.get_spider_by_identity(
+            HedgeSpider().identity)
+
+    def _finish(self, hedged: int, total_time: float, request_time: float):
+        request = rm.Request('http://example.com/', self.spider.parse)
+        request.spider = self.spider
+        request.scheduler = self.scheduler
+        request.hedged = hedged
+        request.total_time = total_time
+        response = Response(request, request.url, b'', 200, {}, [], 'OK',
+                            request_time)
+        self.scheduler._link_requests.append(request)
+        self.scheduler.downloader_finish(response, request)
+
+    def test_hedge_won_records_own_duration(self):
+        # 原来的下载 2 秒后开始对冲，对冲的下载只用了 0.05 秒
+        self._finish(hedged=2, total_time=2.05, request_time=0.05)
+        self.assertEqual(list(self.policy._samples['example.com']), [0.05])
+        self.assertEqual(self.scheduler.get_stats_copy()['hedge_won'], 1)
+
+    def test_primary_records_total_time(self):
+        self._finish(hedged=1, total_time=2.5, request_time=2.4)
+        self.assertEqual(list(self.policy._samples['example.com']), [2.5])
+
+
+if __name__ == '__main__':
+    unittest.main()
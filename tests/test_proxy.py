@@ -0,0 +1,140 @@
+import http.client
+import threading
+import unittest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from unittest import mock
+from urllib.parse import urlsplit
+
+import requests_magic as rm
+import requests_magic.downloader as magic_d
+from requests_magic.proxy import ProxyPool
+
+
+class OriginHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        body = f'origin {self.path}'.encode()
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    """ 只支持 http 网站的转发代理，server.requests 记录收到的请求目标，
+    server.fail 为 True 时返回 502
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.server.requests.append(self.path)
+        if self.server.fail:
+            self.send_response(502)
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        parts = urlsplit(self.path)
+        upstream = http.client.HTTPConnection(parts.hostname, parts.port)
+        target = parts.path + ('?' + parts.query if parts.query else '')
+        upstream.request('GET', target, headers={'Connection': 'close'})
+        r = upstream.getresponse()
+        body = r.read()
+        upstream.close()
+        self.send_response(r.status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def serve(handler) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer(('127.0.0.1', 0), handler)
+    server.requests = []
+    server.fail = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+class ProxySpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestProxyPool(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.origin = serve(OriginHandler)
+        cls.base = 'http://127.0.0.1:%d' % cls.origin.server_address[1]
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.origin.shutdown()
+
+    def setUp(self):
+        self.proxy = serve(ProxyHandler)
+        self.proxy_url = 'http://127.0.0.1:%d' % self.proxy.server_address[1]
+        self.pool = ProxyPool([self.proxy_url], quarantine_after=2)
+        self.scheduler = rm.Scheduler(ProxySpider, proxy_pool=self.pool)
+        self.spider = self.scheduler.get_spider_by_identity(
+            ProxySpider().identity)
+
+    def tearDown(self):
+        self.proxy.shutdown()
+
+    def _request(self, path: str) -> rm.Request:
+        request = rm.Request(self.base + path, self.spider.parse)
+        request.spider = self.spider
+        request.scheduler = self.scheduler
+        return request
+
+    def _in_flight(self) -> int:
+        return self.pool.get_info()[0]['in_flight']
+
+    def test_downloaders_use_proxy(self):
+        for downloader in (magic_d.http_downloader,
+                           magic_d.requests_downloader):
+            path = f'/page?{downloader.__name__}'
+            response = downloader(self._request(path))
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, f'origin {path}'.encode())
+            self.assertEqual(self.proxy.requests[-1], self.base + path)
+        info = self.pool.get_info()[0]
+        self.assertEqual((info['successes'], info['failures'],
+                          info['in_flight']), (2, 0, 0))
+
+    def test_bad_proxy_is_quarantined(self):
+        self.proxy.fail = True
+        for i in range(2):
+            response = magic_d.http_downloader(self._request(f'/{i}'))
+            self.assertEqual(response.status_code, 502)
+        self.assertGreater(self.pool.get_info()[0]['quarantined'], 0)
+        # 没有可用的代理时等待后重试，不算作主机的失败
+        result = magic_d.http_downloader(self._request('/2'))
+        self.assertIsInstance(result, magic_d.Retry)
+        self.assertFalse(result.failure)
+
+    def test_unexpected_error_releases_proxy(self):
+        with mock.patch.object(magic_d, 'http_fetch',
+                               side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                magic_d.http_downloader(self._request('/'))
+        self.assertEqual(self._in_flight(), 0)
+        with mock.patch('requests.request',
+                        side_effect=RuntimeError('boom')):
+            with self.assertRaises(RuntimeError):
+                magic_d.requests_downloader(self._request('/'))
+        self.assertEqual(self._in_flight(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,61 @@
+import os
+import tempfile
+import time
+import unittest
+
+import requests_magic as rm
+from requests_magic.seen import MmapSeenStore
+
+
+class ResumeSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+def wait_saved(scheduler: rm.Scheduler, timeout: float = 10):
+    deadline = time.time() + timeout
+    while scheduler.is_saving:
+        if time.time() > deadline:
+            raise TimeoutError('Save did not finish')
+        time.sleep(0.05)
+
+
+class TestResumeWithMmapSeenStore(unittest.TestCase):
+
+    def test_save_load_keeps_pending_requests(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            store_path = os.path.join(tmp, 'seen.tbl')
+            state_dir = os.path.join(tmp, 'state')
+
+            scheduler = rm.Scheduler(ResumeSpider,
+                                     seen_store=MmapSeenStore(store_path))
+            spider = scheduler.get_spider_by_identity(
+                ResumeSpider().identity)
+            urls = [f'http://example.com/page/{i}' for i in range(5)]
+            accepted, repeated = scheduler.add_requests(
+                [rm.Request(url, spider.parse) for url in urls], spider
+            )
+            self.assertEqual((accepted, repeated), (5, 0))
+            scheduler.save(state_dir)
+            wait_saved(scheduler)
+            scheduler.seen_store.close()
+
+            resumed = rm.Scheduler(ResumeSpider,
+                                   seen_store=MmapSeenStore(store_path))
+            resumed.load(state_dir)
+            self.assertEqual(len(resumed.frontier), 5)
+            self.assertEqual(
+                sorted(r.url for r in resumed.frontier.to_list()), urls
+            )
+            # 已经保存的指纹仍然会去重新的请求
+            spider = resumed.get_spider_by_identity(ResumeSpider().identity)
+            self.assertEqual(resumed.add_requests(
+                [rm.Request(urls[0], spider.parse)], spider), (0, 1))
+            resumed.seen_store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,129 @@
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+import requests_magic as rm
+from requests_magic.seen import MmapHashTable, MmapSeenStore
+
+
+class SeenSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+def key(i: int) -> bytes:
+    return i.to_bytes(8, 'little') * 2
+
+
+def read_dirty(path: str) -> int:
+    with open(path, 'rb') as f:
+        return MmapHashTable._head.unpack(f.read(MmapHashTable._head.size))[4]
+
+
+class TestMmapSeenStore(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, 'seen.bin')
+        self.now = int(time.time())
+
+    def tearDown(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def _fill(self, store: MmapSeenStore, count: int) -> None:
+        for i in range(count):
+            store.add(key(i), ttl=3600 if i % 2 else None, now=self.now)
+
+    def test_reopen_after_flush(self):
+        store = MmapSeenStore(self.path, capacity=64)
+        self._fill(store, 100)
+        store.close()
+        self.assertEqual(read_dirty(self.path), 0)
+
+        store = MmapSeenStore(self.path)
+        self.assertEqual(len(store), 100)
+        self.assertTrue(all(key(i) in store for i in range(100)))
+        self.assertEqual(store.get_times(key(1)),
+                         (self.now, self.now + 3600))
+        store.close()
+
+    def test_reopen_dirty(self):
+        store = MmapSeenStore(self.path, capacity=64)
+        self._fill(store, 100)
+        # 模拟崩溃：数据已经写入，但没有清除 dirty 标志
+        store.table._map.flush()
+        store.table._close_map()
+        self.assertEqual(read_dirty(self.path), 1)
+
+        store = MmapSeenStore(self.path)
+        self.assertEqual(len(store), 100)
+        self.assertTrue(all(key(i) in store for i in range(100)))
+        store.close()
+
+    def test_grow_keeps_keys(self):
+        table = MmapHashTable(self.path, 16, 0, capacity=16)
+        for i in range(1000):
+            self.assertTrue(table.put(key(i)))
+        self.assertGreaterEqual(table.capacity, 1024)
+        self.assertEqual(len(table), 1000)
+        self.assertTrue(all(key(i) in table for i in range(1000)))
+        table.close()
+
+    def test_put_during_rebuild(self):
+        table = MmapHashTable(self.path, 16, 0, capacity=256,
+                              defer_grow=True)
+        for i in range(100):
+            table.put(key(i))
+        added = []
+
+        def keep(k: bytes, value: bytes) -> bool:
+            # 重建复制期间插入的键也要出现在新表中
+            if not added:
+                added.extend(key(i) for i in range(100, 200))
+                for k2 in added:
+                    table.put(k2)
+            return True
+
+        self.assertEqual(table.rebuild(keep, capacity=1024), 0)
+        self.assertEqual((table.capacity, len(table)), (1024, 200))
+        self.assertTrue(all(key(i) in table for i in range(200)))
+        table.close()
+
+    def test_deferred_grow(self):
+        table = MmapHashTable(self.path, 16, 0, capacity=64,
+                              defer_grow=True)
+        for i in range(50):
+            table.put(key(i))
+        self.assertEqual(table.capacity, 64)
+        self.assertTrue(table.need_grow)
+        self.assertTrue(table.grow_if_needed())
+        self.assertEqual(table.capacity, 128)
+        self.assertTrue(all(key(i) in table for i in range(50)))
+        # 超过 hard_load 时仍然会立刻扩容
+        for i in range(50, 120):
+            table.put(key(i))
+        self.assertGreater(table.capacity, 128)
+        table.close()
+
+    def test_scheduler_close_flushes(self):
+        scheduler = rm.Scheduler(SeenSpider, seen_store=self.path)
+        spider = scheduler.get_spider_by_identity(SeenSpider().identity)
+        scheduler.add_requests([rm.Request(f'http://example.com/{i}',
+                                           spider.parse) for i in range(10)],
+                               spider)
+        self.assertEqual(read_dirty(self.path), 1)
+        scheduler.close()
+        self.assertEqual(read_dirty(self.path), 0)
+
+        store = MmapSeenStore(self.path)
+        self.assertEqual(len(store), 10)
+        store.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,36 @@
+import hashlib
+import random
+import unittest
+
+from requests_magic.simhash import simhash
+
+
+def simhash_per_bit(features, bits: int) -> int:
+    vector = [0] * bits
+    for feature in features:
+        h = int.from_bytes(
+            hashlib.md5(feature.encode('utf-8')).digest(), 'little'
+        )
+        for i in range(bits):
+            vector[i] += 1 if h >> i & 1 else -1
+    return sum(1 << i for i in range(bits) if vector[i] > 0)
+
+
+class TestSimHash(unittest.TestCase):
+
+    def test_same_as_per_bit(self):
+        rng = random.Random(0)
+        words = [f'w{i}' for i in range(500)]
+        for count in (0, 1, 2, 7, 300):
+            features = [' '.join(rng.choices(words, k=3))
+                        for _ in range(count)]
+            # 重复的特征增加权重
+            features += features[:count // 2]
+            for bits in (3, 8, 60, 64, 128):
+                self.assertEqual(simhash(features, bits),
+                                 simhash_per_bit(features, bits),
+                                 (count, bits))
+
+
+if __name__ == '__main__':
+    unittest.main()
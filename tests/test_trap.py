@@ -0,0 +1,36 @@
+import unittest
+
+import requests_magic as rm
+from requests_magic.trap import TrapDetector
+
+
+class TrapSpider(rm.Spider):
+    def start(self):
+        return []
+
+    def parse(self, response, request):
+        pass
+
+
+class TestTrapDrop(unittest.TestCase):
+
+    def test_dropped_requests_are_not_recorded_as_seen(self):
+        scheduler = rm.Scheduler(TrapSpider, trap_detector=TrapDetector(
+            max_per_host=2, action='drop'))
+        spider = scheduler.get_spider_by_identity(TrapSpider().identity)
+        requests = [rm.Request(f'http://example.com/{i}', spider.parse)
+                    for i in range(4)]
+        self.assertEqual(scheduler.add_requests(requests, spider), (2, 0))
+        fingerprints = [r.fingerprint() for r in requests]
+        self.assertEqual([fp in scheduler.seen_store for fp in fingerprints],
+                         [True, True, False, False])
+
+        # 提高限制后被丢弃的请求可以重新加入，已经加入的仍然会去重
+        scheduler.trap_detector.max_per_host = None
+        again = [rm.Request(f'http://example.com/{i}', spider.parse)
+                 for i in range(4)]
+        self.assertEqual(scheduler.add_requests(again, spider), (2, 2))
+
+
+if __name__ == '__main__':
+    unittest.main()